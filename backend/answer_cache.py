@@ -0,0 +1,98 @@
+"""
+Answer cache for the chat endpoints.
+
+Entries are keyed on the normalized question plus the hashes of the chunks
+that were retrieved for it, evicted least-recently-used beyond
+ANSWER_CACHE_SIZE entries or after ANSWER_CACHE_TTL_SECONDS, and dropped
+whenever the corpus changes.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from metrics import CACHE_HITS, CACHE_MISSES
+from text_processing import get_text_hash
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 512))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+
+WORD_PATTERN = re.compile(r"\w+")
+
+CacheKey = Tuple[int, str, Tuple[str, ...]]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase and drop punctuation and extra whitespace"""
+    return " ".join(WORD_PATTERN.findall(question.lower()))
+
+
+class AnswerCache:
+    """Thread-safe LRU cache with per-entry TTL and corpus-version invalidation"""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.corpus_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, question: str, relevant_docs: List[str]) -> CacheKey:
+        """Key a question by its normalized text and the exact context sent to Gemini"""
+        context_hashes = tuple(get_text_hash(doc) for doc in relevant_docs)
+        return (self.corpus_version, normalize_question(question), context_hashes)
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Return the cached answer for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                CACHE_MISSES.labels("answer").inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_HITS.labels("answer").inc()
+            return entry[1]
+
+    def put(self, key: CacheKey, answer: str):
+        """Store an answer unless the corpus changed since key was made"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if key[0] != self.corpus_version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry; called whenever documents are added or removed"""
+        with self._lock:
+            self.corpus_version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Counters reported by the /test endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "corpus_version": self.corpus_version,
+            }
+
+
+answer_cache = AnswerCache()
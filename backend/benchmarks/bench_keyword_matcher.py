@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark KeywordMatcher against the original per-keyword scoring loop from
+search_documents_supabase, with a combined-regex single-pass matcher as a
+reference point, on synthetic chunk corpora.
+
+Usage: python benchmarks/bench_keyword_matcher.py [--chunks 100000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KeywordMatcher
+
+DOMAIN_TERMS = [
+    "cloud", "computing", "scheduling", "algorithm", "resource", "virtual", "machine",
+    "latency", "throughput", "network", "storage", "server", "cluster", "container",
+    "workload", "policy", "priority", "queue", "deadline", "energy", "cost", "data",
+    "center", "allocation", "migration", "elastic", "service", "level", "agreement",
+]
+
+QUERIES = [
+    ["cloud", "scheduling"],
+    ["virtual", "machine", "migration", "energy"],
+    ["resource", "allocation", "deadline", "priority", "queue", "cost"],
+]
+
+
+def make_corpus(chunk_count, chunk_size=1000, vocabulary_size=5000, seed=42):
+    """Generate lowercase chunks from a Zipf-weighted vocabulary that includes DOMAIN_TERMS"""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))) for _ in range(vocabulary_size)]
+    vocabulary.extend(DOMAIN_TERMS)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(weights)
+    words_per_chunk = chunk_size // 6
+    return [" ".join(rng.choices(vocabulary, weights=weights, k=words_per_chunk))[:chunk_size] for _ in range(chunk_count)]
+
+
+def score_per_keyword(content_lower, keywords):
+    """The original scoring loop: several full scans per keyword"""
+    score = 0
+    matched_keywords = []
+    for keyword in keywords:
+        if keyword in content_lower:
+            occurrences = content_lower.count(keyword)
+            score += occurrences
+            matched_keywords.append(keyword)
+    for keyword in keywords:
+        if re.search(rf'\b{re.escape(keyword)}', content_lower):
+            score += 0.5
+    return score, matched_keywords
+
+
+def make_single_pass_regex(keywords):
+    """Reference matcher: one combined alternation, boundary taken from the match position"""
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    alternation = "|".join(re.escape(keyword) for keyword in ordered)
+    # First branch matches at a word boundary, second anywhere else
+    pattern = re.compile(rf"\b({alternation})|({alternation})")
+
+    def score(content_lower):
+        counts = Counter()
+        boundary_hits = set()
+        for at_boundary, elsewhere in pattern.findall(content_lower):
+            counts[at_boundary or elsewhere] += 1
+            if at_boundary:
+                boundary_hits.add(at_boundary)
+        return sum(counts.values()) + 0.5 * len(boundary_hits)
+
+    return score
+
+
+def time_run(fn, repeat):
+    """Return the best wall time of `repeat` runs and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Generating {args.chunks} chunks...")
+    corpus = make_corpus(args.chunks)
+
+    print(f"{'keywords':>8}  {'original (s)':>12}  {'regex 1-pass (s)':>16}  {'matcher (s)':>11}  {'speedup':>8}")
+    for keywords in QUERIES:
+        baseline_time, baseline = time_run(lambda: [score_per_keyword(c, keywords) for c in corpus], args.repeat)
+        single_pass = make_single_pass_regex(keywords)
+        regex_time, _ = time_run(lambda: [single_pass(c) for c in corpus], args.repeat)
+        matcher = KeywordMatcher(keywords)
+        matcher_time, matched = time_run(lambda: [matcher.score(c) for c in corpus], args.repeat)
+        if baseline != matched:
+            print("✗ KeywordMatcher scores differ from the original loop")
+            sys.exit(1)
+        print(f"{len(keywords):>8}  {baseline_time:>12.3f}  {regex_time:>16.3f}  {matcher_time:>11.3f}  {baseline_time / matcher_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
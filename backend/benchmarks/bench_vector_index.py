@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of VectorIndex: IVF search (float32 and int8) against
+exact brute-force search on synthetic chunk corpora embedded with the
+default hashed embedder.
+
+Usage: python benchmarks/bench_vector_index.py [--chunks 10000,100000] [--queries 200] [--nprobe 4,12,32]
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_keyword_matcher import DOMAIN_TERMS
+from vector_index import NUMPY_AVAILABLE, HashingEmbedder, VectorIndex
+
+CHUNKS_PER_DOCUMENT = 100
+
+
+def make_corpus(chunk_count, chunk_size=1000, topics=200, seed=42):
+    """
+    Chunks of topical documents: every document draws most of its words from
+    its topic's vocabulary and the rest from a shared Zipf-weighted one, so
+    nearest neighbours cluster the way real documents do.
+    """
+    rng = random.Random(seed)
+
+    def words(count):
+        return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(count)]
+
+    shared = words(5000) + DOMAIN_TERMS
+    shared_weights = [1 / (rank + 1) for rank in range(len(shared))]
+    topic_words = [words(60) for _ in range(topics)]
+    words_per_chunk = chunk_size // 6
+    corpus = []
+    while len(corpus) < chunk_count:
+        vocabulary = topic_words[rng.randrange(topics)]
+        for _ in range(min(CHUNKS_PER_DOCUMENT, chunk_count - len(corpus))):
+            topical = rng.choices(vocabulary, k=words_per_chunk // 2)
+            common = rng.choices(shared, weights=shared_weights, k=words_per_chunk - len(topical))
+            chunk_words = topical + common
+            rng.shuffle(chunk_words)
+            corpus.append(" ".join(chunk_words)[:chunk_size])
+    return corpus
+
+
+def make_queries(corpus, count, seed=7):
+    """Queries of a few consecutive words taken from random chunks"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(corpus).split()
+        start = rng.randrange(max(1, len(words) - 6))
+        queries.append(" ".join(words[start:start + rng.randint(3, 8)]))
+    return queries
+
+
+def build_index(vectors, quantize, ivf_threshold, nprobe):
+    index = VectorIndex(embedder=HashingEmbedder(), quantize=quantize, ivf_threshold=ivf_threshold, nprobe=nprobe)
+    start = time.perf_counter()
+    for doc_number, offset in enumerate(range(0, len(vectors), CHUNKS_PER_DOCUMENT)):
+        index.add_vectors(f"doc-{doc_number}", vectors[offset:offset + CHUNKS_PER_DOCUMENT])
+    index.wait_for_training()
+    return index, time.perf_counter() - start
+
+
+def timed_search(index, query_vectors, limit, exact):
+    latencies, results = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        results.append(index.search_vectors(vector[None, :], limit, min_score=-1.0, exact=exact)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, [[key for _, key in hits] for hits in results]
+
+
+def recall(truth, found):
+    return statistics.mean(len(set(t) & set(f)) / max(1, len(t)) for t, f in zip(truth, found))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default="10000,100000", help="comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", default="4,12,32", help="comma-separated IVF nprobe values")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("✗ NumPy is not installed")
+        sys.exit(1)
+
+    embedder = HashingEmbedder()
+    for chunk_count in [int(size) for size in args.chunks.split(",")]:
+        print(f"\nGenerating and embedding {chunk_count} chunks...")
+        corpus = make_corpus(chunk_count)
+        start = time.perf_counter()
+        vectors = embedder(corpus)
+        print(f"embedded in {time.perf_counter() - start:.1f}s")
+        query_vectors = embedder(make_queries(corpus, args.queries))
+
+        exact_index, build_time = build_index(vectors, "float32", ivf_threshold=chunk_count + 1, nprobe=0)
+        exact_latencies, truth = timed_search(exact_index, query_vectors, args.k, exact=True)
+        print(f"{'mode':>14}  {'nprobe':>6}  {'build (s)':>9}  {'p50 (ms)':>8}  {'p95 (ms)':>8}  {'recall@' + str(args.k):>9}")
+        print(f"{'exact float32':>14}  {'-':>6}  {build_time:>9.2f}  {percentile(exact_latencies, 0.5):>8.2f}  "
+              f"{percentile(exact_latencies, 0.95):>8.2f}  {1.0:>9.3f}")
+
+        for quantize in ("float32", "int8"):
+            for nprobe in [int(value) for value in args.nprobe.split(",")]:
+                index, build_time = build_index(vectors, quantize, ivf_threshold=0, nprobe=nprobe)
+                latencies, found = timed_search(index, query_vectors, args.k, exact=False)
+                print(f"{'ivf ' + quantize:>14}  {nprobe:>6}  {build_time:>9.2f}  {percentile(latencies, 0.5):>8.2f}  "
+                      f"{percentile(latencies, 0.95):>8.2f}  {recall(truth, found):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Run a server variant in-process with the Gemini API and (optionally)
+Supabase replaced by the local stubs from stub_services.py, for load tests.
+
+Usage:
+  python benchmarks/launch_server.py main_supabase --port 8001 \\
+      --gemini-latency 0.8 --gemini-error-rate 0.01 --supabase-latency 0.03
+
+Variants: main (in-memory), main_hybrid (memory + stub Supabase),
+main_supabase (stub Supabase only).
+"""
+import argparse
+import importlib
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from stub_services import StubGeminiModel, StubLatency, StubSupabase
+
+VARIANTS = ("main", "main_hybrid", "main_supabase")
+
+
+def install_stubs(module, gemini: StubGeminiModel, supabase: StubSupabase = None):
+    """Point an imported server module at the stub services"""
+    module.GOOGLE_API_KEY = "stub"
+    module.gemini_client._model = gemini
+    if supabase is None or not hasattr(module, "supabase"):
+        return
+    module.supabase = supabase
+    if hasattr(module, "conversation_logger"):
+        module.conversation_logger.client = supabase
+    if hasattr(module, "hydrator") and module.HYDRATE_ON_STARTUP:
+        module.hydrator.client = supabase
+    if hasattr(module, "SupabaseChunkSearch"):
+        module.chunk_search = module.SupabaseChunkSearch(supabase)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("variant", choices=VARIANTS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="seconds per Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-tokens", type=int, default=60, help="tokens per stub answer")
+    parser.add_argument("--supabase-latency", type=float, default=0.03, help="seconds per Supabase round trip")
+    parser.add_argument("--supabase-jitter", type=float, default=0.01)
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-supabase", action="store_true", help="run main_hybrid in memory-only mode")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    # Never touch real services or leave snapshots behind
+    os.environ["GOOGLE_API_KEY"] = ""
+    os.environ["SUPABASE_ANON_KEY"] = ""
+    os.environ.setdefault("SNAPSHOT_PATH", "")
+    os.environ.setdefault("CONVERSATION_SPILL_PATH", "")
+
+    module = importlib.import_module(args.variant)
+    gemini = StubGeminiModel(
+        StubLatency(args.gemini_latency, args.gemini_jitter, args.gemini_error_rate, args.seed),
+        tokens=args.gemini_tokens,
+    )
+    supabase = None
+    if args.variant != "main" and not args.no_supabase:
+        supabase = StubSupabase(StubLatency(args.supabase_latency, args.supabase_jitter, args.supabase_error_rate, args.seed))
+    install_stubs(module, gemini, supabase)
+
+    print(f"🧪 {args.variant} with stub Gemini ({args.gemini_latency}s, {args.gemini_error_rate:.0%} errors)"
+          + (f" and stub Supabase ({args.supabase_latency}s, {args.supabase_error_rate:.0%} errors)" if supabase else ""))
+
+    import uvicorn
+    uvicorn.run(module.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the chatbot API.
+
+Drives /api/v1/chat, /api/v1/data/sources and /api/v1/data/upload with a
+weighted request mix at a fixed concurrency, either closed-loop (each
+worker sends its next request as soon as the previous one returns) or
+open-loop at --rate requests per second. In open-loop mode latency is
+measured from the scheduled send time, so queueing behind a saturated
+server is included. Reports latency percentiles, errors and throughput
+per endpoint.
+
+Start a server with stubbed Gemini/Supabase first (see launch_server.py),
+then for example:
+
+  python benchmarks/load_test.py --url http://127.0.0.1:8001 --concurrency 32 --duration 30
+  python benchmarks/load_test.py --sweep 1,4,16,64 --duration 15 --mix chat=8,sources=1,upload=1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_keyword_matcher import DOMAIN_TERMS, make_corpus
+from run_benchmarks import make_pdf
+
+QUESTIONS = [
+    "What is cloud scheduling?",
+    "How does virtual machine migration save energy?",
+    "Explain resource allocation with deadlines and priority queues",
+    "What are service level agreements in a data center?",
+    "How do containers compare to virtual machines for elastic workloads?",
+]
+
+# Substring of the answers chat returns when generation failed
+ANSWER_ERROR_MARKER = "encountered an error"
+
+
+class Stats:
+    """Latencies and outcomes per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, latency: float, status: Optional[int]):
+        self.latencies[endpoint].append(latency)
+        if status is None or status >= 400:
+            self.errors[endpoint] += 1
+        self.status_codes[endpoint][status or 0] += 1
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_upload_pdfs(count: int = 4, pages: int = 5) -> List[bytes]:
+    corpus = make_corpus(count * pages * 2, chunk_size=1400)
+    return [make_pdf(corpus[i * pages:(i + 1) * pages]) for i in range(count)]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("chat", "sources", "upload"):
+            raise ValueError(f"unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def send(session: aiohttp.ClientSession, base_url: str, endpoint: str, rng: random.Random,
+               pdfs: List[bytes], timeout: float) -> Optional[int]:
+    """Send one request and return its HTTP status (None on a client-side failure)"""
+    request_timeout = aiohttp.ClientTimeout(total=timeout)
+    try:
+        if endpoint == "chat":
+            question = rng.choice(QUESTIONS) + " " + rng.choice(DOMAIN_TERMS)
+            async with session.post(f"{base_url}/api/v1/chat", json={"question": question}, timeout=request_timeout) as response:
+                body = await response.json(content_type=None)
+                # The API reports generation failures inside a 200 answer
+                if response.status == 200 and ANSWER_ERROR_MARKER in str(body.get("answer", "")):
+                    return 599
+                return response.status
+        if endpoint == "sources":
+            async with session.get(f"{base_url}/api/v1/data/sources", timeout=request_timeout) as response:
+                await response.read()
+                return response.status
+        form = aiohttp.FormData()
+        form.add_field("files", rng.choice(pdfs), filename=f"load-{rng.randrange(20)}.pdf", content_type="application/pdf")
+        async with session.post(f"{base_url}/api/v1/data/upload", data=form, timeout=request_timeout) as response:
+            await response.read()
+            return response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+
+async def run_load(base_url: str, mix: Dict[str, float], concurrency: int, duration: float, rate: float,
+                   timeout: float, seed: int) -> Dict:
+    rng = random.Random(seed)
+    pdfs = make_upload_pdfs()
+    endpoints, weights = list(mix), list(mix.values())
+    stats = Stats()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    deadline = time.perf_counter() + duration
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def timed(endpoint: str, scheduled: float):
+            status = await send(session, base_url, endpoint, rng, pdfs, timeout)
+            stats.record(endpoint, time.perf_counter() - scheduled, status)
+
+        started = time.perf_counter()
+        if rate > 0:
+            # Open loop: arrivals every 1/rate seconds, at most `concurrency` in flight
+            slots = asyncio.Semaphore(concurrency)
+            tasks = []
+
+            async def arrival(endpoint: str, scheduled: float):
+                async with slots:
+                    await timed(endpoint, scheduled)
+
+            next_send = started
+            while next_send < deadline:
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+                tasks.append(asyncio.create_task(arrival(rng.choices(endpoints, weights)[0], next_send)))
+                next_send += 1.0 / rate
+            await asyncio.gather(*tasks)
+        else:
+            async def worker():
+                while time.perf_counter() < deadline:
+                    await timed(rng.choices(endpoints, weights)[0], time.perf_counter())
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {"concurrency": concurrency, "rate": rate or None, "elapsed_s": round(elapsed, 2), "endpoints": {}}
+    total = 0
+    for endpoint, latencies in sorted(stats.latencies.items()):
+        total += len(latencies)
+        report["endpoints"][endpoint] = {
+            "requests": len(latencies),
+            "errors": stats.errors[endpoint],
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            **{f"p{int(q * 100)}_ms": round(percentile(latencies, q) * 1000, 1) for q in (0.5, 0.9, 0.95, 0.99)},
+            "max_ms": round(max(latencies) * 1000, 1),
+            "status_codes": dict(stats.status_codes[endpoint]),
+        }
+    report["throughput_rps"] = round(total / elapsed, 2)
+    return report
+
+
+def print_report(report: Dict):
+    mode = f"open loop at {report['rate']} req/s" if report["rate"] else "closed loop"
+    print(f"\nConcurrency {report['concurrency']} ({mode}), {report['elapsed_s']}s, "
+          f"total throughput {report['throughput_rps']} req/s")
+    print(f"{'endpoint':<10} {'reqs':>6} {'errors':>6} {'rps':>7} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<10} {row['requests']:>6} {row['errors']:>6} {row['throughput_rps']:>7} "
+              f"{row['p50_ms']:>8} {row['p90_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--mix", default="chat=8,sources=1,upload=1", help="weighted endpoint mix")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sweep", help="comma-separated concurrency levels to run one after another")
+    parser.add_argument("--rate", type=float, default=0.0, help="open-loop requests per second (0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per run")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the reports to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.sweep.split(",")] if args.sweep else [args.concurrency]
+    reports = []
+    for concurrency in levels:
+        report = await run_load(args.url, mix, concurrency, args.duration, args.rate, args.timeout, args.seed)
+        print_report(report)
+        reports.append(report)
+
+    if len(reports) > 1:
+        # Saturation shows as throughput flattening while p95 keeps growing
+        print(f"\n{'concurrency':>11} {'req/s':>8} {'chat p95 (ms)':>14}")
+        for report in reports:
+            chat = report["endpoints"].get("chat", {})
+            print(f"{report['concurrency']:>11} {report['throughput_rps']:>8} {chat.get('p95_ms', '-'):>14}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"📝 Reports written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the retrieval and ingestion hot paths on synthetic
+corpora of 100 to 100k chunks:
+
+  search_documents            BM25 search in main.py (3 queries per run)
+  search_documents_supabase   client-side keyword scoring in main_supabase.py
+                              against a stub Supabase client (3 queries per run)
+  chunk_text                  chunking the corpus as one document
+  get_text_hash               hashing every chunk
+  extract_text_from_pdf_bytes a generated PDF with one page per 50 chunks
+
+Results (median / min / mean milliseconds per run) are written as JSON.
+With --baseline, any case whose median (or --metric min_ms) is more than
+--max-regression slower than the baseline fails the run with exit status 1.
+
+Usage:
+  python benchmarks/run_benchmarks.py [--sizes 100,1000,10000,100000] [--output results.json]
+  python benchmarks/run_benchmarks.py --baseline baseline.json [--max-regression 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# The server modules are imported without credentials or snapshots
+os.environ.setdefault("SNAPSHOT_PATH", "")
+os.environ["SUPABASE_ANON_KEY"] = ""
+# Keep the servers' progress logging out of the timings and the report
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from bench_keyword_matcher import QUERIES, make_corpus
+
+DEFAULT_SIZES = "100,1000,10000,100000"
+CHUNKS_PER_PAGE = 50
+CHUNKS_PER_DOCUMENT = 100
+
+
+def make_pdf(pages, line_length=90):
+    """Build a minimal PDF with one Helvetica text stream per page"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        lines = [text[start:start + line_length] for start in range(0, len(text), line_length)]
+        stream = "BT /F1 10 Tf 12 TL 40 760 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+class StubSupabase:
+    """Answers table(...).select(...).execute() with an in-memory chunk table"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return self
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": self.rows})()
+
+
+def query_strings():
+    return [" ".join(keywords) for keywords in QUERIES]
+
+
+# --- Cases: each setup(corpus) returns the function that is timed ---
+
+def setup_search_documents(corpus):
+    import main
+    main.documents_store.clear()
+    main.search_index.clear()
+    for doc_number, start in enumerate(range(0, len(corpus), CHUNKS_PER_DOCUMENT)):
+        doc_id = f"doc-{doc_number}.pdf"
+        chunks = corpus[start:start + CHUNKS_PER_DOCUMENT]
+        main.documents_store[doc_id] = chunks
+        main.search_index.add_document(doc_id, chunks)
+    queries = query_strings()
+    return lambda: [main.search_documents(query) for query in queries]
+
+
+def setup_search_documents_supabase(corpus):
+    import main_supabase
+    main_supabase.supabase = StubSupabase([
+        {"content": chunk, "document_id": f"doc-{i // CHUNKS_PER_DOCUMENT}", "chunk_index": i % CHUNKS_PER_DOCUMENT}
+        for i, chunk in enumerate(corpus)
+    ])
+    from chunk_search import extract_keywords
+    queries = [(query, extract_keywords(query)) for query in query_strings()]
+
+    return lambda: [main_supabase.search_documents_supabase_scan(query, keywords) for query, keywords in queries]
+
+
+def setup_chunk_text(corpus):
+    from text_processing import chunk_text
+    text = " ".join(corpus)
+    return lambda: chunk_text(text)
+
+
+def setup_get_text_hash(corpus):
+    from text_processing import get_text_hash
+    return lambda: [get_text_hash(chunk) for chunk in corpus]
+
+
+def setup_extract_text_from_pdf_bytes(corpus):
+    from pdf_extraction import extract_text_from_pdf_bytes
+    pages = [
+        " ".join(corpus[start:start + CHUNKS_PER_PAGE])[:3000]
+        for start in range(0, len(corpus), CHUNKS_PER_PAGE)
+    ]
+    pdf = make_pdf(pages)
+    return lambda: extract_text_from_pdf_bytes(pdf)
+
+
+CASES = {
+    "search_documents": setup_search_documents,
+    "search_documents_supabase": setup_search_documents_supabase,
+    "chunk_text": setup_chunk_text,
+    "get_text_hash": setup_get_text_hash,
+    "extract_text_from_pdf_bytes": setup_extract_text_from_pdf_bytes,
+}
+
+
+def measure(func, repeat, budget_seconds, min_sample_seconds=0.05):
+    """
+    Time up to `repeat` samples after a warm-up run, stopping once the budget
+    is spent. Fast functions are called several times per sample (like
+    timeit's autorange) so timer noise does not dominate; times are per call.
+    """
+    start = time.perf_counter()
+    func()
+    warmup = time.perf_counter() - start
+    number = max(1, int(min_sample_seconds / warmup)) if warmup > 0 else 1000
+
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) * 1000 / number)
+        if time.perf_counter() - started > budget_seconds:
+            break
+    return {
+        "median_ms": round(statistics.median(times), 4),
+        "min_ms": round(min(times), 4),
+        "mean_ms": round(statistics.mean(times), 4),
+        "runs": len(times),
+        "calls_per_run": number,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline, max_regression, metric="median_ms"):
+    """Return the cases whose metric regressed beyond max_regression"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        ratio = current[metric] / previous[metric] if previous[metric] else 1.0
+        marker = ""
+        if ratio > 1 + max_regression:
+            regressions.append(key)
+            marker = "  ✗ REGRESSION"
+        print(f"{key:<45} {previous[metric]:>10.3f} → {current[metric]:>10.3f} ms  ({ratio:.2f}x){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated corpus sizes in chunks")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated subset of cases")
+    parser.add_argument("--repeat", type=int, default=7, help="maximum timed runs per case")
+    parser.add_argument("--budget-seconds", type=float, default=3.0, help="time budget per case")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed slowdown, as a fraction (0.2 = 20%%)")
+    parser.add_argument("--metric", choices=["median_ms", "min_ms"], default="median_ms",
+                        help="statistic compared against the baseline (min_ms is less noisy)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    cases = [name.strip() for name in args.cases.split(",")]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = {}
+    for size in sizes:
+        corpus = make_corpus(size)
+        for name in cases:
+            func = CASES[name](corpus)
+            key = f"{name}[n={size}]"
+            results[key] = measure(func, args.repeat, args.budget_seconds)
+            print(f"{key:<45} median {results[key]['median_ms']:>10.3f} ms  ({results[key]['runs']} runs)")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\nComparing {args.metric} with {args.baseline} (max regression {args.max_regression:.0%}):")
+        regressions = compare(results, baseline, args.max_regression, args.metric)
+        if regressions:
+            print(f"✗ {len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
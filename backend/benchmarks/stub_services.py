@@ -0,0 +1,263 @@
+"""
+Local stand-ins for the Gemini API and Supabase used by the load-testing
+harness, with configurable latency and error rate, so a server variant can
+be driven to saturation without spending API quota.
+
+StubGeminiModel replaces the google.generativeai model behind
+gemini_client. StubSupabase implements the subset of the supabase-py client
+the servers use (table queries with eq/gt/order/limit/text_search, upsert, the
+search_document_chunks RPC and storage upload/remove) on in-memory tables.
+The RPC is answered by chunk_search.SQLiteChunkSearch, kept in sync with the
+document_chunks table, so the ranked search runs locally as it would in
+Postgres. Both are blocking or async exactly where the real clients are.
+"""
+import asyncio
+import itertools
+import random
+import re
+import threading
+import time
+import types
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from chunk_search import SQLiteChunkSearch
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class StubServiceError(Exception):
+    """Injected failure of a stub service"""
+
+
+class StubLatency:
+    """Latency in seconds with uniform +/- jitter, and an error rate in [0, 1]"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self) -> bool:
+        return self._random.random() < self.error_rate
+
+
+class StubGeminiModel:
+    """Async generate_content_async(prompt, stream=False) like genai.GenerativeModel"""
+
+    def __init__(self, timing: StubLatency, tokens: int = 60, token_interval: float = 0.0):
+        self.timing = timing
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        await asyncio.sleep(self.timing.delay())
+        if self.timing.should_fail():
+            raise StubServiceError("stub Gemini: injected error")
+        words = [f"token{i}" for i in range(self.tokens)]
+        if not stream:
+            return types.SimpleNamespace(text=" ".join(words))
+
+        async def chunks():
+            for word in words:
+                if self.token_interval:
+                    await asyncio.sleep(self.token_interval)
+                yield types.SimpleNamespace(text=word + " ")
+        return chunks()
+
+
+class _Query:
+    """Chainable table query; execute() applies it to the in-memory table"""
+
+    def __init__(self, db: "StubSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.payload: Any = None
+        self.filters = []
+        self.order_by = None
+        self.descending = False
+        self.row_limit: Optional[int] = None
+        self.count: Optional[str] = None
+        self.on_conflict: List[str] = []
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.operation = "select"
+        self.count = count
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "id"):
+        self.operation, self.payload = "upsert", payload
+        self.on_conflict = on_conflict.split(",")
+        return self
+
+    def update(self, payload):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def text_search(self, column, query, **kwargs):
+        terms = set(WORD_PATTERN.findall(query.lower()))
+        self.filters.append(lambda row: bool(terms & set(WORD_PATTERN.findall(str(row.get(column, "")).lower()))))
+        return self
+
+    def order(self, column, desc: bool = False):
+        self.order_by, self.descending = column, desc
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        self.db.round_trip()
+        with self.db.lock:
+            return self._apply()
+
+    def _apply(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.operation == "upsert":
+            by_key = {tuple(row.get(column) for column in self.on_conflict): row for row in rows}
+            written, replaced_documents = [], set()
+            for row in self.payload if isinstance(self.payload, list) else [self.payload]:
+                existing = by_key.get(tuple(row.get(column) for column in self.on_conflict))
+                if existing is not None:
+                    existing.update(row)
+                    replaced_documents.add(existing.get("document_id"))
+                else:
+                    existing = {"id": next(self.db.ids), "upload_date": datetime.now().isoformat(), **row}
+                    rows.append(existing)
+                written.append(dict(existing))
+            if self.table == "document_chunks":
+                for document_id in replaced_documents:
+                    self.db.search.delete_document(document_id)
+                self.db.search.insert_rows([
+                    row for row in rows if row.get("document_id") in replaced_documents
+                ] + [row for row in written if row.get("document_id") not in replaced_documents])
+            return types.SimpleNamespace(data=written, count=len(written))
+        if self.operation == "insert":
+            inserted = []
+            for row in self.payload if isinstance(self.payload, list) else [self.payload]:
+                row = {"id": next(self.db.ids), "upload_date": datetime.now().isoformat(), **row}
+                rows.append(row)
+                inserted.append(dict(row))
+            if self.table == "document_chunks":
+                self.db.search.insert_rows(inserted)
+            return types.SimpleNamespace(data=inserted, count=len(inserted))
+
+        matched = [row for row in rows if all(check(row) for check in self.filters)]
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+            return types.SimpleNamespace(data=[dict(row) for row in matched], count=len(matched))
+        if self.operation == "delete":
+            self.db.tables[self.table] = [row for row in rows if row not in matched]
+            if self.table == "documents":
+                # ON DELETE CASCADE of document_chunks
+                deleted_ids = {row["id"] for row in matched}
+                self.db.tables["document_chunks"] = [
+                    chunk for chunk in self.db.tables.get("document_chunks", [])
+                    if chunk.get("document_id") not in deleted_ids
+                ]
+            elif self.table == "document_chunks":
+                deleted_ids = {row.get("document_id") for row in matched}
+            else:
+                deleted_ids = set()
+            for document_id in deleted_ids:
+                self.db.search.delete_document(document_id)
+            return types.SimpleNamespace(data=matched, count=len(matched))
+
+        total = len(matched)
+        if self.order_by:
+            matched.sort(key=lambda row: row.get(self.order_by) or 0, reverse=self.descending)
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        return types.SimpleNamespace(data=[dict(row) for row in matched], count=total if self.count else None)
+
+
+class _Bucket:
+    def __init__(self, db: "StubSupabase"):
+        self.db = db
+
+    def upload(self, path: str, file, file_options=None):
+        self.db.round_trip()
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                size = len(f.read())
+        else:
+            size = len(file)
+        with self.db.lock:
+            if path in self.db.files and str((file_options or {}).get("upsert", "false")).lower() != "true":
+                raise StubServiceError(f"stub Supabase: 409 The resource already exists: {path}")
+            self.db.files[path] = size
+        return {"path": path}
+
+    def remove(self, paths: List[str]):
+        self.db.round_trip()
+        with self.db.lock:
+            for path in paths:
+                self.db.files.pop(path, None)
+        return [{"name": path} for path in paths]
+
+
+class _Rpc:
+    def __init__(self, db: "StubSupabase", name: str, params: Dict[str, Any]):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.round_trip()
+        if self.name != "search_document_chunks":
+            raise StubServiceError(f"stub Supabase: Could not find the function public.{self.name} (PGRST202)")
+        # Prefix terms joined with | as built by chunk_search.build_tsquery
+        terms = [term.strip(" ():*") for term in self.params["query_text"].split("|")]
+        return types.SimpleNamespace(
+            data=self.db.search.search([term for term in terms if term], self.params.get("match_count", 8))
+        )
+
+
+class StubSupabase:
+    """In-memory supabase-py client; every round trip sleeps and may fail"""
+
+    def __init__(self, timing: StubLatency):
+        self.timing = timing
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.files: Dict[str, int] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        # Local stand-in for the search_document_chunks function
+        self.search = SQLiteChunkSearch()
+        self.round_trips = 0
+        self.storage = types.SimpleNamespace(from_=lambda bucket: _Bucket(self))
+
+    def round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.timing.delay())
+        if self.timing.should_fail():
+            raise StubServiceError("stub Supabase: injected error")
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _Rpc:
+        return _Rpc(self, name, params)
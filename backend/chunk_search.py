@@ -0,0 +1,130 @@
+"""
+Ranked chunk search backends.
+
+SupabaseChunkSearch pushes ranking down into Postgres through the
+search_document_chunks RPC (see sql/search_document_chunks.sql), so only the
+top N chunks cross the network. SQLiteChunkSearch implements the same
+interface on SQLite FTS5 so the search can be exercised locally without
+Supabase.
+"""
+import re
+import sqlite3
+import threading
+from typing import Dict, List
+
+from metrics import supabase_call
+
+STOP_WORDS = {'the', 'is', 'are', 'what', 'how', 'where', 'when', 'why', 'who', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'explain', 'tell', 'me', 'about'}
+
+SEARCH_TERM_PATTERN = re.compile(r"\w+")
+# Shorter tokens (the "c" of "c++") would prefix-match most of the corpus
+MIN_SEARCH_TERM_LENGTH = 2
+
+# Errors PostgREST/Postgres report when the search RPC is not installed
+MISSING_FUNCTION_MARKERS = ("PGRST202", "42883", "Could not find the function", "does not exist")
+
+
+def extract_keywords(query: str) -> List[str]:
+    """Extract keywords from a question, dropping common words"""
+    keywords = [word.lower().strip() for word in query.split() if word.lower().strip() not in STOP_WORDS and len(word.strip()) > 2]
+    if not keywords:
+        # If no meaningful keywords, use the original query
+        keywords = [query.lower().strip()]
+    return keywords
+
+
+def search_terms(keywords: List[str]) -> List[str]:
+    """Reduce keywords to distinct word tokens that are safe to embed in a query"""
+    terms = []
+    for keyword in keywords:
+        for term in SEARCH_TERM_PATTERN.findall(keyword.lower()):
+            if len(term) >= MIN_SEARCH_TERM_LENGTH and term not in terms:
+                terms.append(term)
+    return terms
+
+
+def build_tsquery(keywords: List[str]) -> str:
+    """Build a Postgres to_tsquery expression matching any keyword prefix"""
+    return " | ".join(f"{term}:*" for term in search_terms(keywords))
+
+
+def build_fts5_query(keywords: List[str]) -> str:
+    """Build an SQLite FTS5 MATCH expression matching any keyword prefix"""
+    return " OR ".join(f'"{term}"*' for term in search_terms(keywords))
+
+
+def is_missing_function_error(error: Exception) -> bool:
+    """Whether a failed RPC call means the function is not installed (as opposed to a transient error)"""
+    message = str(error)
+    return any(marker in message for marker in MISSING_FUNCTION_MARKERS)
+
+
+class SupabaseChunkSearch:
+    """Ranked search executed inside Postgres via an RPC"""
+
+    def __init__(self, client, function_name: str = "search_document_chunks"):
+        self.client = client
+        self.function_name = function_name
+
+    def search(self, keywords: List[str], limit: int = 8) -> List[Dict]:
+        """Return the top `limit` chunks as dicts with content, document_id, chunk_index and score"""
+        query_text = build_tsquery(keywords)
+        if not query_text:
+            return []
+        result = supabase_call(
+            "search_rpc", self.client.rpc(self.function_name, {"query_text": query_text, "match_count": limit}).execute
+        )
+        return result.data or []
+
+
+class SQLiteChunkSearch:
+    """SQLite FTS5 stand-in for SupabaseChunkSearch"""
+
+    def __init__(self, path: str = ":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks USING fts5("
+                "content, document_id UNINDEXED, chunk_index UNINDEXED, "
+                "tokenize = 'porter unicode61')"
+            )
+            self.conn.commit()
+
+    def add_chunks(self, document_id: str, chunks: List[str]):
+        """Insert a document's chunks in chunk_index order"""
+        self.insert_rows([
+            {"content": chunk, "document_id": document_id, "chunk_index": i} for i, chunk in enumerate(chunks)
+        ])
+
+    def insert_rows(self, rows: List[Dict]):
+        """Insert document_chunks rows (dicts with content, document_id and chunk_index)"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO document_chunks (content, document_id, chunk_index) VALUES (?, ?, ?)",
+                [(row["content"], str(row["document_id"]), row["chunk_index"]) for row in rows],
+            )
+            self.conn.commit()
+
+    def delete_document(self, document_id: str):
+        """Remove every chunk belonging to document_id"""
+        with self._lock:
+            self.conn.execute("DELETE FROM document_chunks WHERE document_id = ?", (str(document_id),))
+            self.conn.commit()
+
+    def search(self, keywords: List[str], limit: int = 8) -> List[Dict]:
+        """Return the top `limit` chunks ranked by FTS5 bm25"""
+        match = build_fts5_query(keywords)
+        if not match:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT content, document_id, chunk_index, -bm25(document_chunks) AS score "
+                "FROM document_chunks WHERE document_chunks MATCH ? "
+                "ORDER BY bm25(document_chunks) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [
+            {"content": content, "document_id": document_id, "chunk_index": chunk_index, "score": score}
+            for content, document_id, chunk_index, score in rows
+        ]
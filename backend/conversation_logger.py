@@ -0,0 +1,166 @@
+"""
+Background writer for chat_conversations rows.
+
+Chat handlers hand rows to log(), which never waits on Supabase. A single
+flusher task batches the rows and inserts them when CONVERSATION_BATCH_SIZE
+rows are pending or CONVERSATION_FLUSH_SECONDS have passed. When the queue is
+full, or a batch still fails after retries, rows are appended to a JSON-lines
+spill file that is replayed on the next start.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from supabase_writer import run_with_retries
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_QUEUE_SIZE = int(os.getenv("CONVERSATION_QUEUE_SIZE", 1000))
+CONVERSATION_BATCH_SIZE = int(os.getenv("CONVERSATION_BATCH_SIZE", 50))
+CONVERSATION_FLUSH_SECONDS = float(os.getenv("CONVERSATION_FLUSH_SECONDS", 2.0))
+# Empty disables spilling; overflowing rows are then dropped
+CONVERSATION_SPILL_PATH = os.getenv("CONVERSATION_SPILL_PATH", "conversation_spill.jsonl")
+
+# Columns added by sql/chat_conversation_timings.sql
+TIMING_COLUMNS = ("retrieval_ms", "llm_ms")
+
+
+class ConversationLogger:
+    """Bounded queue of conversation rows drained by one batching task"""
+
+    def __init__(self, client=None, queue_size: int = CONVERSATION_QUEUE_SIZE,
+                 batch_size: int = CONVERSATION_BATCH_SIZE, flush_seconds: float = CONVERSATION_FLUSH_SECONDS,
+                 spill_path: str = CONVERSATION_SPILL_PATH):
+        self.client = client
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.spill_path = spill_path
+        self.timing_columns = True
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Optional[asyncio.Task] = None
+        self._pending: List[Dict[str, Any]] = []
+
+    async def start(self):
+        """Start the flusher and requeue rows spilled by a previous run"""
+        if not self.client:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        for row in self._read_spill():
+            self.log(row)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush every queued row (called from the app shutdown event)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._in_flight:
+            await self._in_flight
+        rows, self._pending = self._pending, []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        for start in range(0, len(rows), self.batch_size):
+            await self._write(rows[start:start + self.batch_size])
+
+    def log(self, row: Dict[str, Any]):
+        """Queue a row without waiting; spills or drops it when the queue is full"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self._spill([row])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": (self._queue.qsize() if self._queue else 0) + len(self._pending),
+            "written": self.written,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+        }
+
+    async def _run(self):
+        while True:
+            # Rows collected so far stay on self so stop() can still write them
+            self._pending.append(await self._queue.get())
+            deadline = time.monotonic() + self.flush_seconds
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            # Shielded so shutdown waits for the batch instead of abandoning it
+            self._in_flight = asyncio.create_task(self._write(batch))
+            await asyncio.shield(self._in_flight)
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        try:
+            await run_with_retries(
+                self._insert, rows, description=f"Conversation insert ({len(rows)} rows)", operation="conversation_insert"
+            )
+            self.written += len(rows)
+        except Exception as e:
+            logger.warning("⚠️ Failed to store %s conversations: %s", len(rows), e)
+            self._spill(rows)
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        if self.timing_columns:
+            try:
+                return self.client.table("chat_conversations").insert(rows).execute()
+            except Exception as e:
+                if not any(column in str(e) for column in TIMING_COLUMNS):
+                    raise
+                # Migration not applied yet: keep logging without the extra columns
+                logger.warning("⚠️ chat_conversations has no timing columns, run sql/chat_conversation_timings.sql")
+                self.timing_columns = False
+        rows = [{k: v for k, v in row.items() if k not in TIMING_COLUMNS} for row in rows]
+        return self.client.table("chat_conversations").insert(rows).execute()
+
+    def _spill(self, rows: List[Dict[str, Any]]):
+        if not self.spill_path:
+            self.dropped += len(rows)
+            return
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+            self.spilled += len(rows)
+        except OSError as e:
+            logger.warning("⚠️ Failed to spill conversations: %s", e)
+            self.dropped += len(rows)
+
+    def _read_spill(self) -> List[Dict[str, Any]]:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return []
+        rows = []
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        os.remove(self.spill_path)
+        if rows:
+            logger.info("📥 Requeued %s spilled conversations", len(rows))
+        return rows
+
+
+def elapsed_ms(started: float) -> int:
+    """Milliseconds since a time.perf_counter() reading"""
+    return int((time.perf_counter() - started) * 1000)
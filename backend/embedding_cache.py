@@ -0,0 +1,212 @@
+"""
+Persistent embedding cache keyed by chunk hash.
+
+Vectors are stored as rows of a float32 matrix in `vectors.f32`, read through
+a memory map, and `hashes.bin` holds the 32-byte SHA-256 (get_text_hash) of
+the chunk of each row. Both files are append-only: the vector rows are
+written and flushed before their hashes, and `meta.json` is only written
+(atomically) after the first rows, so a crash mid-write leaves at most
+unreferenced rows. Each embedding model gets its own directory.
+
+Several processes (ingest.py, the servers) may share a cache directory:
+writers take an exclusive fcntl lock on it and first pick up the rows other
+processes appended. Without fcntl (Windows) only one process may write.
+
+CachedEmbeddings wraps a LangChain embeddings object so identical chunks,
+within a batch, across documents and across ingestion runs, are embedded
+only once.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from text_processing import get_text_hash
+
+# Directory holding one cache per embedding model
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+
+HASH_BYTES = 32
+VECTORS_FILENAME = "vectors.f32"
+HASHES_FILENAME = "hashes.bin"
+META_FILENAME = "meta.json"
+LOCK_FILENAME = ".lock"
+
+
+class EmbeddingCache:
+    """Chunk hash -> float32 vector, backed by a memory-mapped matrix"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0  # valid rows in the files
+        self._dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._refresh()
+
+    @classmethod
+    def for_model(cls, model_name: str, root: str = EMBEDDING_CACHE_DIR) -> "EmbeddingCache":
+        """Open the cache of one embedding model under root"""
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+        suffix = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:8]
+        return cls(os.path.join(root, f"{safe_name}-{suffix}"))
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _size(self, filename: str) -> int:
+        try:
+            return os.path.getsize(self._path(filename))
+        except FileNotFoundError:
+            return 0
+
+    def _refresh(self):
+        """Pick up rows appended since the last refresh, by this or another process"""
+        if self._dim is None:
+            try:
+                with open(self._path(META_FILENAME), encoding="utf-8") as f:
+                    self._dim = json.load(f)["dim"]
+            except FileNotFoundError:
+                # No rows were ever completed (a crash before meta.json): empty cache
+                return
+        # Only rows with both a vector and a hash are valid
+        count = min(self._size(VECTORS_FILENAME) // (self._dim * 4), self._size(HASHES_FILENAME) // HASH_BYTES)
+        if count <= self._count:
+            return
+        with open(self._path(HASHES_FILENAME), "rb") as f:
+            f.seek(self._count * HASH_BYTES)
+            hashes = f.read((count - self._count) * HASH_BYTES)
+        for offset in range(count - self._count):
+            self._rows.setdefault(hashes[offset * HASH_BYTES:(offset + 1) * HASH_BYTES], self._count + offset)
+        self._count = count
+        self._remap(count)
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive lock on the cache directory, held by one writing process at a time"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(LOCK_FILENAME), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _write_meta(self):
+        temp_path = self._path(META_FILENAME + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self._dim}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path(META_FILENAME))
+
+    def _remap(self, count: int):
+        self._matrix = None
+        if count:
+            self._matrix = np.memmap(self._path(VECTORS_FILENAME), dtype=np.float32, mode="r", shape=(count, self._dim))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    def get_many(self, hashes: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector for each hex chunk hash, or None"""
+        with self._lock:
+            rows = [self._rows.get(bytes.fromhex(h)) for h in hashes]
+            vectors = [None if row is None else np.array(self._matrix[row]) for row in rows]
+        found = sum(vector is not None for vector in vectors)
+        self.hits += found
+        self.misses += len(vectors) - found
+        return vectors
+
+    def add_many(self, hashes: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Append the vectors of chunks that are not cached yet"""
+        if not hashes:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._write_lock():
+            self._refresh()
+            new_cache = self._dim is None
+            if new_cache:
+                self._dim = int(matrix.shape[1])
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match the cache ({self._dim})")
+
+            new_keys, new_rows, seen = [], [], set()
+            for h, vector in zip(hashes, matrix):
+                key = bytes.fromhex(h)
+                if key not in self._rows and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(vector)
+            if not new_keys:
+                return
+
+            start = self._count
+            # Truncate rows left over from an interrupted write before appending
+            with open(self._path(VECTORS_FILENAME), "ab") as f:
+                f.truncate(start * self._dim * 4)
+                f.write(np.stack(new_rows).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._path(HASHES_FILENAME), "ab") as f:
+                f.truncate(start * HASH_BYTES)
+                f.write(b"".join(new_keys))
+                f.flush()
+                os.fsync(f.fileno())
+            if new_cache:
+                self._write_meta()
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = start + offset
+            self._count = start + len(new_keys)
+            self._remap(self._count)
+
+    def stats(self) -> Dict[str, object]:
+        return {"directory": self.directory, "vectors": len(self), "dim": self._dim, "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings:
+    """LangChain embeddings wrapper that only embeds chunks missing from the cache"""
+
+    def __init__(self, embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [get_text_hash(text) for text in texts]
+        vectors = self.cache.get_many(hashes)
+
+        # Embed each distinct missing chunk once
+        missing: Dict[str, str] = {}
+        for h, text, vector in zip(hashes, texts, vectors):
+            if vector is None:
+                missing.setdefault(h, text)
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.add_many(list(missing.keys()), computed)
+            by_hash = dict(zip(missing.keys(), computed))
+            vectors = [by_hash[h] if vector is None else vector for h, vector in zip(hashes, vectors)]
+        # Rounded to float32 either way, so results do not depend on cache state
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are rarely repeated verbatim; they are not cached
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,68 @@
+"""
+Shared, long-lived Gemini client.
+
+A single GenerativeModel is reused across requests (the SDK caches the
+underlying async transport, so connections are reused as well) and calls go
+through the async generation API with a cap on in-flight requests, so one
+uvicorn worker keeps serving other chats while Gemini is generating.
+"""
+import asyncio
+import os
+from typing import AsyncIterator
+
+import google.generativeai as genai
+
+from metrics import GEMINI_LATENCY, timed
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Maximum number of Gemini calls in flight per worker process
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 32))
+
+
+class GeminiClient:
+    """Async Gemini wrapper that limits concurrent generation calls"""
+
+    def __init__(self, model_name: str = GEMINI_MODEL, max_concurrency: int = GEMINI_MAX_CONCURRENCY):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._model = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def model(self):
+        # Created on first use so genai.configure() has already run
+        if self._model is None:
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        """Generate a complete answer for prompt"""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                with timed(GEMINI_LATENCY, outcome=True, mode="generate"):
+                    response = await self.model.generate_content_async(prompt)
+                    return response.text
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield answer text fragments as Gemini produces them"""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                with timed(GEMINI_LATENCY, outcome=True, mode="stream"):
+                    response = await self.model.generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            continue  # Chunk without text parts (e.g. finish metadata)
+                        if text:
+                            yield text
+            finally:
+                self.in_flight -= 1
+
+
+gemini_client = GeminiClient()
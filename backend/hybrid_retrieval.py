@@ -0,0 +1,104 @@
+"""
+Hybrid retrieval: several retrievers (e.g. BM25 and vector search) run
+concurrently and their rankings are merged with reciprocal rank fusion,
+score(chunk) = sum over legs of weight / (RRF_K + rank).
+
+Every leg has its own timeout. A leg that times out or fails is left out of
+the fusion, so a slow retriever degrades the ranking instead of the request.
+Relevance is each leg's own cut-off (BM25 term matches, the vector score
+floor), so a question matched by only one leg still gets context and one
+matched by none gets an empty result.
+Blocking legs run in worker threads; a timed-out thread finishes in the
+background and its result is discarded.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from metrics import RETRIEVER_LEG_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Rank offset of reciprocal rank fusion (60 is the usual choice)
+RRF_K = int(os.getenv("RRF_K", 60))
+# Candidates taken from each leg before fusion
+RRF_CANDIDATES = int(os.getenv("RRF_CANDIDATES", 20))
+RETRIEVAL_LEXICAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_LEXICAL_TIMEOUT_SECONDS", 0.5))
+RETRIEVAL_VECTOR_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_VECTOR_TIMEOUT_SECONDS", 0.5))
+
+SearchFunction = Callable[[str, int], Union[List[str], Awaitable[List[str]]]]
+
+
+class RetrieverLeg(NamedTuple):
+    """One retriever: search(query, limit) returns chunk texts, best first"""
+    name: str
+    search: SearchFunction
+    timeout: float
+    blocking: bool = True
+    weight: float = 1.0
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Tuple[float, Sequence[str]]], k: int = RRF_K) -> List[Tuple[float, str]]:
+    """Merge (weight, ranked texts) lists into (score, text) pairs, best first"""
+    scores: Dict[str, float] = {}
+    for weight, ranking in rankings:
+        for rank, text in enumerate(ranking, start=1):
+            scores[text] = scores.get(text, 0.0) + weight / (k + rank)
+    # Ties keep the order in which the texts were first seen
+    return sorted(((score, text) for text, score in scores.items()), key=lambda item: -item[0])
+
+
+class HybridRetriever:
+    """Runs its legs concurrently and fuses their rankings"""
+
+    def __init__(self, legs: List[RetrieverLeg], candidates: int = RRF_CANDIDATES, k: int = RRF_K):
+        self.legs = legs
+        self.candidates = candidates
+        self.k = k
+        self.leg_stats = {
+            leg.name: {"calls": 0, "timeouts": 0, "errors": 0, "total_ms": 0.0} for leg in legs
+        }
+
+    async def _run_leg(self, leg: RetrieverLeg, query: str, limit: int) -> Optional[List[str]]:
+        """The leg's ranking, or None if it timed out or failed"""
+        stats = self.leg_stats[leg.name]
+        stats["calls"] += 1
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            if leg.blocking:
+                pending = asyncio.to_thread(leg.search, query, limit)
+            else:
+                pending = leg.search(query, limit)
+            return await asyncio.wait_for(pending, leg.timeout)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            outcome = "timeout"
+            logger.warning("⏱️ Retriever %s timed out after %ss", leg.name, leg.timeout)
+            return None
+        except Exception as e:
+            stats["errors"] += 1
+            outcome = "error"
+            logger.error("❌ Retriever %s error: %s", leg.name, e)
+            return None
+        finally:
+            seconds = time.perf_counter() - started
+            stats["total_ms"] += seconds * 1000
+            RETRIEVER_LEG_LATENCY.labels(leg.name, outcome).observe(seconds)
+
+    async def retrieve(self, query: str, limit: int = 3) -> List[str]:
+        """Return the `limit` best chunk texts across all legs"""
+        candidates = max(limit, self.candidates)
+        rankings = await asyncio.gather(*(self._run_leg(leg, query, candidates) for leg in self.legs))
+        fused = reciprocal_rank_fusion(
+            [(leg.weight, ranking or []) for leg, ranking in zip(self.legs, rankings)], self.k
+        )
+        return [text for _, text in fused[:limit]]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {**stats, "total_ms": round(stats["total_ms"], 1)}
+            for name, stats in self.leg_stats.items()
+        }
@@ -1,4 +1,3 @@
-import os
 from dotenv import load_dotenv
 
 # Import updated LangChain components from langchain_community
@@ -11,6 +10,21 @@ from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from ingest_manifest import (
+    YOUTUBE_PREFIX,
+    IngestManifest,
+    file_sources,
+    reset_untracked_store,
+    sync_sources,
+)
+from parallel_loading import (
+    INGEST_PROCESS_WORKERS,
+    INGEST_THREAD_WORKERS,
+    Source,
+    load_sources,
+)
+
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,43 +45,49 @@ DOCUMENT_LOADERS = {
     ".doc": UnstructuredWordDocumentLoader,
 }
 
-def load_documents(data_path):
+def fetch_youtube_transcript(url):
+    """
+    Fetches the transcript of one YouTube video.
+    """
+    loader = YoutubeLoader.from_youtube_url(url, add_video_info=True)
+    return loader.load()
+
+def load_documents(data_path, loaders=DOCUMENT_LOADERS, process_workers=INGEST_PROCESS_WORKERS):
     """
     Loads all supported documents from the specified data path.
+    Files are parsed in parallel worker processes; a file that fails to
+    load is reported and skipped. Documents are returned in filename order.
     Returns a list of LangChain Document objects.
     """
     documents = []
     print(f"Scanning for documents in: {data_path}")
-    for filename in os.listdir(data_path):
-        file_path = os.path.join(data_path, filename)
-        _, ext = os.path.splitext(filename)
-        
-        if ext in DOCUMENT_LOADERS:
-            try:
-                print(f"Loading document: {filename}")
-                loader_class = DOCUMENT_LOADERS[ext]
-                loader = loader_class(file_path)
-                documents.extend(loader.load())
-            except Exception as e:
-                print(f"Error loading {filename}: {e}")
+    sources = file_sources(data_path, loaders, fingerprint=False)
+    for source, loaded, error in load_sources(sources, process_workers=process_workers):
+        if error is not None:
+            print(f"Error loading {source.key}: {error}")
+            continue
+        print(f"Loaded document: {source.key}")
+        documents.extend(loaded)
     
     print(f"Successfully loaded {len(documents)} documents.")
     return documents
 
-def load_youtube_videos(urls):
+def load_youtube_videos(urls, fetch=fetch_youtube_transcript, thread_workers=INGEST_THREAD_WORKERS):
     """
     Loads transcripts from a list of YouTube video URLs.
+    Transcripts are fetched concurrently in threads; a URL that fails is
+    reported and skipped. Documents are returned in URL order.
     Returns a list of LangChain Document objects.
     """
     documents = []
     print(f"Loading YouTube transcripts for {len(urls)} video(s)...")
-    for url in urls:
-        try:
-            print(f"Loading transcript for: {url}")
-            loader = YoutubeLoader.from_youtube_url(url, add_video_info=True)
-            documents.extend(loader.load())
-        except Exception as e:
-            print(f"Error loading YouTube URL {url}: {e}")
+    sources = youtube_sources(urls, fetch)
+    for source, loaded, error in load_sources(sources, thread_workers=thread_workers):
+        if error is not None:
+            print(f"Error loading YouTube URL {source.fingerprint}: {error}")
+            continue
+        print(f"Loaded transcript for: {source.fingerprint}")
+        documents.extend(loaded)
     
     print(f"Successfully loaded {len(documents)} YouTube transcripts.")
     return documents
@@ -82,29 +102,30 @@ def split_text(documents):
     print(f"Split documents into {len(chunks)} chunks.")
     return chunks
 
-def create_vector_store(chunks):
+def youtube_sources(urls, fetch=fetch_youtube_transcript):
     """
-    Creates and persists a Chroma vector store from the text chunks.
+    One ingestion source per YouTube URL. Transcripts do not change, so the
+    URL itself is the fingerprint and known videos are never reloaded.
     """
-    print("Creating embeddings and vector store...")
-    
-    # Initialize the embedding model
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    
-    # Create the vector store from the chunks and embeddings
-    # This will automatically create the embeddings and store them.
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=DB_PATH
+    return [Source(f"{YOUTUBE_PREFIX}{url}", url, fetch, (url,), io_bound=True) for url in urls]
+
+def open_vector_store():
+    """
+    Opens (or creates) the persisted Chroma vector store.
+    Chunk embeddings are cached on disk, so unchanged chunks are never
+    embedded twice (see embedding_cache.py).
+    """
+    embeddings = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL),
+        EmbeddingCache.for_model(EMBEDDING_MODEL),
     )
-    
-    print(f"Vector store created and saved to: {DB_PATH}")
-    return vector_store
+    return Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
 
 def main():
     """
     Main function to run the ingestion pipeline.
+    Only new or changed sources are embedded; vectors of changed and
+    removed sources are deleted (see ingest_manifest.py).
     """
     print("--- Starting Ingestion Pipeline ---")
     
@@ -115,21 +136,22 @@ def main():
         "https://www.youtube.com/watch?v=8C_kHJ5YEiA" 
     ]
     
-    # Load all documents from files and YouTube
-    all_documents = []
-    all_documents.extend(load_documents(DATA_PATH))
-    all_documents.extend(load_youtube_videos(youtube_urls))
+    manifest = IngestManifest.load(DB_PATH)
+    reset_untracked_store(DB_PATH, manifest)
+    
+    # Collect all files and YouTube videos with their fingerprints
+    sources = file_sources(DATA_PATH, DOCUMENT_LOADERS, manifest)
+    sources.extend(youtube_sources(youtube_urls))
     
-    if not all_documents:
+    if not sources and not manifest.sources:
         print("No new documents or videos to process. Exiting.")
         return
 
-    # Split the documents into chunks
-    text_chunks = split_text(all_documents)
-    
-    # Create and persist the vector store
-    create_vector_store(text_chunks)
+    # Embed what changed and drop vectors of what was removed
+    vector_store = open_vector_store()
+    sync_sources(vector_store, manifest, sources, split_text, data_path=DATA_PATH)
     
+    print(f"Vector store updated at: {DB_PATH}")
     print("--- Ingestion Pipeline Complete ---")
 
 if __name__ == "__main__":
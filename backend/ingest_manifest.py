@@ -0,0 +1,177 @@
+"""
+Incremental ingestion into the Chroma vector store.
+
+A JSON manifest kept next to the vector store records, for every ingested
+source (a file in data/ or a YouTube URL), its content fingerprint and the
+ids of the chunk vectors created for it. Each run only loads and embeds
+sources that are new or changed and deletes the vectors of changed or
+removed ones, so the work is proportional to the change, not the corpus.
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional
+
+from parallel_loading import Source, load_file, load_sources
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+# Manifest keys of YouTube sources; every other key is a filename in data/
+YOUTUBE_PREFIX = "youtube:"
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash a file in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids(key: str, fingerprint: str, count: int) -> List[str]:
+    """Deterministic vector ids for the chunks of one version of a source"""
+    prefix = hashlib.sha256(f"{key}\0{fingerprint}".encode("utf-8")).hexdigest()[:32]
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+class IngestManifest:
+    """Persisted map of source key -> fingerprint, chunk ids and file stat"""
+
+    def __init__(self, path: str, sources: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = path
+        self.sources: Dict[str, Dict[str, Any]] = sources or {}
+        self.exists = sources is not None
+
+    @classmethod
+    def load(cls, db_path: str) -> "IngestManifest":
+        path = os.path.join(db_path, MANIFEST_FILENAME)
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, encoding="utf-8") as f:
+            return cls(path, json.load(f)["sources"])
+
+    def save(self):
+        """Write the manifest atomically"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "sources": self.sources}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+
+def reset_untracked_store(db_path: str, manifest: IngestManifest):
+    """
+    A vector store without a manifest was built by full re-ingestion and its
+    vectors cannot be matched to sources; remove it so it is rebuilt once.
+    """
+    if not manifest.exists and os.path.isdir(db_path) and os.listdir(db_path):
+        print(f"No ingest manifest in {db_path}; rebuilding the vector store once")
+        shutil.rmtree(db_path)
+
+
+def file_sources(data_path: str, loaders: Dict[str, Callable[[str], Any]],
+                 manifest: Optional[IngestManifest] = None, fingerprint: bool = True) -> List[Source]:
+    """
+    One Source per supported file in data_path, in filename order.
+    Files whose size and mtime match the manifest reuse the recorded hash
+    instead of being read again; fingerprint=False skips hashing entirely.
+    """
+    sources = []
+    if not os.path.isdir(data_path):
+        return sources
+    for filename in sorted(os.listdir(data_path)):
+        file_path = os.path.join(data_path, filename)
+        _, ext = os.path.splitext(filename)
+        loader_class = loaders.get(ext.lower())
+        if loader_class is None or not os.path.isfile(file_path):
+            continue
+        stat = os.stat(file_path)
+        entry = manifest.sources.get(filename) if manifest else None
+        if not fingerprint:
+            file_hash = ""
+        elif entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            file_hash = entry["fingerprint"]
+        else:
+            file_hash = file_sha256(file_path)
+        sources.append(Source(filename, file_hash, load_file, (loader_class, file_path)))
+    return sources
+
+
+def is_file_source(key: str) -> bool:
+    return not key.startswith(YOUTUBE_PREFIX)
+
+
+def _file_stat(data_path: Optional[str], key: str) -> Dict[str, Any]:
+    if not data_path:
+        return {}
+    file_path = os.path.join(data_path, key)
+    if not os.path.isfile(file_path):
+        return {}
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def sync_sources(vector_store, manifest: IngestManifest, sources: List[Source],
+                 split_documents: Callable[[List[Any]], List[Any]],
+                 data_path: Optional[str] = None,
+                 removable: Callable[[str], bool] = lambda key: True,
+                 load: Callable[[List[Source]], Any] = load_sources) -> Dict[str, int]:
+    """
+    Bring the vector store in line with `sources`: embed new and changed
+    sources and delete the vectors of changed ones and of manifest entries
+    that are no longer in `sources` (limited to keys accepted by removable).
+    Changed sources are loaded in parallel by `load` and embedded one at a
+    time in source order. The manifest is saved after every source, so an
+    interrupted run resumes.
+    """
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "failed": 0, "chunks_embedded": 0}
+    current_keys = {source.key for source in sources}
+
+    to_load = []
+    for source in sources:
+        entry = manifest.sources.get(source.key)
+        if entry and entry["fingerprint"] == source.fingerprint:
+            # Refresh the stat so the next run can skip hashing this file
+            entry.update(_file_stat(data_path, source.key))
+            stats["unchanged"] += 1
+        else:
+            to_load.append(source)
+
+    for source, documents, error in load(to_load):
+        if error is not None:
+            print(f"Error loading {source.key}: {error}")
+            stats["failed"] += 1
+            continue
+        entry = manifest.sources.get(source.key)
+        chunks = split_documents(documents)
+
+        # New vectors are added before the old ones are removed
+        ids = chunk_ids(source.key, source.fingerprint, len(chunks))
+        if chunks:
+            vector_store.add_documents(chunks, ids=ids)
+        if entry and entry["chunk_ids"]:
+            vector_store.delete(ids=entry["chunk_ids"])
+        manifest.sources[source.key] = {
+            "fingerprint": source.fingerprint,
+            "chunk_ids": ids,
+            **_file_stat(data_path, source.key),
+        }
+        manifest.save()
+        stats["updated" if entry else "added"] += 1
+        stats["chunks_embedded"] += len(chunks)
+        print(f"{'Updated' if entry else 'Added'} {source.key}: {len(chunks)} chunks")
+
+    for key in [key for key in manifest.sources if key not in current_keys and removable(key)]:
+        stale_ids = manifest.sources[key]["chunk_ids"]
+        if stale_ids:
+            vector_store.delete(ids=stale_ids)
+        del manifest.sources[key]
+        manifest.save()
+        stats["removed"] += 1
+        print(f"Removed {key}: {len(stale_ids)} chunks")
+
+    manifest.save()
+    print(f"Ingestion summary: {stats}")
+    return stats
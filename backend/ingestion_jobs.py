@@ -0,0 +1,183 @@
+"""
+Background ingestion jobs.
+
+Uploads are turned into IngestionJob objects and processed by a bounded pool
+of asyncio workers, so the upload request can return 202 immediately. Each
+job records its status, current stage, progress counters and per-stage
+timings for the /api/v1/data/jobs endpoints.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from structured_logging import bind_request_id, request_id_var
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Number of jobs processed concurrently per worker process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+# Jobs waiting for a worker before uploads are rejected
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 50))
+# Finished jobs kept for status queries
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 500))
+
+
+class IngestionJob:
+    """Status record for one uploaded file"""
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        # Id of the upload request, so the job's log records can be traced back to it
+        self.request_id = request_id_var.get()
+        self.status = "queued"  # queued -> processing -> completed | failed, or rejected
+        self.stage: Optional[str] = None
+        self.size = 0
+        self.progress: Dict[str, int] = {}
+        self.stage_timings: Dict[str, float] = {}
+        self.document_id = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self._started = time.perf_counter()
+        self._elapsed: Optional[float] = None
+
+    @contextmanager
+    def track(self, stage: str):
+        """Record the wall time of a stage in milliseconds"""
+        self.stage = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stage_timings[stage] = round(self.stage_timings.get(stage, 0.0) + elapsed, 1)
+
+    @property
+    def elapsed(self) -> float:
+        """Wall time since the job was created, in seconds (stages may overlap)"""
+        return self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "size": self.size,
+            "progress": self.progress,
+            "stage_timings_ms": self.stage_timings,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "document_id": self.document_id,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def track_stage(job: Optional[IngestionJob], stage: str):
+    """job.track(stage), or a no-op when the caller has no job"""
+    return job.track(stage) if job else nullcontext()
+
+
+async def track_iteration(job: Optional[IngestionJob], stage: str, items: AsyncIterable[T]) -> AsyncIterator[T]:
+    """Re-yield items, timing the waits for each one as stage"""
+    iterator = items.__aiter__()
+    while True:
+        with track_stage(job, stage):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+class IngestionQueue:
+    """Bounded queue of ingestion jobs drained by a fixed number of workers"""
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_queued: int = INGEST_QUEUE_SIZE,
+                 history: int = INGEST_JOB_HISTORY):
+        self.worker_count = workers
+        self.max_queued = max_queued
+        self.history = history
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker tasks (called from the app startup event)"""
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Cancel the workers; queued jobs are marked failed"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job in self.jobs.values():
+            if job.status in ("queued", "processing"):
+                self._finish(job, "failed", "Server shut down before the job finished")
+
+    def submit(self, job: IngestionJob, handler: Callable[..., Awaitable[Any]], *args) -> IngestionJob:
+        """Queue handler(job, *args); the job is marked rejected if the queue is full"""
+        self.jobs[job.id] = job
+        self._trim_history()
+        if self._queue is None:
+            self._finish(job, "rejected", "Ingestion workers are not running")
+            return job
+        try:
+            self._queue.put_nowait((job, handler, args))
+        except asyncio.QueueFull:
+            self._finish(job, "rejected", "Ingestion queue is full, please retry later")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        counts["waiting"] = self._queue.qsize() if self._queue else 0
+        return counts
+
+    async def _worker(self):
+        while True:
+            job, handler, args = await self._queue.get()
+            job.status = "processing"
+            bind_request_id(job.request_id if job.request_id != "-" else job.id)
+            try:
+                await handler(job, *args)
+                self._finish(job, "completed")
+            except Exception as e:
+                logger.error("❌ Ingestion job %s (%s) failed: %s", job.id, job.filename, e)
+                self._finish(job, "failed", str(e))
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: IngestionJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.stage = None
+        job.finished_at = datetime.now()
+        job._elapsed = time.perf_counter() - job._started
+
+    def _trim_history(self):
+        # Drop the oldest finished jobs; queued and running jobs are always kept
+        excess = len(self.jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at][:excess]:
+            del self.jobs[job_id]
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,68 @@
+"""
+Query-time keyword matcher for client-side chunk scoring.
+
+The original loop in search_documents_supabase re-imported re, rebuilt a
+\\b regex and scanned each chunk up to four times per keyword. Profiling
+showed the regex search dominates: a \\b-anchored pattern cannot use the
+engine's literal prefix skip, so it crawls through every chunk that does not
+contain the keyword. KeywordMatcher does the per-query work once and scores
+each chunk with a single C-level str.count per keyword; the word-boundary
+check only runs for keywords that occurred and usually stops at their first
+occurrence. A combined regex alternation was measured as well (see
+benchmarks/bench_keyword_matcher.py) and is slower than str.count in CPython.
+
+Scores are identical to the original loop.
+"""
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+def _is_word_char(char: str) -> bool:
+    """Same definition of a word character as re's \\w for str patterns"""
+    return char.isalnum() or char == "_"
+
+
+class KeywordMatcher:
+    """Scores text against a fixed keyword list"""
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(keywords)
+        # Repeated keywords count once per repetition, as in the per-keyword loop
+        self.weights = Counter(self.keywords)
+        # An empty keyword would match everywhere; it never identifies a chunk
+        self.distinct = [keyword for keyword in self.weights if keyword]
+        self.starts_with_word = {keyword: _is_word_char(keyword[0]) for keyword in self.distinct}
+
+    def score(self, content_lower: str) -> Tuple[float, List[str]]:
+        """Return (score, matched_keywords) for lowercased text"""
+        counts: Dict[str, int] = {}
+        for keyword in self.distinct:
+            occurrences = content_lower.count(keyword)
+            if occurrences:
+                counts[keyword] = occurrences
+        if not counts:
+            return 0, []
+
+        score = 0
+        matched_keywords = []
+        for keyword in self.keywords:
+            occurrences = counts.get(keyword, 0)
+            if occurrences:
+                score += occurrences
+                matched_keywords.append(keyword)
+        for keyword in counts:
+            if self._has_boundary_hit(content_lower, keyword):
+                score += 0.5 * self.weights[keyword]
+        return score, matched_keywords
+
+    def _has_boundary_hit(self, content_lower: str, keyword: str) -> bool:
+        # \b before the keyword: word-ness changes between the previous character
+        # and the keyword's first one
+        starts_with_word = self.starts_with_word[keyword]
+        position = content_lower.find(keyword)
+        while position != -1:
+            previous_is_word = position > 0 and _is_word_char(content_lower[position - 1])
+            if previous_is_word != starts_with_word:
+                return True
+            position = content_lower.find(keyword, position + 1)
+        return False
@@ -1,25 +1,47 @@
 import os
+import asyncio
+import logging
 import uvicorn
+import time
 from datetime import datetime
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-import PyPDF2
 import google.generativeai as genai
 from dotenv import load_dotenv
-import io
+from search_index import InvertedIndex
+from vector_index import NUMPY_AVAILABLE, VECTOR_MIN_SIMILARITY, VectorIndex, index_documents
+from hybrid_retrieval import (
+    RETRIEVAL_LEXICAL_TIMEOUT_SECONDS,
+    RETRIEVAL_VECTOR_TIMEOUT_SECONDS,
+    HybridRetriever,
+    RetrieverLeg,
+)
+from pdf_extraction import iter_pdf_chunks, shutdown_pdf_executor
+from upload_spool import spool_upload
+from prompting import build_prompt, format_sse, sse_response
+from gemini_client import gemini_client
+from answer_cache import answer_cache
+from semantic_cache import semantic_cache
+from structured_logging import bind_request_id, configure_logging, logging_stats
+from metrics import ERRORS, RETRIEVAL_LATENCY, metrics_response, observe_request, timed
+from store_snapshot import SNAPSHOT_PATH, SnapshotWriter, load_store
 
 # Load environment variables
 load_dotenv()
 
+# Log records are written by a background thread, off the event loop
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Configure Google Gemini
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
-    print("✓ Google Gemini API configured")
+    logger.info("✓ Google Gemini API configured")
 else:
-    print("✗ Warning: GOOGLE_API_KEY not found in environment variables")
+    logger.warning("✗ Warning: GOOGLE_API_KEY not found in environment variables")
 
 # Initialize FastAPI
 app = FastAPI(title="AI Chatbot API - Free Tier", version="2.0.0")
@@ -41,9 +63,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Tag the request's log records with a request id and observe its latency"""
+    started = time.perf_counter()
+    status_code = 500
+    request_id = bind_request_id(request.headers.get("x-request-id"))
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        process_time = time.perf_counter() - started
+        observe_request(request, status_code, process_time)
+        logger.info("⚡ Response: %s - Time: %.3fs", status_code, process_time,
+                    extra={"method": request.method, "path": request.url.path})
+
 # In-memory storage ONLY (no file system dependency)
+# documents_store maps a filename to the list of its text chunks
 documents_store = {}
 documents_metadata = []
+search_index = InvertedIndex()
+# Chunk embeddings for semantic search (requires NumPy)
+vector_index = VectorIndex() if NUMPY_AVAILABLE else None
+# Background task that embeds the documents restored at startup
+vector_indexing = None
+
+# Number of chunks passed to Gemini per question
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 3))
+# "hybrid" (BM25 and vectors fused), "bm25" (keyword) or "vector" (embedding similarity)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# The store is snapshotted to disk after changes and reloaded on startup
+snapshot_writer = SnapshotWriter(
+    SNAPSHOT_PATH,
+    lambda: (dict(documents_store), list(documents_metadata)),
+    search_index,
+)
+# What users are told about keeping their uploads across restarts
+PERSISTENCE_NOTE = (
+    f"Documents are kept in memory and snapshotted to {SNAPSHOT_PATH}, so they survive restarts while that file is kept"
+    if SNAPSHOT_PATH else "Documents are stored in memory only and lost on restart"
+)
 
 class ChatRequest(BaseModel):
     question: str
@@ -52,63 +114,75 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-def extract_text_from_pdf_bytes(file_content: bytes):
-    """Extract text from PDF bytes (in-memory processing)"""
-    try:
-        text = ""
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return ""
+def chunk_texts(results):
+    """Map ranked (score, (doc_id, chunk_index)) results to chunk texts"""
+    relevant_chunks = []
+    for _, (doc_id, chunk_index) in results:
+        chunks = documents_store.get(doc_id)
+        if chunks and chunk_index < len(chunks):
+            relevant_chunks.append(chunks[chunk_index])
+    return relevant_chunks
+
+def keyword_search(query, top_k=RETRIEVAL_TOP_K, threshold=0.1):
+    """BM25 keyword search over the in-memory chunk index"""
+    # Only the postings of the query terms are scored
+    return chunk_texts(search_index.search(query, limit=top_k, min_match=threshold))
+
+def vector_search(query, top_k=RETRIEVAL_TOP_K):
+    """Embedding similarity search over the in-memory chunk vectors"""
+    return chunk_texts(vector_index.search(query, limit=top_k, min_score=VECTOR_MIN_SIMILARITY))
 
-def search_documents(query, threshold=0.1):
-    """Simple keyword-based document search"""
+def search_documents(query, threshold=0.1, top_k=RETRIEVAL_TOP_K):
+    """Single-strategy search over the in-memory chunks (BM25, or vectors in "vector" mode)"""
     if not documents_store:
         return []
     
-    query_lower = query.lower()
-    query_words = set(query_lower.split())
-    
-    relevant_docs = []
-    
-    for doc_id, content in documents_store.items():
-        content_lower = content.lower()
-        content_words = set(content_lower.split())
-        
-        # Calculate simple word overlap score
-        common_words = query_words.intersection(content_words)
-        score = len(common_words) / len(query_words) if query_words else 0
-        
-        # Also check for phrase matches
-        phrase_score = sum(1 for word in query_words if word in content_lower) / len(query_words)
-        final_score = max(score, phrase_score)
-        
-        if final_score > threshold:
-            relevant_docs.append((final_score, content))
-    
-    # Sort by relevance score
-    relevant_docs.sort(key=lambda x: x[0], reverse=True)
-    return [doc[1] for doc in relevant_docs[:3]]  # Top 3 documents
+    if RETRIEVAL_MODE == "vector" and vector_index is not None and len(vector_index):
+        with timed(RETRIEVAL_LATENCY, strategy="vector"):
+            return vector_search(query, top_k)
+    with timed(RETRIEVAL_LATENCY, strategy="bm25"):
+        return keyword_search(query, top_k, threshold)  # Top k chunks
+
+# BM25 and vector search run concurrently and are merged by reciprocal rank fusion;
+# vector hits below VECTOR_MIN_SIMILARITY are dropped, so off-topic questions get no context
+hybrid_retriever = HybridRetriever([
+    RetrieverLeg("bm25", keyword_search, RETRIEVAL_LEXICAL_TIMEOUT_SECONDS),
+    RetrieverLeg("vector", vector_search, RETRIEVAL_VECTOR_TIMEOUT_SECONDS),
+]) if vector_index is not None else None
+
+async def retrieve_documents(query, top_k=RETRIEVAL_TOP_K):
+    """Chunks for a question using RETRIEVAL_MODE; hybrid needs the vector index"""
+    if RETRIEVAL_MODE == "hybrid" and hybrid_retriever is not None and len(vector_index) and documents_store:
+        with timed(RETRIEVAL_LATENCY, strategy="hybrid"):
+            return await hybrid_retriever.retrieve(query, top_k)
+    return search_documents(query, top_k=top_k)
 
 @app.on_event("startup")
 async def startup_event():
     """Startup message for free tier deployment"""
-    print("🚀 Starting AI Chatbot API - Free Tier Mode")
-    print("📝 Note: Documents are stored in memory only")
-    print("🔄 Documents will be lost when service restarts/sleeps")
-    print("💡 Users will need to re-upload documents after cold starts")
+    global vector_indexing
+    logger.info("🚀 Starting AI Chatbot API - Free Tier Mode")
+    logger.info("📝 Note: %s", PERSISTENCE_NOTE)
+    if SNAPSHOT_PATH and load_store(SNAPSHOT_PATH, documents_store, documents_metadata, search_index):
+        logger.info("🔄 Restored documents from %s", SNAPSHOT_PATH)
+        if vector_index is not None:
+            vector_indexing = asyncio.create_task(index_documents(vector_index, dict(documents_store), documents_store))
+    else:
+        logger.info("🔄 No documents restored; starting with an empty store")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write pending snapshot changes and stop the PDF extraction pool"""
+    await snapshot_writer.flush()
+    shutdown_pdf_executor()
 
 @app.get("/")
 def health_check():
     return {
         "status": "ok", 
         "message": "AI Chatbot API is running on Free Tier!",
-        "mode": "in-memory-only",
-        "note": "Documents are temporary and lost on restart"
+        "mode": "in-memory+snapshot" if SNAPSHOT_PATH else "in-memory-only",
+        "note": PERSISTENCE_NOTE
     }
 
 @app.get("/test")
@@ -118,11 +192,24 @@ def test_endpoint():
         "message": "Connection test successful!",
         "documents_loaded": len(documents_store),
         "gemini_configured": bool(GOOGLE_API_KEY),
-        "storage_mode": "in-memory-only",
+        "storage_mode": "in-memory+snapshot" if SNAPSHOT_PATH else "in-memory-only",
         "free_tier": True,
-        "environment": "production" if os.getenv("PORT") else "development"
+        "environment": "production" if os.getenv("PORT") else "development",
+        "snapshot_path": SNAPSHOT_PATH or None,
+        "snapshot_written_at": snapshot_writer.last_written,
+        "retrieval_mode": RETRIEVAL_MODE,
+        "vector_index": vector_index.stats() if vector_index is not None else None,
+        "hybrid_retrieval": hybrid_retriever.stats() if hybrid_retriever is not None else None,
+        "answer_cache": answer_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "logging": logging_stats()
     }
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics (per-stage latency histograms, cache hits, errors)"""
+    return metrics_response()
+
 @app.post("/login")
 def login(request: LoginRequest):
     # Simple mock login
@@ -134,7 +221,7 @@ def get_data_sources():
     try:
         return {"sources": documents_metadata}
     except Exception as e:
-        print(f"Error getting sources: {e}")
+        logger.error("Error getting sources: %s", e)
         return {"sources": []}
 
 @app.post("/api/v1/data/upload")
@@ -147,13 +234,18 @@ async def upload_files(files: List[UploadFile] = File(...)):
             if not file.filename.endswith('.pdf'):
                 continue
                 
-            # Read file content into memory
-            content = await file.read()
-            
-            # Extract text directly from bytes (no file system storage)
-            text_content = extract_text_from_pdf_bytes(content)
+            # Spool the upload to a temporary file and chunk it page by page
+            upload = await spool_upload(file)
+            try:
+                chunks = [chunk async for chunk in iter_pdf_chunks(upload.path)]
+            except Exception as e:
+                logger.error("Error extracting text from PDF: %s", e)
+                ERRORS.labels("pdf_extraction").inc()
+                chunks = []
+            finally:
+                upload.cleanup()
             
-            if not text_content:
+            if not chunks:
                 continue
             
             # Create metadata
@@ -164,11 +256,16 @@ async def upload_files(files: List[UploadFile] = File(...)):
                 "type": "pdf",
                 "status": "indexed",
                 "dateAdded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "size": f"{len(content) / 1024:.1f} KB"
+                "size": f"{upload.size / 1024:.1f} KB"
             }
             
-            # Store in memory ONLY
-            documents_store[doc_id] = text_content
+            # Store chunks in memory ONLY
+            documents_store[doc_id] = chunks
+            search_index.add_document(doc_id, chunks)
+            if vector_index is not None:
+                await index_documents(vector_index, {doc_id: chunks}, documents_store)
+            answer_cache.invalidate()
+            semantic_cache.invalidate()
             
             # Add to metadata list (avoid duplicates)
             existing_doc = next((doc for doc in documents_metadata if doc['id'] == doc_id), None)
@@ -177,33 +274,44 @@ async def upload_files(files: List[UploadFile] = File(...)):
             documents_metadata.append(metadata)
             
             uploaded_files.append(file.filename)
-            print(f"✅ Processed in memory: {file.filename}")
+            logger.info("✅ Processed in memory: %s", file.filename)
+        
+        if uploaded_files:
+            snapshot_writer.schedule()
         
         return {
             "message": f"Successfully uploaded {len(uploaded_files)} files to memory",
             "files": uploaded_files,
-            "note": "Files are stored in memory only and will be lost on service restart"
+            "note": PERSISTENCE_NOTE
         }
         
     except Exception as e:
-        print(f"Upload error: {e}")
+        logger.error("Upload error: %s", e)
+        ERRORS.labels("upload").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/v1/data/sources/{source_id}")
-def delete_source(source_id: str):
+async def delete_source(source_id: str):
     """Delete a document source (from memory)"""
     try:
         # Remove from memory
         if source_id in documents_store:
             del documents_store[source_id]
+        search_index.remove_document(source_id)
+        if vector_index is not None:
+            vector_index.remove_document(source_id)
+        answer_cache.invalidate()
+        semantic_cache.invalidate()
         
         # Remove from metadata
         documents_metadata[:] = [doc for doc in documents_metadata if doc['id'] != source_id]
+        snapshot_writer.schedule()
         
         return {"message": "Source deleted successfully from memory"}
         
     except Exception as e:
-        print(f"Delete error: {e}")
+        logger.error("Delete error: %s", e)
+        ERRORS.labels("delete").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.options("/api/v1/chat")
@@ -211,60 +319,111 @@ def chat_options():
     """Handle CORS preflight for chat endpoint"""
     return {"status": "ok"}
 
+async def retrieve_context(question: str):
+    """Run retrieval for a chat question; returns (relevant_docs, fallback_answer)"""
+    if not GOOGLE_API_KEY:
+        return [], "Google Gemini API is not configured. Please add GOOGLE_API_KEY to your environment variables."
+    
+    if not documents_store:
+        return [], "No documents have been uploaded yet. Please upload some PDF documents first!"
+    
+    # Search for relevant chunks
+    relevant_docs = await retrieve_documents(question)
+    
+    if not relevant_docs:
+        return [], "I couldn't find any relevant information in the uploaded documents for your question. Try uploading more specific documents or rephrasing your question."
+    
+    return relevant_docs, None
+
 @app.post("/api/v1/chat")
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     """Chat endpoint with document search"""
     try:
-        print(f"💬 Chat request: {request.question}")
+        logger.info("💬 Chat request: %s", request.question)
         
-        if not GOOGLE_API_KEY:
-            return {"answer": "Google Gemini API is not configured. Please add GOOGLE_API_KEY to your environment variables."}
+        relevant_docs, fallback_answer = await retrieve_context(request.question)
+        if fallback_answer:
+            return {"answer": fallback_answer}
         
-        if not documents_store:
-            return {"answer": "No documents have been uploaded yet. Please upload some PDF documents first! Note: On free tier, documents are stored temporarily and may be lost when the service restarts."}
+        # Reuse a previous answer for the same (or a paraphrased) question and context
+        cache_key = answer_cache.make_key(request.question, relevant_docs)
+        semantic_key = semantic_cache.make_key(request.question, relevant_docs)
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is None:
+            cached_answer = semantic_cache.get(semantic_key)
+        if cached_answer is not None:
+            logger.debug("⚡ Answer cache hit")
+            return {"answer": cached_answer}
         
-        # Search for relevant documents
-        relevant_docs = search_documents(request.question)
-        
-        if not relevant_docs:
-            return {"answer": "I couldn't find any relevant information in the uploaded documents for your question. Try uploading more specific documents or rephrasing your question."}
-        
-        # Prepare context for Gemini
-        context = "\n\n".join(relevant_docs[:3])  # Use top 3 matches
-        
-        prompt = f"""You are an AI assistant that answers questions based on uploaded documents. Please provide accurate, helpful answers based solely on the information provided.
-
-Document Content:
-{context}
-
-User Question: {request.question}
-
-Instructions:
-- Answer the question based only on the information in the documents above
-- Be specific and detailed when possible
-- If the exact information isn't available, say so clearly
-- Keep your answer concise but informative
-- Use a friendly, helpful tone
-
-Answer:"""
+        # Prepare context for Gemini (top k chunks only)
+        prompt = build_prompt(request.question, relevant_docs)
         
         # Call Gemini API
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(prompt)
-            answer = response.text
+            answer = await gemini_client.generate(prompt)
+            answer_cache.put(cache_key, answer)
+            semantic_cache.put(semantic_key, answer)
             
-            print(f"✅ Generated answer: {answer[:100]}...")
+            logger.debug("✅ Generated answer: %.100s...", answer)
             return {"answer": answer}
             
         except Exception as e:
-            print(f"❌ Gemini API error: {e}")
+            logger.error("❌ Gemini API error: %s", e)
+            ERRORS.labels("gemini").inc()
             return {"answer": f"I found relevant information in the documents, but encountered an error generating the response: {str(e)}"}
     
     except Exception as e:
-        print(f"❌ Chat error: {e}")
+        logger.error("❌ Chat error: %s", e)
+        ERRORS.labels("chat").inc()
         return {"answer": "I'm sorry, I encountered an error while processing your question. Please try again."}
 
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Chat endpoint that streams Gemini tokens as Server-Sent Events"""
+    logger.info("💬 Streaming chat request: %s", request.question)
+    
+    try:
+        relevant_docs, fallback_answer = await retrieve_context(request.question)
+    except Exception as e:
+        logger.error("❌ Chat error: %s", e)
+        ERRORS.labels("chat").inc()
+        relevant_docs, fallback_answer = [], "I'm sorry, I encountered an error while processing your question. Please try again."
+    
+    async def event_stream():
+        # Events: "token" carries {"text"}, "done" and "error" carry the full {"answer"}
+        if fallback_answer:
+            yield format_sse({"answer": fallback_answer}, event="done")
+            return
+        
+        cache_key = answer_cache.make_key(request.question, relevant_docs)
+        semantic_key = semantic_cache.make_key(request.question, relevant_docs)
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is None:
+            cached_answer = semantic_cache.get(semantic_key)
+        if cached_answer is not None:
+            yield format_sse({"text": cached_answer}, event="token")
+            yield format_sse({"answer": cached_answer}, event="done")
+            return
+        
+        answer_parts = []
+        try:
+            async for text in gemini_client.stream(build_prompt(request.question, relevant_docs)):
+                answer_parts.append(text)
+                yield format_sse({"text": text}, event="token")
+        except Exception as e:
+            logger.error("❌ Gemini API error: %s", e)
+            ERRORS.labels("gemini").inc()
+            yield format_sse({"answer": f"I found relevant information in the documents, but encountered an error generating the response: {str(e)}"}, event="error")
+            return
+        
+        answer = "".join(answer_parts)
+        answer_cache.put(cache_key, answer)
+        semantic_cache.put(semantic_key, answer)
+        logger.debug("✅ Streamed answer: %.100s...", answer)
+        yield format_sse({"answer": answer}, event="done")
+    
+    return sse_response(event_stream())
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
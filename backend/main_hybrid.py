@@ -1,16 +1,35 @@
 import os
+import asyncio
+import logging
 import uvicorn
-import hashlib
 import uuid
+import time
 from datetime import datetime
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-import PyPDF2
 import google.generativeai as genai
 from dotenv import load_dotenv
-import io
+from search_index import InvertedIndex
+from vector_index import NUMPY_AVAILABLE, VECTOR_MIN_SIMILARITY, VectorIndex, index_documents
+from hybrid_retrieval import (
+    RETRIEVAL_LEXICAL_TIMEOUT_SECONDS,
+    RETRIEVAL_VECTOR_TIMEOUT_SECONDS,
+    HybridRetriever,
+    RetrieverLeg,
+)
+from pdf_extraction import iter_pdf_chunks, shutdown_pdf_executor
+from upload_spool import SpooledUpload, spool_upload
+from supabase_writer import write_document
+from conversation_logger import ConversationLogger, elapsed_ms
+from supabase_hydration import HYDRATE_ON_STARTUP, SupabaseHydrator
+from prompting import build_prompt, format_sse, sse_response
+from gemini_client import gemini_client
+from answer_cache import answer_cache
+from semantic_cache import semantic_cache
+from structured_logging import bind_request_id, configure_logging, logging_stats
+from metrics import ERRORS, RETRIEVAL_LATENCY, SEARCH_FALLBACKS, metrics_response, observe_request, supabase_call, timed
 
 # Try to import Supabase (optional dependency)
 try:
@@ -22,13 +41,17 @@ except ImportError:
 # Load environment variables
 load_dotenv()
 
+# Log records are written by a background thread, off the event loop
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Configure Google Gemini
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
-    print("✓ Google Gemini API configured")
+    logger.info("✓ Google Gemini API configured")
 else:
-    print("✗ Warning: GOOGLE_API_KEY not found in environment variables")
+    logger.warning("✗ Warning: GOOGLE_API_KEY not found in environment variables")
 
 # Configure Supabase (optional)
 supabase = None
@@ -39,14 +62,19 @@ if SUPABASE_AVAILABLE:
     if SUPABASE_KEY:
         try:
             supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-            print("✓ Supabase client configured")
+            logger.info("✓ Supabase client configured")
         except Exception as e:
-            print(f"✗ Warning: Supabase configuration failed: {e}")
+            logger.warning("✗ Warning: Supabase configuration failed: %s", e)
             supabase = None
     else:
-        print("✗ Warning: SUPABASE_ANON_KEY not found - using in-memory storage only")
+        logger.warning("✗ Warning: SUPABASE_ANON_KEY not found - using in-memory storage only")
 else:
-    print("✗ Warning: Supabase not installed - using in-memory storage only")
+    logger.warning("✗ Warning: Supabase not installed - using in-memory storage only")
+
+# Chat logging is batched in the background, off the response path
+conversation_logger = ConversationLogger(supabase)
+# Optionally reload the in-memory store from Supabase after a restart
+hydrator = SupabaseHydrator(supabase if HYDRATE_ON_STARTUP else None)
 
 # Initialize FastAPI
 app = FastAPI(title="AI Chatbot API - Hybrid Mode", version="2.1.0")
@@ -69,9 +97,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Tag the request's log records with a request id and observe its latency"""
+    started = time.perf_counter()
+    status_code = 500
+    request_id = bind_request_id(request.headers.get("x-request-id"))
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        process_time = time.perf_counter() - started
+        observe_request(request, status_code, process_time)
+        logger.info("⚡ Response: %s - Time: %.3fs", status_code, process_time,
+                    extra={"method": request.method, "path": request.url.path})
+
 # In-memory storage (primary) + Supabase backup (if available)
+# documents_store maps a filename to the list of its text chunks
 documents_store = {}
 documents_metadata = []
+search_index = InvertedIndex()
+# Chunk embeddings for semantic search (requires NumPy)
+vector_index = VectorIndex() if NUMPY_AVAILABLE else None
+# Background task that embeds the documents hydrated from Supabase
+vector_indexing = None
+
+# Number of chunks passed to Gemini per question
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 3))
+# "hybrid" (BM25 and vectors fused), "bm25" (keyword) or "vector" (embedding similarity)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
 
 class ChatRequest(BaseModel):
     question: str
@@ -80,87 +136,37 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-def extract_text_from_pdf_bytes(file_content: bytes):
-    """Extract text from PDF bytes (in-memory processing)"""
-    try:
-        text = ""
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return ""
-
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
-    """Split text into overlapping chunks"""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-    return chunks
-
-def get_text_hash(text: str) -> str:
-    """Generate a hash for text content"""
-    return hashlib.sha256(text.encode()).hexdigest()
-
-async def store_in_supabase(filename: str, file_content: bytes, text_content: str):
+async def store_in_supabase(upload: SpooledUpload, chunks: List[str]):
     """Store document in Supabase (optional backup)"""
     if not supabase:
+        upload.cleanup()
         return None
     
     try:
-        # Store file in Supabase storage
+        filename = upload.filename
         file_path = f"uploads/{uuid.uuid4()}_{filename}"
-        storage_result = supabase.storage.from_("documents").upload(file_path, file_content)
-        
-        # Create document record
         document_data = {
             "filename": filename,
             "original_filename": filename,
             "file_type": "pdf",
-            "file_size": len(file_content),
-            "content_preview": text_content[:500] + "..." if len(text_content) > 500 else text_content,
+            "file_size": upload.size,
+            "content_preview": chunks[0][:500] + "..." if len(chunks[0]) > 500 else chunks[0],
             "status": "processing",
             "storage_path": file_path,
         }
         
-        doc_result = supabase.table("documents").insert(document_data).execute()
-        document_id = doc_result.data[0]["id"]
-        
-        # Split content into chunks and store
-        chunks = chunk_text(text_content)
-        chunk_data = []
-        
-        for i, chunk in enumerate(chunks):
-            chunk_data.append({
-                "document_id": document_id,
-                "chunk_index": i,
-                "content": chunk,
-                "content_length": len(chunk),
-                "chunk_hash": get_text_hash(chunk)
-            })
-        
-        # Batch insert chunks
-        if chunk_data:
-            supabase.table("document_chunks").insert(chunk_data).execute()
+        # Storage upload, document row and chunk batches are written concurrently
+        document_id = await write_document(supabase, upload.path, document_data, chunks)
         
-        # Update document status
-        supabase.table("documents").update({
-            "status": "indexed",
-            "processed_date": datetime.now().isoformat()
-        }).eq("id", document_id).execute()
-        
-        print(f"✅ Stored in Supabase: {filename}")
+        logger.info("✅ Stored in Supabase: %s", filename)
         return document_id
         
     except Exception as e:
-        print(f"❌ Supabase storage error: {e}")
+        logger.error("❌ Supabase storage error: %s", e)
+        ERRORS.labels("supabase").inc()
         return None
+    finally:
+        upload.cleanup()
 
 async def search_supabase_documents(query: str) -> List[str]:
     """Search documents in Supabase using full-text search"""
@@ -169,61 +175,97 @@ async def search_supabase_documents(query: str) -> List[str]:
     
     try:
         # Use PostgreSQL full-text search
-        result = supabase.table("document_chunks").select("content").text_search(
-            "content", query, type="websearch", config="english"
-        ).limit(5).execute()
+        with timed(RETRIEVAL_LATENCY, strategy="supabase_fts"):
+            result = supabase_call("text_search", supabase.table("document_chunks").select("content").text_search(
+                "content", query, type="websearch", config="english"
+            ).limit(5).execute)
         
         return [row["content"] for row in result.data]
         
     except Exception as e:
-        print(f"❌ Supabase search error: {e}")
+        logger.error("❌ Supabase search error: %s", e)
+        ERRORS.labels("supabase").inc()
         return []
 
-def search_documents(query, threshold=0.1):
-    """Enhanced document search: in-memory + Supabase"""
-    # First, search in-memory storage
-    memory_docs = []
-    if documents_store:
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
-        
-        relevant_docs = []
-        
-        for doc_id, content in documents_store.items():
-            content_lower = content.lower()
-            content_words = set(content_lower.split())
-            
-            # Calculate simple word overlap score
-            common_words = query_words.intersection(content_words)
-            score = len(common_words) / len(query_words) if query_words else 0
-            
-            # Also check for phrase matches
-            phrase_score = sum(1 for word in query_words if word in content_lower) / len(query_words)
-            final_score = max(score, phrase_score)
-            
-            if final_score > threshold:
-                relevant_docs.append((final_score, content))
-        
-        # Sort by relevance score
-        relevant_docs.sort(key=lambda x: x[0], reverse=True)
-        memory_docs = [doc[1] for doc in relevant_docs[:3]]
-    
-    # If we have in-memory results, use them
-    if memory_docs:
-        return memory_docs
+def chunk_texts(results):
+    """Map ranked (score, (doc_id, chunk_index)) results to chunk texts"""
+    relevant_chunks = []
+    for _, (doc_id, chunk_index) in results:
+        chunks = documents_store.get(doc_id)
+        if chunks and chunk_index < len(chunks):
+            relevant_chunks.append(chunks[chunk_index])
+    return relevant_chunks
+
+def keyword_search(query, top_k=RETRIEVAL_TOP_K, threshold=0.1):
+    """BM25 keyword search over the in-memory chunk index"""
+    return chunk_texts(search_index.search(query, limit=top_k, min_match=threshold))
+
+def vector_search(query, top_k=RETRIEVAL_TOP_K):
+    """Embedding similarity search over the in-memory chunk vectors"""
+    return chunk_texts(vector_index.search(query, limit=top_k, min_score=VECTOR_MIN_SIMILARITY))
+
+def search_documents(query, threshold=0.1, top_k=RETRIEVAL_TOP_K):
+    """Single-strategy in-memory search (BM25, or vectors in "vector" mode)"""
+    if not documents_store:
+        return []
+    if RETRIEVAL_MODE == "vector" and vector_index is not None and len(vector_index):
+        with timed(RETRIEVAL_LATENCY, strategy="vector"):
+            return vector_search(query, top_k)
+    with timed(RETRIEVAL_LATENCY, strategy="bm25"):
+        return keyword_search(query, top_k, threshold)
+
+# BM25 and vector search run concurrently and are merged by reciprocal rank fusion;
+# vector hits below VECTOR_MIN_SIMILARITY are dropped, so off-topic questions get no context
+hybrid_retriever = HybridRetriever([
+    RetrieverLeg("bm25", keyword_search, RETRIEVAL_LEXICAL_TIMEOUT_SECONDS),
+    RetrieverLeg("vector", vector_search, RETRIEVAL_VECTOR_TIMEOUT_SECONDS),
+]) if vector_index is not None else None
+
+async def retrieve_documents(query, top_k=RETRIEVAL_TOP_K):
+    """In-memory chunks for a question using RETRIEVAL_MODE; hybrid needs the vector index"""
+    if RETRIEVAL_MODE == "hybrid" and hybrid_retriever is not None and len(vector_index) and documents_store:
+        with timed(RETRIEVAL_LATENCY, strategy="hybrid"):
+            return await hybrid_retriever.retrieve(query, top_k)
+    return search_documents(query, top_k=top_k)
+
+def apply_hydration(store, metadata, index):
+    """Swap documents hydrated from Supabase into memory; uploads made meanwhile win"""
+    global vector_indexing
+    for doc_id, chunks in documents_store.items():
+        store[doc_id] = chunks
+        index.add_document(doc_id, chunks)
+    uploaded_ids = {doc["id"] for doc in documents_metadata}
+    metadata = [doc for doc in metadata if doc["id"] not in uploaded_ids] + documents_metadata
     
-    # Otherwise, try Supabase (this is async but we'll handle it)
-    return []
+    documents_store.clear()
+    documents_store.update(store)
+    documents_metadata[:] = metadata
+    search_index.replace(index)
+    answer_cache.invalidate()
+    semantic_cache.invalidate()
+    if vector_index is not None:
+        hydrated = {doc_id: chunks for doc_id, chunks in store.items() if doc_id not in vector_index}
+        vector_indexing = asyncio.create_task(index_documents(vector_index, hydrated, documents_store))
 
 @app.on_event("startup")
 async def startup_event():
     """Startup message"""
     storage_mode = "Hybrid (Memory + Supabase)" if supabase else "In-Memory Only"
-    print(f"🚀 Starting AI Chatbot API - {storage_mode}")
+    logger.info("🚀 Starting AI Chatbot API - %s", storage_mode)
     if supabase:
-        print("💾 Supabase backup storage enabled")
+        logger.info("💾 Supabase backup storage enabled")
     else:
-        print("📝 Note: Documents are stored in memory only")
+        logger.info("📝 Note: Documents are stored in memory only")
+    await conversation_logger.start()
+    # Runs in the background; questions use Supabase search until it completes
+    hydrator.start(apply_hydration)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush chat logs and stop the PDF extraction pool"""
+    await hydrator.stop()
+    await conversation_logger.stop()
+    shutdown_pdf_executor()
 
 @app.get("/")
 def health_check():
@@ -248,7 +290,7 @@ def test_endpoint():
             count_result = supabase.table("documents").select("id", count="exact").execute()
             doc_count_supabase = count_result.count or 0
         except Exception as e:
-            print(f"Supabase test error: {e}")
+            logger.error("Supabase test error: %s", e)
     
     return {
         "status": "success",
@@ -258,9 +300,22 @@ def test_endpoint():
         "documents_memory": len(documents_store),
         "documents_supabase": doc_count_supabase,
         "storage_mode": "hybrid" if supabase else "memory-only",
-        "supabase_url": "https://kfekhrbilvrobunqwgzd.supabase.co" if supabase else None
+        "supabase_url": "https://kfekhrbilvrobunqwgzd.supabase.co" if supabase else None,
+        "answer_cache": answer_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "conversation_logger": conversation_logger.stats(),
+        "hydration": hydrator.stats(),
+        "retrieval_mode": RETRIEVAL_MODE,
+        "vector_index": vector_index.stats() if vector_index is not None else None,
+        "hybrid_retrieval": hybrid_retriever.stats() if hybrid_retriever is not None else None,
+        "logging": logging_stats()
     }
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics (per-stage latency histograms, cache hits, errors)"""
+    return metrics_response()
+
 @app.post("/login")
 def login(request: LoginRequest):
     """Simple mock login"""
@@ -280,7 +335,7 @@ async def get_data_sources():
     # Add Supabase sources if available
     if supabase:
         try:
-            result = supabase.table("documents").select("*").order("upload_date", desc=True).execute()
+            result = supabase_call("list_documents", supabase.table("documents").select("*").order("upload_date", desc=True).execute)
             
             for doc in result.data:
                 # Avoid duplicates and format for frontend compatibility
@@ -294,7 +349,7 @@ async def get_data_sources():
                         "size": f"{doc['file_size'] / 1024:.1f} KB"
                     })
         except Exception as e:
-            print(f"Error getting Supabase sources: {e}")
+            logger.error("Error getting Supabase sources: %s", e)
     
     return {"sources": sources}
 
@@ -308,13 +363,17 @@ async def upload_files(files: List[UploadFile] = File(...)):
             if not file.filename.lower().endswith('.pdf'):
                 continue
                 
-            # Read file content
-            content = await file.read()
-            
-            # Extract text
-            text_content = extract_text_from_pdf_bytes(content)
+            # Spool the upload to a temporary file and chunk it page by page
+            upload = await spool_upload(file)
+            try:
+                chunks = [chunk async for chunk in iter_pdf_chunks(upload.path)]
+            except Exception as e:
+                logger.error("Error extracting text from PDF: %s", e)
+                ERRORS.labels("pdf_extraction").inc()
+                chunks = []
             
-            if not text_content:
+            if not chunks:
+                upload.cleanup()
                 continue
             
             # Store in memory (primary)
@@ -325,20 +384,25 @@ async def upload_files(files: List[UploadFile] = File(...)):
                 "type": "pdf",
                 "status": "indexed",
                 "dateAdded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "size": f"{len(content) / 1024:.1f} KB"
+                "size": f"{upload.size / 1024:.1f} KB"
             }
             
-            documents_store[doc_id] = text_content
+            documents_store[doc_id] = chunks
+            search_index.add_document(doc_id, chunks)
+            if vector_index is not None:
+                await index_documents(vector_index, {doc_id: chunks}, documents_store)
+            answer_cache.invalidate()
+            semantic_cache.invalidate()
             
             # Remove existing metadata and add new
             documents_metadata[:] = [doc for doc in documents_metadata if doc['id'] != doc_id]
             documents_metadata.append(metadata)
             
             # Store in Supabase (backup)
-            await store_in_supabase(file.filename, content, text_content)
+            await store_in_supabase(upload, chunks)
             
             uploaded_files.append(file.filename)
-            print(f"✅ Processed: {file.filename}")
+            logger.info("✅ Processed: %s", file.filename)
         
         storage_info = "memory + Supabase" if supabase else "memory only"
         return {
@@ -348,7 +412,8 @@ async def upload_files(files: List[UploadFile] = File(...)):
         }
         
     except Exception as e:
-        print(f"Upload error: {e}")
+        logger.error("Upload error: %s", e)
+        ERRORS.labels("upload").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/v1/data/sources/{source_id}")
@@ -358,13 +423,19 @@ async def delete_source(source_id: str):
         # Remove from memory
         if source_id in documents_store:
             del documents_store[source_id]
+        search_index.remove_document(source_id)
+        if vector_index is not None:
+            vector_index.remove_document(source_id)
+        hydrator.discard(source_id)
+        answer_cache.invalidate()
+        semantic_cache.invalidate()
         
         documents_metadata[:] = [doc for doc in documents_metadata if doc['id'] != source_id]
         
         # Remove from Supabase
         if supabase:
             try:
-                doc_result = supabase.table("documents").select("*").eq("filename", source_id).execute()
+                doc_result = supabase_call("find_document", supabase.table("documents").select("*").eq("filename", source_id).execute)
                 
                 if doc_result.data:
                     document = doc_result.data[0]
@@ -372,20 +443,22 @@ async def delete_source(source_id: str):
                     # Delete from storage
                     if document["storage_path"]:
                         try:
-                            supabase.storage.from_("documents").remove([document["storage_path"]])
+                            supabase_call("storage_remove", supabase.storage.from_("documents").remove, [document["storage_path"]])
                         except Exception as e:
-                            print(f"Storage deletion error: {e}")
+                            logger.error("Storage deletion error: %s", e)
                     
                     # Delete from database
-                    supabase.table("documents").delete().eq("id", document["id"]).execute()
-                    print(f"✅ Deleted from Supabase: {source_id}")
+                    supabase_call("delete_document", supabase.table("documents").delete().eq("id", document["id"]).execute)
+                    logger.info("✅ Deleted from Supabase: %s", source_id)
             except Exception as e:
-                print(f"❌ Supabase deletion error: {e}")
+                logger.error("❌ Supabase deletion error: %s", e)
+                ERRORS.labels("supabase").inc()
         
         return {"message": "Document deleted successfully"}
         
     except Exception as e:
-        print(f"Delete error: {e}")
+        logger.error("Delete error: %s", e)
+        ERRORS.labels("delete").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.options("/api/v1/chat")
@@ -393,91 +466,158 @@ def chat_options():
     """Handle CORS preflight for chat endpoint"""
     return {"status": "ok"}
 
+async def retrieve_context(question: str):
+    """Run retrieval for a chat question; returns (relevant_docs, fallback_answer)"""
+    if not GOOGLE_API_KEY:
+        return [], "Google Gemini API is not configured. Please add GOOGLE_API_KEY to your environment variables."
+    
+    # Check both storage systems
+    has_documents = bool(documents_store) or (supabase and await check_supabase_documents())
+    
+    if not has_documents:
+        return [], "No documents have been uploaded yet. Please upload some PDF documents first through the admin panel."
+    
+    # Search for relevant documents (memory first, then Supabase)
+    relevant_docs = await retrieve_documents(question)
+    
+    # If no memory results, try Supabase
+    if not relevant_docs and supabase:
+        SEARCH_FALLBACKS.labels("memory", "supabase").inc()
+        relevant_docs = (await search_supabase_documents(question))[:RETRIEVAL_TOP_K]
+    
+    if not relevant_docs:
+        return [], "I couldn't find any relevant information in the uploaded documents for your question. Try uploading more specific documents or rephrasing your question."
+    
+    return relevant_docs, None
+
+def store_conversation(question: str, answer: str, relevant_docs: List[str], req: Optional[Request],
+                       started: float, retrieval_ms: int, llm_ms: Optional[int]):
+    """Queue a chat exchange for the background Supabase logger (optional)"""
+    conversation_data = {
+        "user_question": question,
+        "ai_response": answer,
+        "relevant_documents": [doc[:100] + "..." for doc in relevant_docs],  # Store truncated content
+        "response_time_ms": elapsed_ms(started),
+        "retrieval_ms": retrieval_ms,
+        "llm_ms": llm_ms,
+    }
+    if req:
+        conversation_data["user_agent"] = req.headers.get("user-agent")
+        conversation_data["ip_address"] = req.client.host if req.client else None
+    
+    conversation_logger.log(conversation_data)
+
 @app.post("/api/v1/chat")
 async def chat(request: ChatRequest, req: Request = None):
     """Enhanced chat endpoint with hybrid search"""
     try:
-        print(f"💬 Chat request: {request.question}")
-        
-        if not GOOGLE_API_KEY:
-            return {"answer": "Google Gemini API is not configured. Please add GOOGLE_API_KEY to your environment variables."}
-        
-        # Check both storage systems
-        has_documents = bool(documents_store) or (supabase and await check_supabase_documents())
+        logger.info("💬 Chat request: %s", request.question)
+        started = time.perf_counter()
         
-        if not has_documents:
-            return {"answer": "No documents have been uploaded yet. Please upload some PDF documents first through the admin panel."}
+        relevant_docs, fallback_answer = await retrieve_context(request.question)
+        retrieval_ms = elapsed_ms(started)
+        if fallback_answer:
+            return {"answer": fallback_answer}
         
-        # Search for relevant documents (memory first, then Supabase)
-        relevant_docs = search_documents(request.question)
-        
-        # If no memory results, try Supabase
-        if not relevant_docs and supabase:
-            relevant_docs = await search_supabase_documents(request.question)
-        
-        if not relevant_docs:
-            return {"answer": "I couldn't find any relevant information in the uploaded documents for your question. Try uploading more specific documents or rephrasing your question."}
+        # Reuse a previous answer for the same (or a paraphrased) question and context
+        cache_key = answer_cache.make_key(request.question, relevant_docs)
+        semantic_key = semantic_cache.make_key(request.question, relevant_docs)
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is None:
+            cached_answer = semantic_cache.get(semantic_key)
+        if cached_answer is not None:
+            logger.debug("⚡ Answer cache hit")
+            store_conversation(request.question, cached_answer, relevant_docs, req, started, retrieval_ms, None)
+            return {"answer": cached_answer}
         
         # Prepare context for Gemini
-        context = "\n\n".join(relevant_docs[:3])
-        
-        prompt = f"""You are an AI assistant that answers questions based on uploaded documents. Please provide accurate, helpful answers based solely on the information provided.
-
-Document Content:
-{context}
-
-User Question: {request.question}
-
-Instructions:
-- Answer the question based only on the information in the documents above
-- Be specific and detailed when possible
-- If the exact information isn't available, say so clearly
-- Keep your answer concise but informative
-- Use a friendly, helpful tone
-
-Answer:"""
+        prompt = build_prompt(request.question, relevant_docs)
         
         # Call Gemini API
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(prompt)
-            answer = response.text
+            llm_started = time.perf_counter()
+            answer = await gemini_client.generate(prompt)
+            llm_ms = elapsed_ms(llm_started)
+            answer_cache.put(cache_key, answer)
+            semantic_cache.put(semantic_key, answer)
             
             # Store conversation in Supabase (optional)
-            if supabase:
-                try:
-                    conversation_data = {
-                        "user_question": request.question,
-                        "ai_response": answer,
-                        "relevant_documents": [doc[:100] + "..." for doc in relevant_docs],
-                        "response_time_ms": 0,
-                    }
-                    if req:
-                        conversation_data["user_agent"] = req.headers.get("user-agent")
-                        conversation_data["ip_address"] = req.client.host if req.client else None
-                    
-                    supabase.table("chat_conversations").insert(conversation_data).execute()
-                except Exception as e:
-                    print(f"Warning: Failed to store conversation: {e}")
+            store_conversation(request.question, answer, relevant_docs, req, started, retrieval_ms, llm_ms)
             
-            print(f"✅ Generated answer: {answer[:100]}...")
+            logger.debug("✅ Generated answer: %.100s...", answer)
             return {"answer": answer}
             
         except Exception as e:
-            print(f"❌ Gemini API error: {e}")
+            logger.error("❌ Gemini API error: %s", e)
+            ERRORS.labels("gemini").inc()
             return {"answer": f"I found relevant information in the documents, but encountered an error generating the response: {str(e)}"}
     
     except Exception as e:
-        print(f"❌ Chat error: {e}")
+        logger.error("❌ Chat error: %s", e)
+        ERRORS.labels("chat").inc()
         return {"answer": "I'm sorry, I encountered an error while processing your question. Please try again."}
 
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest, req: Request = None):
+    """Chat endpoint that streams Gemini tokens as Server-Sent Events"""
+    logger.info("💬 Streaming chat request: %s", request.question)
+    started = time.perf_counter()
+    
+    try:
+        relevant_docs, fallback_answer = await retrieve_context(request.question)
+    except Exception as e:
+        logger.error("❌ Chat error: %s", e)
+        ERRORS.labels("chat").inc()
+        relevant_docs, fallback_answer = [], "I'm sorry, I encountered an error while processing your question. Please try again."
+    retrieval_ms = elapsed_ms(started)
+    
+    async def event_stream():
+        # Events: "token" carries {"text"}, "done" and "error" carry the full {"answer"}
+        if fallback_answer:
+            yield format_sse({"answer": fallback_answer}, event="done")
+            return
+        
+        cache_key = answer_cache.make_key(request.question, relevant_docs)
+        semantic_key = semantic_cache.make_key(request.question, relevant_docs)
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is None:
+            cached_answer = semantic_cache.get(semantic_key)
+        if cached_answer is not None:
+            yield format_sse({"text": cached_answer}, event="token")
+            yield format_sse({"answer": cached_answer}, event="done")
+            store_conversation(request.question, cached_answer, relevant_docs, req, started, retrieval_ms, None)
+            return
+        
+        answer_parts = []
+        llm_started = time.perf_counter()
+        try:
+            async for text in gemini_client.stream(build_prompt(request.question, relevant_docs)):
+                answer_parts.append(text)
+                yield format_sse({"text": text}, event="token")
+        except Exception as e:
+            logger.error("❌ Gemini API error: %s", e)
+            ERRORS.labels("gemini").inc()
+            yield format_sse({"answer": f"I found relevant information in the documents, but encountered an error generating the response: {str(e)}"}, event="error")
+            return
+        
+        answer = "".join(answer_parts)
+        answer_cache.put(cache_key, answer)
+        semantic_cache.put(semantic_key, answer)
+        yield format_sse({"answer": answer}, event="done")
+        
+        # Log once the client already has the full answer
+        store_conversation(request.question, answer, relevant_docs, req, started, retrieval_ms, elapsed_ms(llm_started))
+        logger.debug("✅ Streamed answer: %.100s...", answer)
+    
+    return sse_response(event_stream())
+
 async def check_supabase_documents():
     """Check if there are any documents in Supabase"""
     if not supabase:
         return False
     
     try:
-        result = supabase.table("documents").select("id", count="exact").limit(1).execute()
+        result = supabase_call("count_documents", supabase.table("documents").select("id", count="exact").limit(1).execute)
         return (result.count or 0) > 0
     except Exception:
         return False
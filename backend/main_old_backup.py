@@ -1,4 +1,5 @@
 import os
+import threading
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
@@ -20,6 +21,9 @@ from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema import StrOutputParser
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from ingest_manifest import IngestManifest, file_sources, is_file_source, reset_untracked_store, sync_sources
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -54,7 +58,11 @@ if not os.path.exists(DATA_PATH):
 
 # Load the embedding model once when the server starts
 try:
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    # Chunk vectors are cached on disk by chunk hash and reused across uploads
+    embeddings = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL),
+        EmbeddingCache.for_model(EMBEDDING_MODEL),
+    )
 except Exception as e:
     print(f"Error loading embedding model: {e}")
     embeddings = None
@@ -98,25 +106,62 @@ def load_youtube_videos_from_urls(urls):
     print("YouTube functionality temporarily disabled")
     return documents
 
-def process_and_store_documents(documents):
-    if not documents:
-        print("No documents to process.")
-        return
-    print(f"Processing {len(documents)} document(s)...")
+def split_documents(documents):
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = text_splitter.split_documents(documents)
-    
-    if not chunks:
-        print("Could not create chunks from documents.")
-        return
+    return text_splitter.split_documents(documents)
+
+RAG_PROMPT = PromptTemplate.from_template("""
+    You are a helpful assistant. Use the following pieces of context from the uploaded documents to answer the user's question.
+    If you don't know the answer from the context provided, just say that you don't know. Do not try to make up an answer.
+    Keep the answer concise and directly related to the context.
+
+    Context: {context}
+
+    Question: {question}
+
+    Helpful Answer:
+    """)
+
+# Process-wide vector store and RAG chain, opened at startup and replaced
+# after every ingestion; requests only read the current reference
+rag_chain = None
+# Serializes ingestion runs that write to the vector store
+ingest_lock = threading.Lock()
 
-    print(f"Creating vector store with {len(chunks)} chunks...")
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=DB_PATH
+def open_rag_chain():
+    """
+    Open the vector store once and build the retriever and chain on top of it.
+    The chain is swapped in with a single assignment, so concurrent requests
+    keep using the previous one until it is replaced.
+    """
+    global rag_chain
+    if not embeddings or not llm:
+        return
+    vector_store = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+    retriever = vector_store.as_retriever(search_kwargs={'k': 3})
+    rag_chain = (
+        {"context": retriever, "question": RunnablePassthrough()}
+        | RAG_PROMPT
+        | llm
+        | StrOutputParser()
     )
-    print("Data successfully ingested and stored.")
+
+def sync_vector_store():
+    """
+    Embed only new or changed files in DATA_PATH and delete the vectors of
+    changed or removed ones, using the manifest kept in DB_PATH, then
+    refresh the shared RAG chain.
+    """
+    with ingest_lock:
+        manifest = IngestManifest.load(DB_PATH)
+        vector_store = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+        sources = file_sources(DATA_PATH, {".pdf": PyPDFLoader}, manifest)
+        stats = sync_sources(
+            vector_store, manifest, sources, split_documents,
+            data_path=DATA_PATH, removable=is_file_source
+        )
+        open_rag_chain()
+    return stats
 
 # --- 4. Pydantic Models for Request Bodies ---
 class ChatRequest(BaseModel):
@@ -128,6 +173,20 @@ class LoginRequest(BaseModel):
 
 # --- 5. API Endpoints ---
 
+@app.on_event("startup")
+def startup_event():
+    """
+    Open the vector store and build the RAG chain once for all requests.
+    A store left without a manifest by full re-ingestion is removed first,
+    before anything holds it open, so the next sync rebuilds it once.
+    """
+    try:
+        with ingest_lock:
+            reset_untracked_store(DB_PATH, IngestManifest.load(DB_PATH))
+        open_rag_chain()
+    except Exception as e:
+        print(f"Error opening vector store: {e}")
+
 @app.get("/")
 def health_check():
     """
@@ -148,7 +207,8 @@ def test_endpoint():
         "data_path": DATA_PATH, 
         "db_path": DB_PATH,
         "embeddings_status": embeddings_status,
-        "llm_status": llm_status
+        "llm_status": llm_status,
+        "rag_chain_ready": rag_chain is not None
     }
 
 @app.post("/login")
@@ -184,19 +244,15 @@ async def upload_data(files: List[UploadFile] = File(default=[]), youtube_url: O
         # Process documents in background or let it run
         print("Files saved successfully, starting background processing...")
         
-        # Do the heavy processing
-        all_documents = []
+        # Do the heavy processing (only new or changed files are embedded)
+        stats = {"chunks_embedded": 0}
         if saved_files_paths:
-            print(f"Loading {len(saved_files_paths)} files from {DATA_PATH}...")
-            all_documents.extend(load_documents_from_path(DATA_PATH))
+            print(f"Syncing {DATA_PATH} with the vector store...")
+            stats = sync_vector_store()
         if youtube_url:
             print(f"YouTube URL provided but functionality is temporarily disabled: {youtube_url}")
-            
-        if all_documents:
-            process_and_store_documents(all_documents)
-            print("Successfully processed and stored documents")
         
-        return {"status": "success", "message": f"Successfully uploaded {len(saved_files_paths)} file(s) and processed {len(all_documents)} document(s)"}
+        return {"status": "success", "message": f"Successfully uploaded {len(saved_files_paths)} file(s) and embedded {stats['chunks_embedded']} chunk(s)"}
 
     except Exception as e:
         print(f"An error occurred during upload: {e}")
@@ -263,6 +319,8 @@ def delete_data_source(source_id: str):
         if os.path.exists(file_path):
             os.remove(file_path)
             print(f"Deleted file: {source_id}")
+            # Drop the file's vectors as well
+            sync_vector_store()
             return {"status": "success", "message": f"Successfully deleted {source_id}"}
         else:
             raise HTTPException(status_code=404, detail="File not found")
@@ -272,34 +330,12 @@ def delete_data_source(source_id: str):
 
 @app.post("/api/v1/chat")
 def chat(request: ChatRequest):
-    if not embeddings or not llm:
+    chain = rag_chain
+    if not embeddings or not llm or chain is None:
         raise HTTPException(status_code=500, detail="Backend models not initialized.")
-
-    vector_store = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-    retriever = vector_store.as_retriever(search_kwargs={'k': 3})
-    
-    template = """
-    You are a helpful assistant. Use the following pieces of context from the uploaded documents to answer the user's question.
-    If you don't know the answer from the context provided, just say that you don't know. Do not try to make up an answer.
-    Keep the answer concise and directly related to the context.
-
-    Context: {context}
-
-    Question: {question}
-
-    Helpful Answer:
-    """
-    prompt = PromptTemplate.from_template(template)
-    
-    rag_chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
     
     try:
-        response = rag_chain.invoke(request.question)
+        response = chain.invoke(request.question)
         return {"answer": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during RAG chain invocation: {e}")
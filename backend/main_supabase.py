@@ -1,28 +1,44 @@
 import os
+import asyncio
+import logging
 import uvicorn
-import hashlib
 import uuid
-from datetime import datetime
+import time
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-import PyPDF2
 import google.generativeai as genai
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import io
+from pdf_extraction import iter_pdf_chunks, shutdown_pdf_executor
+from prompting import build_prompt, format_sse, sse_response
+from gemini_client import gemini_client
+from answer_cache import answer_cache
+from semantic_cache import semantic_cache
+from chunk_search import SupabaseChunkSearch, extract_keywords, is_missing_function_error
+from keyword_matcher import KeywordMatcher
+from ingestion_jobs import IngestionJob, ingestion_queue, track_iteration
+from supabase_writer import write_document
+from conversation_logger import ConversationLogger, elapsed_ms
+from upload_spool import SpooledUpload, spool_upload
+from structured_logging import bind_request_id, configure_logging, logging_stats
+from metrics import ERRORS, RETRIEVAL_LATENCY, SEARCH_FALLBACKS, metrics_response, observe_request, supabase_call, timed
 
 # Load environment variables
 load_dotenv()
 
+# Log records are written by a background thread, off the event loop
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Configure Google Gemini
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
-    print("✓ Google Gemini API configured")
+    logger.info("✓ Google Gemini API configured")
 else:
-    print("✗ Warning: GOOGLE_API_KEY not found in environment variables")
+    logger.warning("✗ Warning: GOOGLE_API_KEY not found in environment variables")
 
 # Configure Supabase
 SUPABASE_URL = "https://kfekhrbilvrobunqwgzd.supabase.co"
@@ -30,11 +46,20 @@ SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 
 if SUPABASE_KEY:
     supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("✓ Supabase client configured")
+    logger.info("✓ Supabase client configured")
 else:
-    print("✗ Warning: SUPABASE_ANON_KEY not found in environment variables")
+    logger.warning("✗ Warning: SUPABASE_ANON_KEY not found in environment variables")
     supabase = None
 
+# Ranked chunk search runs inside Postgres (see sql/search_document_chunks.sql)
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", 8))
+chunk_search = SupabaseChunkSearch(supabase) if supabase else None
+# Cleared on the first "function does not exist" error so later searches skip the RPC
+search_rpc_available = True
+
+# Chat logging is batched in the background, off the response path
+conversation_logger = ConversationLogger(supabase)
+
 # Initialize FastAPI
 app = FastAPI(title="AI Chatbot API - Supabase Edition", version="3.0.0")
 
@@ -56,18 +81,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add middleware to log all requests
+# Add middleware to log all requests and record their latency
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = datetime.now()
-    print(f"🌐 {request.method} {request.url.path} - Client: {request.client.host if request.client else 'Unknown'}")
-    
-    response = await call_next(request)
-    
-    process_time = (datetime.now() - start_time).total_seconds()
-    print(f"⚡ Response: {response.status_code} - Time: {process_time:.3f}s")
+    started = time.perf_counter()
+    status_code = 500
+    request_id = bind_request_id(request.headers.get("x-request-id"))
+    logger.debug("🌐 %s %s - Client: %s", request.method, request.url.path, request.client.host if request.client else 'Unknown')
     
-    return response
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        process_time = time.perf_counter() - started
+        observe_request(request, status_code, process_time)
+        logger.info("⚡ Response: %s - Time: %.3fs", status_code, process_time,
+                    extra={"method": request.method, "path": request.url.path})
 
 class ChatRequest(BaseModel):
     question: str
@@ -76,145 +107,106 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-def extract_text_from_pdf_bytes(file_content: bytes):
-    """Extract text from PDF bytes (in-memory processing)"""
-    try:
-        text = ""
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return ""
-
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
-    """Split text into overlapping chunks"""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-    return chunks
-
-def get_text_hash(text: str) -> str:
-    """Generate a hash for text content"""
-    return hashlib.sha256(text.encode()).hexdigest()
-
-async def store_document_in_supabase(filename: str, file_content: bytes, content: str):
-    """Store document and its chunks in Supabase"""
+async def store_document_in_supabase(upload: SpooledUpload, job: Optional[IngestionJob] = None):
+    """Stream a spooled PDF into Supabase storage, documents and document_chunks"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase not configured")
     
+    filename = upload.filename
     try:
-        print(f"🔄 Starting upload process for: {filename}")
+        logger.debug("🔄 Starting upload process for: %s", filename)
+        
+        # Pages are extracted and chunked incrementally; the first chunk is
+        # also the content preview, and PDFs without text are not stored
+        chunks = track_iteration(job, "extract", iter_pdf_chunks(upload.path))
+        first_chunk = None
+        async for first_chunk in chunks:
+            break
+        if first_chunk is None:
+            raise ValueError("No text could be extracted from the PDF")
+        
+        async def all_chunks():
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
         
-        # Store file in Supabase storage
         file_path = f"uploads/{uuid.uuid4()}_{filename}"
-        print(f"📁 Uploading to storage path: {file_path}")
-        
-        storage_result = supabase.storage.from_("documents").upload(file_path, file_content)
-        print(f"✅ Storage upload result: {storage_result}")
-        
-        # Create document record
-        print(f"💾 Creating document record in database...")
+        logger.debug("📁 Uploading to storage path: %s", file_path)
         document_data = {
             "filename": filename,
             "original_filename": filename,
             "file_type": "pdf",
-            "file_size": len(file_content),
-            "content_preview": content[:500] + "..." if len(content) > 500 else content,
+            "file_size": upload.size,
+            "content_preview": first_chunk[:500] + "..." if len(first_chunk) > 500 else first_chunk,
             "status": "processing",
             "storage_path": file_path,
         }
         
-        doc_result = supabase.table("documents").insert(document_data).execute()
-        print(f"✅ Document record created: {doc_result}")
-        document_id = doc_result.data[0]["id"]
-        print(f"🆔 Document ID: {document_id}")
-        
-        # Split content into chunks and store
-        chunks = chunk_text(content)
-        print(f"📝 Created {len(chunks)} chunks from document")
-        chunk_data = []
-        
-        for i, chunk in enumerate(chunks):
-            chunk_data.append({
-                "document_id": document_id,
-                "chunk_index": i,
-                "content": chunk,
-                "content_length": len(chunk),
-                "chunk_hash": get_text_hash(chunk)
-            })
-        
-        # Batch insert chunks
-        if chunk_data:
-            chunk_result = supabase.table("document_chunks").insert(chunk_data).execute()
-            print(f"✅ Chunks inserted: {len(chunk_data)} chunks")
-        
-        # Update document status
-        update_result = supabase.table("documents").update({
-            "status": "indexed",
-            "processed_date": datetime.now().isoformat()
-        }).eq("id", document_id).execute()
-        print(f"✅ Document status updated to indexed")
+        # Storage upload, document row and chunk batches are written concurrently
+        document_id = await write_document(supabase, upload.path, document_data, all_chunks(), job)
+        logger.debug("✅ Document status updated to indexed")
         
-        print(f"🎉 Successfully stored document {filename} with ID: {document_id}")
+        logger.info("🎉 Successfully stored document %s with ID: %s", filename, document_id)
         return document_id
         
     except Exception as e:
-        print(f"❌ Error storing document in Supabase: {e}")
-        print(f"❌ Error type: {type(e)}")
-        import traceback
-        print(f"❌ Full traceback: {traceback.format_exc()}")
+        logger.exception("❌ Error storing document in Supabase: %s", e)
+        ERRORS.labels("supabase").inc()
         raise HTTPException(status_code=500, detail=f"Failed to store document: {str(e)}")
 
 async def search_documents_supabase(query: str) -> List[str]:
-    """Enhanced search function with flexible keyword matching"""
+    """Ranked keyword search executed server-side in Postgres"""
+    global search_rpc_available
     if not supabase:
         return []
     
+    logger.debug("🔍 Searching for: '%s'", query)
+    keywords = extract_keywords(query)
+    logger.debug("🔑 Extracted keywords: %s", keywords)
+    
+    if search_rpc_available:
+        try:
+            # Only the top N chunks come back over the network
+            with timed(RETRIEVAL_LATENCY, strategy="supabase_rpc"):
+                top_chunks = await asyncio.to_thread(chunk_search.search, keywords, SEARCH_RESULT_LIMIT)
+        except Exception as e:
+            if not is_missing_function_error(e):
+                # A transient failure answers without context rather than scanning every chunk
+                logger.error("❌ Ranked search failed: %s", e)
+                ERRORS.labels("retrieval").inc()
+                return []
+            search_rpc_available = False
+            logger.warning("⚠️ search_document_chunks is not installed, using client-side scoring from now on")
+            SEARCH_FALLBACKS.labels("supabase_rpc", "supabase_scan").inc()
+    
+    if not search_rpc_available:
+        # Every chunk is fetched and scored here; run sql/search_document_chunks.sql to avoid it
+        with timed(RETRIEVAL_LATENCY, strategy="supabase_scan"):
+            return await asyncio.to_thread(search_documents_supabase_scan, query, keywords)
+    
+    # No full-text match means no context, without reading the rest of the table
+    logger.debug("📊 Ranked search found: %s relevant chunks", len(top_chunks))
+    for i, chunk in enumerate(top_chunks[:3]):  # Log top 3
+        logger.debug("📄 Result %s (score: %s): %.150s...", i+1, chunk['score'], chunk['content'])
+    
+    return [chunk["content"] for chunk in top_chunks]
+
+def search_documents_supabase_scan(query: str, keywords: List[str]) -> List[str]:
+    """Client-side keyword scoring over every chunk (used when the search RPC is not installed)"""
     try:
-        print(f"🔍 Searching for: '{query}'")
-        
-        # Extract keywords from query (remove common words)
-        stop_words = {'the', 'is', 'are', 'what', 'how', 'where', 'when', 'why', 'who', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'explain', 'tell', 'me', 'about'}
-        keywords = [word.lower().strip() for word in query.split() if word.lower().strip() not in stop_words and len(word.strip()) > 2]
-        print(f"🔑 Extracted keywords: {keywords}")
-        
-        if not keywords:
-            # If no meaningful keywords, use the original query
-            keywords = [query.lower().strip()]
-        
         # Get all chunks and perform flexible search
-        all_chunks_result = supabase.table("document_chunks").select("content, document_id, chunk_index").execute()
+        all_chunks_result = supabase_call(
+            "chunk_scan", supabase.table("document_chunks").select("content, document_id, chunk_index").execute
+        )
         all_chunks = all_chunks_result.data
-        print(f"📊 Total chunks in database: {len(all_chunks)}")
+        logger.debug("📊 Total chunks in database: %s", len(all_chunks))
         
-        # Score chunks based on keyword matches
+        # Score chunks based on keyword matches: occurrence counts plus a
+        # 0.5 bonus per keyword found at a word boundary, in one pass per chunk
+        matcher = KeywordMatcher(keywords)
         scored_chunks = []
         for chunk in all_chunks:
-            content_lower = chunk["content"].lower()
-            score = 0
-            matched_keywords = []
-            
-            # Check each keyword
-            for keyword in keywords:
-                if keyword in content_lower:
-                    # Count occurrences for better scoring
-                    occurrences = content_lower.count(keyword)
-                    score += occurrences
-                    matched_keywords.append(keyword)
-            
-            # Also check for partial matches and variations
-            for keyword in keywords:
-                # Check for word boundaries to avoid partial word matches
-                import re
-                if re.search(rf'\b{re.escape(keyword)}', content_lower):
-                    score += 0.5  # Lower score for word boundary matches
+            score, matched_keywords = matcher.score(chunk["content"].lower())
             
             if score > 0:
                 scored_chunks.append({
@@ -227,17 +219,17 @@ async def search_documents_supabase(query: str) -> List[str]:
         
         # Sort by score (descending) and take top results
         scored_chunks.sort(key=lambda x: x["score"], reverse=True)
-        top_chunks = scored_chunks[:8]  # Get more results for better context
+        top_chunks = scored_chunks[:SEARCH_RESULT_LIMIT]  # Get more results for better context
         
-        print(f"📊 Keyword search found: {len(top_chunks)} relevant chunks")
+        logger.debug("📊 Keyword search found: %s relevant chunks", len(top_chunks))
         for i, chunk in enumerate(top_chunks[:3]):  # Log top 3
-            print(f"� Result {i+1} (score: {chunk['score']}, keywords: {chunk['matched_keywords']}): {chunk['content'][:150]}...")
+            logger.debug("📄 Result %s (score: %s, keywords: %s): %.150s...", i+1, chunk['score'], chunk['matched_keywords'], chunk['content'])
         
         if top_chunks:
             return [chunk["content"] for chunk in top_chunks]
         
         # Fallback: If no keyword matches, try partial string matching
-        print("🔄 No keyword matches found, trying partial string matching...")
+        logger.debug("🔄 No keyword matches found, trying partial string matching...")
         partial_matches = []
         query_words = query.lower().split()
         
@@ -250,22 +242,29 @@ async def search_documents_supabase(query: str) -> List[str]:
             if len(partial_matches) >= 5:
                 break
         
-        print(f"📊 Partial matching found: {len(partial_matches)} chunks")
+        logger.debug("📊 Partial matching found: %s chunks", len(partial_matches))
         return partial_matches
         
     except Exception as e:
-        print(f"❌ Error in enhanced search: {e}")
-        print(f"❌ Error type: {type(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Error in enhanced search: %s", e)
+        ERRORS.labels("retrieval").inc()
         return []
 
 @app.on_event("startup")
 async def startup_event():
     """Startup message for Supabase edition"""
-    print("🚀 Starting AI Chatbot API - Supabase Edition")
-    print(f"📊 Database URL: {SUPABASE_URL}")
-    print("💾 Documents stored persistently in Supabase")
+    logger.info("🚀 Starting AI Chatbot API - Supabase Edition")
+    logger.info("📊 Database URL: %s", SUPABASE_URL)
+    logger.info("💾 Documents stored persistently in Supabase")
+    await ingestion_queue.start()
+    await conversation_logger.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the ingestion workers, flush chat logs and stop the PDF extraction pool"""
+    await ingestion_queue.stop()
+    await conversation_logger.stop()
+    shutdown_pdf_executor()
 
 @app.get("/")
 def health_check():
@@ -292,7 +291,7 @@ def test_endpoint():
             chunk_result = supabase.table("document_chunks").select("id", count="exact").execute()
             chunk_count = chunk_result.count
         except Exception as e:
-            print(f"Database test error: {e}")
+            logger.error("Database test error: %s", e)
     
     return {
         "status": "success",
@@ -302,7 +301,11 @@ def test_endpoint():
         "documents_count": doc_count,
         "chunks_count": chunk_count,
         "storage_mode": "supabase",
-        "database_url": SUPABASE_URL
+        "database_url": SUPABASE_URL,
+        "answer_cache": answer_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "conversation_logger": conversation_logger.stats(),
+        "logging": logging_stats()
     }
 
 @app.get("/debug/chunks")
@@ -340,9 +343,14 @@ def debug_chunks():
         }
         
     except Exception as e:
-        print(f"Debug chunks error: {e}")
+        logger.error("Debug chunks error: %s", e)
         return {"error": str(e)}
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics (per-stage latency histograms, cache hits, errors)"""
+    return metrics_response()
+
 @app.post("/login")
 def login(request: LoginRequest):
     """Simple mock login (no auth required for demo)"""
@@ -355,7 +363,7 @@ async def get_data_sources():
         return {"sources": []}
     
     try:
-        result = supabase.table("documents").select("*").order("upload_date", desc=True).execute()
+        result = supabase_call("list_documents", supabase.table("documents").select("*").order("upload_date", desc=True).execute)
         
         # Format for frontend compatibility
         sources = []
@@ -372,51 +380,74 @@ async def get_data_sources():
         return {"sources": sources}
         
     except Exception as e:
-        print(f"Error getting sources: {e}")
+        logger.error("Error getting sources: %s", e)
         return {"sources": []}
 
-@app.post("/api/v1/data/upload")
+async def ingest_document(job: IngestionJob, upload: SpooledUpload):
+    """Ingestion job: extract, chunk and store one spooled PDF"""
+    logger.debug("🔄 Processing file: %s", job.filename)
+    logger.debug("📏 File size: %s bytes", upload.size)
+    
+    try:
+        document_id = await store_document_in_supabase(upload, job)
+    finally:
+        upload.cleanup()
+    answer_cache.invalidate()
+    semantic_cache.invalidate()
+    
+    logger.info("🎯 Successfully processed: %s (ID: %s)", job.filename, document_id)
+
+@app.post("/api/v1/data/upload", status_code=202)
 async def upload_files(files: List[UploadFile] = File(...)):
-    """Upload and process files to Supabase"""
+    """Queue uploaded files for background ingestion into Supabase"""
     if not supabase:
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        uploaded_files = []
+        jobs = []
         
         for file in files:
             if not file.filename.lower().endswith('.pdf'):
                 continue
-                
-            # Read file content
-            content = await file.read()
-            
-            # Extract text
-            text_content = extract_text_from_pdf_bytes(content)
-            
-            if not text_content:
-                continue
-            
-            # Store in Supabase
-            print(f"🔄 Processing file: {file.filename}")
-            print(f"📏 File size: {len(content)} bytes")
-            print(f"📄 Text extracted: {len(text_content)} characters")
-            
-            document_id = await store_document_in_supabase(file.filename, content, text_content)
-            uploaded_files.append(file.filename)
             
-            print(f"🎯 Successfully processed: {file.filename} (ID: {document_id})")
-        
+            # Spool to disk so large PDFs are never held in memory
+            job = IngestionJob(file.filename)
+            with job.track("read"):
+                upload = await spool_upload(file)
+            job.size = upload.size
+            jobs.append(ingestion_queue.submit(job, ingest_document, upload))
+            if job.status == "rejected":
+                upload.cleanup()
+        
+        accepted = [job for job in jobs if job.status != "rejected"]
         return {
-            "message": f"Successfully uploaded {len(uploaded_files)} files to Supabase",
-            "files": uploaded_files,
+            "message": f"Accepted {len(accepted)} files for processing",
+            "files": [job.filename for job in accepted],
+            "jobs": [job.to_dict() for job in jobs],
             "storage": "supabase"
         }
         
     except Exception as e:
-        print(f"Upload error: {e}")
+        logger.error("Upload error: %s", e)
+        ERRORS.labels("upload").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/data/jobs")
+def list_ingestion_jobs():
+    """List recent ingestion jobs, newest first"""
+    return {
+        "jobs": [job.to_dict() for job in reversed(ingestion_queue.jobs.values())],
+        "stats": ingestion_queue.stats()
+    }
+
+@app.get("/api/v1/data/jobs/{job_id}")
+def get_ingestion_job(job_id: str):
+    """Report the status, progress and stage timings of an ingestion job"""
+    job = ingestion_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
 @app.delete("/api/v1/data/sources/{source_id}")
 async def delete_source(source_id: str):
     """Delete a document from Supabase"""
@@ -425,7 +456,7 @@ async def delete_source(source_id: str):
     
     try:
         # Find document by filename
-        doc_result = supabase.table("documents").select("*").eq("filename", source_id).execute()
+        doc_result = supabase_call("find_document", supabase.table("documents").select("*").eq("filename", source_id).execute)
         
         if not doc_result.data:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -435,17 +466,20 @@ async def delete_source(source_id: str):
         # Delete from storage
         if document["storage_path"]:
             try:
-                supabase.storage.from_("documents").remove([document["storage_path"]])
+                supabase_call("storage_remove", supabase.storage.from_("documents").remove, [document["storage_path"]])
             except Exception as e:
-                print(f"Storage deletion error: {e}")
+                logger.error("Storage deletion error: %s", e)
         
         # Delete from database (cascades to chunks)
-        supabase.table("documents").delete().eq("id", document["id"]).execute()
+        supabase_call("delete_document", supabase.table("documents").delete().eq("id", document["id"]).execute)
+        answer_cache.invalidate()
+        semantic_cache.invalidate()
         
         return {"message": "Document deleted successfully"}
         
     except Exception as e:
-        print(f"Delete error: {e}")
+        logger.error("Delete error: %s", e)
+        ERRORS.labels("delete").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.options("/api/v1/chat")
@@ -453,92 +487,157 @@ def chat_options():
     """Handle CORS preflight for chat endpoint"""
     return {"status": "ok"}
 
+async def retrieve_context(question: str):
+    """Run retrieval for a chat question; returns (relevant_docs, fallback_answer)"""
+    if not GOOGLE_API_KEY:
+        return [], "Google Gemini API is not configured. Please add GOOGLE_API_KEY to your environment variables."
+    
+    if not supabase:
+        return [], "Database is not configured. Please check Supabase connection."
+    
+    # Search for relevant documents in Supabase
+    relevant_docs = await search_documents_supabase(question)
+    
+    logger.debug("🔍 Search results: Found %s relevant documents", len(relevant_docs))
+    if relevant_docs:
+        logger.debug("📄 First result preview: %.200s...", relevant_docs[0])
+        return relevant_docs, None
+    
+    # Let's check if there are any documents in the database at all
+    try:
+        total_docs = supabase_call("count_documents", supabase.table("documents").select("id", count="exact").execute)
+        total_chunks = supabase_call("count_chunks", supabase.table("document_chunks").select("id", count="exact").execute)
+        logger.debug("📊 Database status: %s documents, %s chunks", total_docs.count, total_chunks.count)
+        
+        if total_docs.count == 0:
+            return [], "No documents have been uploaded to the knowledge base yet. Please upload some documents first."
+        else:
+            return [], f"I found {total_docs.count} documents in the knowledge base, but couldn't find relevant information for your specific question: '{question}'. Try rephrasing your question or using different keywords."
+    except Exception as db_check_error:
+        logger.error("❌ Database check error: %s", db_check_error)
+        return [], "I couldn't find any relevant information in the knowledge base for your question. Please make sure documents have been uploaded to the system."
+
+def store_conversation(question: str, answer: str, relevant_docs: List[str], req: Optional[Request],
+                       started: float, retrieval_ms: int, llm_ms: Optional[int]):
+    """Queue a chat exchange for the background Supabase logger (optional)"""
+    conversation_data = {
+        "user_question": question,
+        "ai_response": answer,
+        "relevant_documents": [doc[:100] + "..." for doc in relevant_docs],  # Store truncated content
+        "response_time_ms": elapsed_ms(started),
+        "retrieval_ms": retrieval_ms,
+        "llm_ms": llm_ms,
+    }
+    if req:
+        conversation_data["user_agent"] = req.headers.get("user-agent")
+        conversation_data["ip_address"] = req.client.host if req.client else None
+    
+    conversation_logger.log(conversation_data)
+
 @app.post("/api/v1/chat")
 async def chat(request: ChatRequest, req: Request = None):
     """Chat endpoint with Supabase document search"""
     try:
-        print(f"💬 Chat request: {request.question}")
-        
-        if not GOOGLE_API_KEY:
-            return {"answer": "Google Gemini API is not configured. Please add GOOGLE_API_KEY to your environment variables."}
-        
-        if not supabase:
-            return {"answer": "Database is not configured. Please check Supabase connection."}
-        
-        # Search for relevant documents in Supabase
-        relevant_docs = await search_documents_supabase(request.question)
-        
-        print(f"🔍 Search results: Found {len(relevant_docs)} relevant documents")
-        if relevant_docs:
-            print(f"📄 First result preview: {relevant_docs[0][:200]}...")
-        
-        if not relevant_docs:
-            # Let's check if there are any documents in the database at all
-            try:
-                total_docs = supabase.table("documents").select("id", count="exact").execute()
-                total_chunks = supabase.table("document_chunks").select("id", count="exact").execute()
-                print(f"📊 Database status: {total_docs.count} documents, {total_chunks.count} chunks")
-                
-                if total_docs.count == 0:
-                    return {"answer": "No documents have been uploaded to the knowledge base yet. Please upload some documents first."}
-                else:
-                    return {"answer": f"I found {total_docs.count} documents in the knowledge base, but couldn't find relevant information for your specific question: '{request.question}'. Try rephrasing your question or using different keywords."}
-            except Exception as db_check_error:
-                print(f"❌ Database check error: {db_check_error}")
-                return {"answer": "I couldn't find any relevant information in the knowledge base for your question. Please make sure documents have been uploaded to the system."}
+        logger.info("💬 Chat request: %s", request.question)
+        started = time.perf_counter()
+        
+        relevant_docs, fallback_answer = await retrieve_context(request.question)
+        retrieval_ms = elapsed_ms(started)
+        if fallback_answer:
+            return {"answer": fallback_answer}
+        
+        # Reuse a previous answer for the same (or a paraphrased) question and context
+        cache_key = answer_cache.make_key(request.question, relevant_docs[:3])
+        semantic_key = semantic_cache.make_key(request.question, relevant_docs[:3])
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is None:
+            cached_answer = semantic_cache.get(semantic_key)
+        if cached_answer is not None:
+            logger.debug("⚡ Answer cache hit")
+            store_conversation(request.question, cached_answer, relevant_docs, req, started, retrieval_ms, None)
+            return {"answer": cached_answer}
         
         # Prepare context for Gemini
-        context = "\n\n".join(relevant_docs[:3])  # Use top 3 matches
-        
-        prompt = f"""You are an AI assistant that answers questions based on uploaded documents. Please provide accurate, helpful answers based solely on the information provided.
-
-Document Content:
-{context}
-
-User Question: {request.question}
-
-Instructions:
-- Answer the question based only on the information in the documents above
-- Be specific and detailed when possible
-- If the exact information isn't available, say so clearly
-- Keep your answer concise but informative
-- Use a friendly, helpful tone
-
-Answer:"""
+        prompt = build_prompt(request.question, relevant_docs[:3])  # Use top 3 matches
         
         # Call Gemini API
         try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(prompt)
-            answer = response.text
+            llm_started = time.perf_counter()
+            answer = await gemini_client.generate(prompt)
+            llm_ms = elapsed_ms(llm_started)
+            answer_cache.put(cache_key, answer)
+            semantic_cache.put(semantic_key, answer)
             
             # Store conversation in Supabase (optional)
-            try:
-                conversation_data = {
-                    "user_question": request.question,
-                    "ai_response": answer,
-                    "relevant_documents": [doc[:100] + "..." for doc in relevant_docs],  # Store truncated content
-                    "response_time_ms": 0,  # Could measure actual time
-                }
-                if req:
-                    conversation_data["user_agent"] = req.headers.get("user-agent")
-                    conversation_data["ip_address"] = req.client.host if req.client else None
-                
-                supabase.table("chat_conversations").insert(conversation_data).execute()
-            except Exception as e:
-                print(f"Warning: Failed to store conversation: {e}")
+            store_conversation(request.question, answer, relevant_docs, req, started, retrieval_ms, llm_ms)
             
-            print(f"✅ Generated answer: {answer[:100]}...")
+            logger.debug("✅ Generated answer: %.100s...", answer)
             return {"answer": answer}
             
         except Exception as e:
-            print(f"❌ Gemini API error: {e}")
+            logger.error("❌ Gemini API error: %s", e)
+            ERRORS.labels("gemini").inc()
             return {"answer": f"I found relevant information in the knowledge base, but encountered an error generating the response: {str(e)}"}
     
     except Exception as e:
-        print(f"❌ Chat error: {e}")
+        logger.error("❌ Chat error: %s", e)
+        ERRORS.labels("chat").inc()
         return {"answer": "I'm sorry, I encountered an error while processing your question. Please try again."}
 
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest, req: Request = None):
+    """Chat endpoint that streams Gemini tokens as Server-Sent Events"""
+    logger.info("💬 Streaming chat request: %s", request.question)
+    started = time.perf_counter()
+    
+    try:
+        relevant_docs, fallback_answer = await retrieve_context(request.question)
+    except Exception as e:
+        logger.error("❌ Chat error: %s", e)
+        ERRORS.labels("chat").inc()
+        relevant_docs, fallback_answer = [], "I'm sorry, I encountered an error while processing your question. Please try again."
+    retrieval_ms = elapsed_ms(started)
+    
+    async def event_stream():
+        # Events: "token" carries {"text"}, "done" and "error" carry the full {"answer"}
+        if fallback_answer:
+            yield format_sse({"answer": fallback_answer}, event="done")
+            return
+        
+        cache_key = answer_cache.make_key(request.question, relevant_docs[:3])
+        semantic_key = semantic_cache.make_key(request.question, relevant_docs[:3])
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is None:
+            cached_answer = semantic_cache.get(semantic_key)
+        if cached_answer is not None:
+            yield format_sse({"text": cached_answer}, event="token")
+            yield format_sse({"answer": cached_answer}, event="done")
+            store_conversation(request.question, cached_answer, relevant_docs, req, started, retrieval_ms, None)
+            return
+        
+        answer_parts = []
+        llm_started = time.perf_counter()
+        try:
+            async for text in gemini_client.stream(build_prompt(request.question, relevant_docs[:3])):
+                answer_parts.append(text)
+                yield format_sse({"text": text}, event="token")
+        except Exception as e:
+            logger.error("❌ Gemini API error: %s", e)
+            ERRORS.labels("gemini").inc()
+            yield format_sse({"answer": f"I found relevant information in the knowledge base, but encountered an error generating the response: {str(e)}"}, event="error")
+            return
+        
+        answer = "".join(answer_parts)
+        answer_cache.put(cache_key, answer)
+        semantic_cache.put(semantic_key, answer)
+        yield format_sse({"answer": answer}, event="done")
+        
+        # Log once the client already has the full answer
+        store_conversation(request.question, answer, relevant_docs, req, started, retrieval_ms, elapsed_ms(llm_started))
+        logger.debug("✅ Streamed answer: %.100s...", answer)
+    
+    return sse_response(event_stream())
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Prometheus metrics shared by the server variants, exposed on /metrics.
+
+Every stage of a chat or upload has its own latency histogram (HTTP
+request, retrieval and each hybrid retriever leg, Gemini, PDF extraction,
+Supabase round trips) so a p99 regression can be traced to the stage that
+caused it. prometheus_client is optional: without it every metric is a
+no-op and /metrics answers 503.
+"""
+import time
+from contextlib import contextmanager
+
+from fastapi import Request, Response
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# Seconds; covers in-memory lookups (~1 ms) up to slow Gemini answers
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Characters
+PROMPT_SIZE_BUCKETS = (500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000, 64000)
+
+
+class _NullMetric:
+    """Stand-in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+def _histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    if not PROMETHEUS_AVAILABLE:
+        return _NullMetric()
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def _counter(name, documentation, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NullMetric()
+    return Counter(name, documentation, labelnames)
+
+
+REQUEST_LATENCY = _histogram(
+    "chatbot_request_duration_seconds", "HTTP request latency until the response starts",
+    ["method", "route", "status"]
+)
+RETRIEVAL_LATENCY = _histogram(
+    "chatbot_retrieval_duration_seconds", "Chunk retrieval latency per chat question", ["strategy"]
+)
+RETRIEVER_LEG_LATENCY = _histogram(
+    "chatbot_retriever_leg_duration_seconds", "Latency of each hybrid retrieval leg", ["leg", "outcome"]
+)
+PROMPT_SIZE = _histogram(
+    "chatbot_prompt_size_chars", "Size of the prompts sent to Gemini", buckets=PROMPT_SIZE_BUCKETS
+)
+GEMINI_LATENCY = _histogram(
+    "chatbot_gemini_duration_seconds", "Gemini generation latency (full stream for streaming calls)",
+    ["mode", "outcome"]
+)
+PDF_EXTRACTION_LATENCY = _histogram(
+    "chatbot_pdf_extraction_duration_seconds",
+    "Text extraction latency per PDF page range (PDF_PAGES_PER_TASK pages), pool queueing included"
+)
+SUPABASE_LATENCY = _histogram(
+    "chatbot_supabase_duration_seconds", "Supabase round-trip latency", ["operation", "outcome"]
+)
+CACHE_HITS = _counter("chatbot_cache_hits_total", "Answer cache hits", ["cache"])
+CACHE_MISSES = _counter("chatbot_cache_misses_total", "Answer cache misses", ["cache"])
+ERRORS = _counter("chatbot_errors_total", "Handled errors", ["stage"])
+SEARCH_FALLBACKS = _counter(
+    "chatbot_search_fallbacks_total", "Searches answered by a fallback strategy", ["source", "target"]
+)
+
+
+@contextmanager
+def timed(histogram, outcome: bool = False, **labels):
+    """Observe the duration of the block, with an ok/error "outcome" label if requested"""
+    started = time.perf_counter()
+    result = "ok"
+    try:
+        yield
+    except BaseException:
+        result = "error"
+        raise
+    finally:
+        if outcome:
+            labels["outcome"] = result
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def supabase_call(operation: str, func, *args, **kwargs):
+    """Run a blocking Supabase request and record its round-trip time"""
+    with timed(SUPABASE_LATENCY, outcome=True, operation=operation):
+        return func(*args, **kwargs)
+
+
+def observe_request(request: Request, status_code: int, seconds: float):
+    """Record one HTTP request under its route template (not the raw path)"""
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(
+        request.method, getattr(route, "path", "unmatched"), str(status_code)
+    ).observe(seconds)
+
+
+def metrics_response() -> Response:
+    """Body of the /metrics endpoint in the Prometheus text format"""
+    if not PROMETHEUS_AVAILABLE:
+        return Response("prometheus_client is not installed\n", status_code=503, media_type="text/plain")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,104 @@
+"""
+Parallel loading of ingestion sources.
+
+CPU-bound parsers (PDF, DOCX) run in a process pool and I/O-bound fetches
+(YouTube transcripts) in a thread pool. A failing source only fails itself,
+results are yielded in the order the sources were given, and at most
+`window` sources are loaded ahead of the consumer.
+"""
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Processes for CPU-bound parsers; 0 runs them in the thread pool instead
+INGEST_PROCESS_WORKERS = int(os.getenv("INGEST_PROCESS_WORKERS", os.cpu_count() or 1))
+# Threads for I/O-bound fetches
+INGEST_THREAD_WORKERS = int(os.getenv("INGEST_THREAD_WORKERS", 8))
+
+
+class Source(NamedTuple):
+    """
+    Something to ingest. load(*args) returns its LangChain documents; for
+    process-pool sources load and args must be picklable (module-level).
+    """
+    key: str
+    fingerprint: str
+    load: Callable[..., List[Any]]
+    args: Tuple = ()
+    io_bound: bool = False
+
+
+def load_file(loader_class, file_path: str) -> List[Any]:
+    """Parse one file with a LangChain document loader class"""
+    return loader_class(file_path).load()
+
+
+def _call(load: Callable[..., List[Any]], args: Tuple) -> List[Any]:
+    return list(load(*args))
+
+
+class _LoaderPools:
+    def __init__(self, process_workers: int, thread_workers: int):
+        self.process_workers = process_workers
+        self.threads = ThreadPoolExecutor(max_workers=max(1, thread_workers))
+        self.processes: Optional[ProcessPoolExecutor] = None
+        self.generation = 0
+
+    def submit(self, source: Source) -> Tuple[Future, int]:
+        if source.io_bound or self.process_workers <= 0:
+            return self.threads.submit(_call, source.load, source.args), -1
+        if self.processes is None:
+            self.processes = ProcessPoolExecutor(max_workers=self.process_workers)
+        try:
+            return self.processes.submit(_call, source.load, source.args), self.generation
+        except BrokenProcessPool:
+            self.restart_processes(self.generation)
+            return self.submit(source)
+
+    def restart_processes(self, generation: int):
+        """Replace a broken process pool (once per breakage)"""
+        if generation == self.generation and self.processes is not None:
+            self.processes.shutdown(wait=False, cancel_futures=True)
+            self.processes = None
+            self.generation += 1
+
+    def shutdown(self):
+        self.threads.shutdown(wait=True, cancel_futures=True)
+        if self.processes is not None:
+            self.processes.shutdown(wait=True, cancel_futures=True)
+
+
+def load_sources(sources: Iterable[Source], process_workers: int = INGEST_PROCESS_WORKERS,
+                 thread_workers: int = INGEST_THREAD_WORKERS,
+                 window: Optional[int] = None) -> Iterator[Tuple[Source, List[Any], Optional[Exception]]]:
+    """Yield (source, documents, error) for every source, in input order"""
+    window = window or 2 * (max(process_workers, 0) + max(thread_workers, 1))
+    pools = _LoaderPools(process_workers, thread_workers)
+
+    def result(source: Source, future: Future, generation: int):
+        try:
+            return source, future.result(), None
+        except BrokenProcessPool:
+            # A parser killed a worker process, which fails every source in
+            # that pool; retry once in a fresh pool so only the culprit fails
+            pools.restart_processes(generation)
+            try:
+                retry, _ = pools.submit(source)
+                return source, retry.result(), None
+            except Exception as e:
+                return source, [], e
+        except Exception as e:
+            return source, [], e
+
+    pending = deque()
+    try:
+        for source in sources:
+            pending.append((source, *pools.submit(source)))
+            if len(pending) >= window:
+                yield result(*pending.popleft())
+        while pending:
+            yield result(*pending.popleft())
+    finally:
+        pools.shutdown()
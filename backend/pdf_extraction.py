@@ -0,0 +1,156 @@
+"""
+PDF text extraction that runs off the event loop.
+
+Parsing is done in a process pool so a large upload does not stall chat
+requests on the same worker. PDFs longer than PDF_PAGES_PER_TASK pages are
+split into page ranges that are parsed in parallel and streamed in page order.
+
+A source is either the PDF bytes or the path of a spooled upload; files are
+read through a memory map so workers never receive a copy of the PDF.
+"""
+import asyncio
+import io
+import logging
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+import PyPDF2
+
+from metrics import PDF_EXTRACTION_LATENCY
+from text_processing import StreamingChunker
+
+logger = logging.getLogger(__name__)
+
+
+def _default_workers() -> int:
+    """CPUs this process may run on (not every host CPU)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        cpus = os.cpu_count() or 1
+    return cpus
+
+
+# Number of extraction processes; 0 parses in a background thread instead.
+# Each process holds its own copy of PyPDF2 and the pages it parses, so on
+# small instances set PDF_EXTRACT_WORKERS (e.g. 1) to bound memory.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", _default_workers()))
+# Pages parsed per task when a PDF is split across workers
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 20))
+# Page ranges extracted ahead of the consumer when streaming pages
+PDF_RANGES_IN_FLIGHT = int(os.getenv("PDF_RANGES_IN_FLIGHT", max(1, PDF_EXTRACT_WORKERS)))
+
+PdfSource = Union[bytes, str]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _page_texts(pdf_reader, start: int, end: int) -> List[str]:
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+@contextmanager
+def _open_pdf(source: PdfSource):
+    """PdfReader over PDF bytes, or over a memory-mapped file path"""
+    if isinstance(source, (bytes, bytearray)):
+        yield PyPDF2.PdfReader(io.BytesIO(source))
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield PyPDF2.PdfReader(mapped)
+
+
+def _extract_first_range(source: PdfSource, pages_per_task: int) -> Tuple[int, List[str]]:
+    """Return the page count and the text of the first page range"""
+    with _open_pdf(source) as pdf_reader:
+        page_count = len(pdf_reader.pages)
+        return page_count, _page_texts(pdf_reader, 0, min(pages_per_task, page_count))
+
+
+def _extract_page_range(source: PdfSource, start: int, end: int) -> List[str]:
+    """Return the text of pages [start, end)"""
+    with _open_pdf(source) as pdf_reader:
+        return _page_texts(pdf_reader, start, end)
+
+
+def _observe_range(future: asyncio.Future):
+    """Record the time from submitting a page range to its result"""
+    started = time.perf_counter()
+    future.add_done_callback(
+        lambda _: PDF_EXTRACTION_LATENCY.observe(time.perf_counter() - started)
+    )
+    return future
+
+
+def extract_text_from_pdf_bytes(file_content: PdfSource) -> str:
+    """Extract text from PDF bytes (in-memory processing)"""
+    try:
+        with _open_pdf(file_content) as pdf_reader:
+            return "\n".join(_page_texts(pdf_reader, 0, len(pdf_reader.pages))).strip()
+    except Exception as e:
+        logger.error("Error extracting text from PDF: %s", e)
+        return ""
+
+
+def get_pdf_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the shared extraction pool, creating it on first use"""
+    global _executor
+    if _executor is None and PDF_EXTRACT_WORKERS > 0:
+        _executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+    return _executor
+
+
+def shutdown_pdf_executor():
+    """Stop the extraction pool (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def iter_pdf_page_ranges(source: PdfSource) -> AsyncIterator[List[str]]:
+    """
+    Yield the page texts of a PDF one page range at a time, in page order.
+    At most PDF_RANGES_IN_FLIGHT ranges are extracted ahead of the consumer,
+    and each range reopens the file so parsed page objects are not retained.
+    """
+    executor = get_pdf_executor()
+    loop = asyncio.get_running_loop()
+
+    def run(func, *args):
+        if executor is None:
+            return _observe_range(asyncio.ensure_future(asyncio.to_thread(func, *args)))
+        return _observe_range(loop.run_in_executor(executor, func, *args))
+
+    page_count, first_pages = await run(_extract_first_range, source, PDF_PAGES_PER_TASK)
+    yield first_pages
+
+    starts = iter(range(PDF_PAGES_PER_TASK, page_count, PDF_PAGES_PER_TASK))
+    pending = []
+    try:
+        while True:
+            while len(pending) < PDF_RANGES_IN_FLIGHT:
+                start = next(starts, None)
+                if start is None:
+                    break
+                pending.append(run(_extract_page_range, source, start, min(start + PDF_PAGES_PER_TASK, page_count)))
+            if not pending:
+                return
+            yield await pending.pop(0)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def iter_pdf_chunks(source: PdfSource, chunk_size: int = 1000, overlap: int = 100) -> AsyncIterator[str]:
+    """Yield the text chunks of a PDF without building the full document text"""
+    chunker = StreamingChunker(chunk_size, overlap)
+    async for page_range in iter_pdf_page_ranges(source):
+        for page_text in page_range:
+            for chunk in chunker.feed(page_text):
+                yield chunk
+    for chunk in chunker.finish():
+        yield chunk
@@ -0,0 +1,48 @@
+"""
+Prompt construction and Server-Sent Events helpers shared by the chat endpoints.
+"""
+import json
+from typing import AsyncIterator, List, Optional
+
+from fastapi.responses import StreamingResponse
+
+from metrics import PROMPT_SIZE
+
+
+def build_prompt(question: str, relevant_docs: List[str]) -> str:
+    """Build the Gemini prompt from the retrieved context"""
+    context = "\n\n".join(relevant_docs)
+    prompt = f"""You are an AI assistant that answers questions based on uploaded documents. Please provide accurate, helpful answers based solely on the information provided.
+
+Document Content:
+{context}
+
+User Question: {question}
+
+Instructions:
+- Answer the question based only on the information in the documents above
+- Be specific and detailed when possible
+- If the exact information isn't available, say so clearly
+- Keep your answer concise but informative
+- Use a friendly, helpful tone
+
+Answer:"""
+    PROMPT_SIZE.observe(len(prompt))
+    return prompt
+
+
+def format_sse(data: dict, event: Optional[str] = None) -> str:
+    """Encode one Server-Sent Event with a JSON payload"""
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n{message}"
+    return message
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an iterator of encoded events in a non-buffered streaming response"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
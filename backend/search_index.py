@@ -0,0 +1,160 @@
+"""
+Incremental inverted index with BM25 scoring for the in-memory document store.
+"""
+import heapq
+import marshal
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Hashable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class InvertedIndex:
+    """Term -> postings index that is updated as documents are added and removed"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_lengths: Dict[Hashable, int] = {}
+        self.doc_terms: Dict[Hashable, Tuple[str, ...]] = {}
+        self.document_chunks: Dict[Hashable, int] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.doc_lengths
+
+    def add(self, key: Hashable, text: str):
+        """Index text under key, replacing any previous version"""
+        term_counts = Counter(tokenize(text))
+        with self._lock:
+            self._add_locked(key, term_counts)
+
+    def remove(self, key: Hashable):
+        """Drop key from every posting list it appears in"""
+        with self._lock:
+            self._remove_locked(key)
+
+    def add_document(self, doc_id: Hashable, chunks: List[str]):
+        """Index each chunk of a document under (doc_id, chunk_index)"""
+        chunk_terms = [Counter(tokenize(chunk)) for chunk in chunks]
+        # The whole document is swapped in under one lock acquisition
+        with self._lock:
+            self._remove_document_locked(doc_id)
+            for i, term_counts in enumerate(chunk_terms):
+                self._add_locked((doc_id, i), term_counts)
+            self.document_chunks[doc_id] = len(chunks)
+
+    def remove_document(self, doc_id: Hashable):
+        """Remove every chunk previously indexed for doc_id"""
+        with self._lock:
+            self._remove_document_locked(doc_id)
+
+    def clear(self):
+        """Remove every document from the index"""
+        with self._lock:
+            self.postings.clear()
+            self.doc_lengths.clear()
+            self.doc_terms.clear()
+            self.document_chunks.clear()
+            self.total_length = 0
+
+    def replace(self, other: "InvertedIndex"):
+        """Take over the contents of another index in one step"""
+        with self._lock:
+            self.postings = other.postings
+            self.doc_lengths = other.doc_lengths
+            self.doc_terms = other.doc_terms
+            self.document_chunks = other.document_chunks
+            self.total_length = other.total_length
+
+    def dump_state(self) -> bytes:
+        """Serialize the index (keys must be marshal-able, e.g. (str, int) tuples)"""
+        with self._lock:
+            return marshal.dumps((
+                self.postings, self.doc_lengths, self.doc_terms, self.document_chunks, self.total_length
+            ))
+
+    def load_state(self, data: bytes):
+        """Replace the index contents with the output of dump_state()"""
+        postings, doc_lengths, doc_terms, document_chunks, total_length = marshal.loads(data)
+        with self._lock:
+            self.postings = postings
+            self.doc_lengths = doc_lengths
+            self.doc_terms = doc_terms
+            self.document_chunks = document_chunks
+            self.total_length = total_length
+
+    def _add_locked(self, key: Hashable, term_counts: Counter):
+        self._remove_locked(key)
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[key] = count
+        length = sum(term_counts.values())
+        self.doc_lengths[key] = length
+        self.doc_terms[key] = tuple(term_counts)
+        self.total_length += length
+
+    def _remove_document_locked(self, doc_id: Hashable):
+        for i in range(self.document_chunks.pop(doc_id, 0)):
+            self._remove_locked((doc_id, i))
+
+    def _remove_locked(self, key: Hashable):
+        terms = self.doc_terms.pop(key, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(key, 0)
+
+    def search(self, query: str, limit: int = 3, min_match: float = 0.0) -> List[Tuple[float, Hashable]]:
+        """
+        Return up to `limit` (score, key) pairs ranked by BM25.
+        Only the posting lists of the query terms are visited. Documents must
+        contain more than `min_match` of the distinct query terms.
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if doc_count == 0:
+                return []
+            avg_length = self.total_length / doc_count or 1.0
+
+            scores: Dict[Hashable, float] = {}
+            matched: Dict[Hashable, int] = {}
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for key, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[key] / avg_length)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[key] = matched.get(key, 0) + 1
+
+        term_count = len(query_terms)
+        candidates = (
+            (score, key) for key, score in scores.items()
+            if matched[key] / term_count > min_match
+        )
+        return heapq.nlargest(limit, candidates, key=lambda item: item[0])
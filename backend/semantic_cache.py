@@ -0,0 +1,217 @@
+"""
+Semantic near-duplicate question cache.
+
+Questions are embedded locally as hashed word and character-trigram vectors
+(no network, no model download). Entries are only shared between questions
+whose retrieved context is identical, and a SimHash locality-sensitive index
+narrows each lookup to a handful of candidates, so lookups stay sublinear in
+the number of cached questions. Candidates are confirmed with the exact
+cosine similarity against SEMANTIC_CACHE_THRESHOLD, and must contain the same
+numbers and the same negation: "chapter 3" vs "chapter 4" or "allowed" vs
+"not allowed" change the answer while barely moving the cosine.
+"""
+import hashlib
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+from metrics import CACHE_HITS, CACHE_MISSES
+from text_processing import get_text_hash
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 1024))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.8))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+
+WORD_PATTERN = re.compile(r"\w+")
+CONTRACTED_NEGATION = re.compile(r"n't\b")
+
+# Words that flip the meaning of a question; all count as the same "not"
+NEGATION_WORDS = {'not', 'no', 'never', 'nor', 'none', 'neither', 'nothing', 'without', 'cannot'}
+
+# Question words that do not change what is being asked
+QUESTION_STOP_WORDS = {
+    'the', 'is', 'are', 'what', 'how', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'me',
+    'tell', 'about', 'explain', 'describe', 'please', 'can', 'you', 'does', 'do', 'with', 'by',
+}
+
+SIGNATURE_BITS = 64
+# Words carry the meaning; trigrams only bridge inflections and typos, and
+# weighted higher they make "advantages"/"disadvantages" look alike
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.25
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+
+
+def question_tokens(question: str) -> List[str]:
+    """Lowercased word tokens with "n't" spelled out as "not" """
+    return WORD_PATTERN.findall(CONTRACTED_NEGATION.sub(" not", question.lower()))
+
+
+def exact_tokens(tokens: List[str]) -> FrozenSet[str]:
+    """Tokens two questions must share to be answered alike: numbers and negation"""
+    return frozenset(
+        "not" if token in NEGATION_WORDS else token
+        for token in tokens if token in NEGATION_WORDS or any(char.isdigit() for char in token)
+    )
+
+
+def embed_question(question: str) -> Dict[int, float]:
+    """L2-normalized sparse vector of hashed word and character-trigram features"""
+    weights: Dict[int, float] = {}
+    for token in question_tokens(question):
+        if token in QUESTION_STOP_WORDS:
+            continue
+        # "containers" and "container" ask the same thing
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        features = [(f"w:{token}", WORD_WEIGHT)]
+        padded = f"<{token}>"
+        features.extend((f"c:{padded[i:i + 3]}", TRIGRAM_WEIGHT) for i in range(len(padded) - 2))
+        for feature, weight in features:
+            key = _feature_hash(feature)
+            weights[key] = weights.get(key, 0.0) + weight
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    if not norm:
+        return {}
+    return {key: weight / norm for key, weight in weights.items()}
+
+
+def cosine_similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """Dot product of two normalized sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(key, 0.0) for key, weight in a.items())
+
+
+def simhash(vector: Dict[int, float]) -> int:
+    """64-bit SimHash signature; similar vectors agree on most bits"""
+    totals = [0.0] * SIGNATURE_BITS
+    for key, weight in vector.items():
+        for bit in range(SIGNATURE_BITS):
+            totals[bit] += weight if (key >> bit) & 1 else -weight
+    return sum(1 << bit for bit, total in enumerate(totals) if total > 0)
+
+
+class SemanticKey(NamedTuple):
+    corpus_version: int
+    context_hash: str
+    vector: Dict[int, float]
+    bands: Tuple[int, ...]
+    exact_tokens: FrozenSet[str]
+
+
+class SemanticCache:
+    """Bounded LRU cache that matches paraphrased questions over the same context"""
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS, bands: int = 16):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.band_count = bands
+        self.band_bits = SIGNATURE_BITS // bands
+        self.corpus_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # entry id -> (key, expires_at, answer), in LRU order
+        self._entries: "OrderedDict[int, Tuple[SemanticKey, float, str]]" = OrderedDict()
+        # (context hash, band index, band value) -> entry ids
+        self._buckets: Dict[Tuple[str, int, int], Set[int]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def make_key(self, question: str, relevant_docs: List[str]) -> SemanticKey:
+        """Embed the question and fingerprint the context sent to Gemini"""
+        context_hash = get_text_hash("".join(get_text_hash(doc) for doc in relevant_docs))
+        vector = embed_question(question)
+        signature = simhash(vector)
+        mask = (1 << self.band_bits) - 1
+        bands = tuple((signature >> (i * self.band_bits)) & mask for i in range(self.band_count))
+        return SemanticKey(self.corpus_version, context_hash, vector, bands, exact_tokens(question_tokens(question)))
+
+    def _bucket_keys(self, key: SemanticKey):
+        return [(key.context_hash, i, band) for i, band in enumerate(key.bands)]
+
+    def get(self, key: SemanticKey) -> Optional[str]:
+        """Return the answer of the most similar cached question, or None"""
+        if not key.vector:
+            return None
+        with self._lock:
+            candidates: Set[int] = set()
+            for bucket_key in self._bucket_keys(key):
+                candidates.update(self._buckets.get(bucket_key, ()))
+
+            now = time.monotonic()
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                cached_key, expires_at, _ = self._entries[entry_id]
+                if expires_at < now or cached_key.exact_tokens != key.exact_tokens:
+                    continue
+                score = cosine_similarity(key.vector, cached_key.vector)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                CACHE_MISSES.labels("semantic").inc()
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            CACHE_HITS.labels("semantic").inc()
+            return self._entries[best_id][2]
+
+    def put(self, key: SemanticKey, answer: str):
+        """Store an answer unless the corpus changed since key was made"""
+        if self.max_entries <= 0 or not key.vector:
+            return
+        with self._lock:
+            if key.corpus_version != self.corpus_version:
+                return
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (key, time.monotonic() + self.ttl_seconds, answer)
+            for bucket_key in self._bucket_keys(key):
+                self._buckets.setdefault(bucket_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, (key, _, _) = self._entries.popitem(last=False)
+        for bucket_key in self._bucket_keys(key):
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[bucket_key]
+        self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry; called whenever documents are added or removed"""
+        with self._lock:
+            self.corpus_version += 1
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        """Counters reported by the /test endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+            }
+
+
+semantic_cache = SemanticCache()
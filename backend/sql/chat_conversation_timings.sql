@@ -0,0 +1,8 @@
+-- Per-stage timings for chat_conversations.
+-- Run once in the Supabase SQL editor. response_time_ms already holds the
+-- total time; conversation_logger.py stops sending these columns if they
+-- are missing.
+
+alter table chat_conversations
+    add column if not exists retrieval_ms integer,
+    add column if not exists llm_ms integer;
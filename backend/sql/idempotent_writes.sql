@@ -0,0 +1,10 @@
+-- Keys that make document writes safe to retry.
+-- Run once in the Supabase SQL editor. supabase_writer.py upserts chunk rows
+-- on (document_id, chunk_index) and gives each documents row a
+-- client-generated uuid id, so a retry after a lost response overwrites the
+-- row instead of inserting a duplicate. Without this index (or when
+-- documents.id is not a uuid column) it falls back to plain inserts that are
+-- not retried.
+
+create unique index if not exists document_chunks_document_id_chunk_index_key
+    on document_chunks (document_id, chunk_index);
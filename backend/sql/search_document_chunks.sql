@@ -0,0 +1,29 @@
+-- Server-side ranked search over document_chunks.
+-- Run once in the Supabase SQL editor. main_supabase.py calls the
+-- search_document_chunks RPC and falls back to client-side scoring
+-- when the function is not installed.
+
+alter table document_chunks
+    add column if not exists content_tsv tsvector
+    generated always as (to_tsvector('english', coalesce(content, ''))) stored;
+
+create index if not exists document_chunks_content_tsv_idx
+    on document_chunks using gin (content_tsv);
+
+-- query_text is a to_tsquery expression built by chunk_search.build_tsquery,
+-- e.g. 'cloud:* | schedul:*'
+create or replace function search_document_chunks(query_text text, match_count int default 8)
+returns table (content text, document_id text, chunk_index int, score real)
+language sql
+stable
+as $$
+    select c.content,
+           c.document_id::text,
+           c.chunk_index,
+           ts_rank(c.content_tsv, q) as score
+    from document_chunks c,
+         to_tsquery('english', query_text) q
+    where c.content_tsv @@ q
+    order by score desc, c.document_id, c.chunk_index
+    limit match_count;
+$$;
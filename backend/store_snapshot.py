@@ -0,0 +1,200 @@
+"""
+Binary snapshot of the in-memory document store for fast warm starts.
+
+Layout: MAGIC, a little-endian uint32 header length, a JSON header
+(metadata, document list, section offsets), an array of uint64 chunk end
+offsets, the UTF-8 chunk text and the serialized search index. Snapshots are
+written to a temporary file and swapped in with os.replace, so a crash never
+leaves a torn file behind; they are read back through a memory map.
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from search_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+# Where the snapshot lives; empty disables snapshots
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "documents_snapshot.bin")
+# Changes within this window are written as one snapshot
+SNAPSHOT_DELAY_SECONDS = float(os.getenv("SNAPSHOT_DELAY_SECONDS", 2.0))
+
+MAGIC = b"CHATSNP1"
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def write_snapshot(path: str, documents: Dict[str, List[str]], metadata: List[Dict[str, Any]],
+                   index_state: bytes):
+    """Write the store and the serialized index to path atomically"""
+    doc_ids = list(documents)
+    ends = array("Q")
+    text_parts = []
+    position = 0
+    for doc_id in doc_ids:
+        for chunk in documents[doc_id]:
+            encoded = chunk.encode("utf-8")
+            text_parts.append(encoded)
+            position += len(encoded)
+            ends.append(position)
+    if sys.byteorder != "little":
+        ends.byteswap()
+
+    header = json.dumps({
+        "python": list(sys.version_info[:2]),
+        "metadata": metadata,
+        "documents": [[doc_id, len(documents[doc_id])] for doc_id in doc_ids],
+        "text_length": position,
+        "index_length": len(index_state),
+    }).encode("utf-8")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        f.write(ends.tobytes())
+        f.writelines(text_parts)
+        f.write(index_state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[Tuple[Dict[str, List[str]], List[Dict[str, Any]], Optional[bytes]]]:
+    """
+    Return (documents, metadata, index_state) from a snapshot, or None if it
+    is missing or unreadable. index_state is None when it was written by a
+    different Python version (the index then has to be rebuilt).
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError("not a document snapshot")
+            position = len(MAGIC)
+            (header_length,) = _HEADER_LENGTH.unpack_from(mapped, position)
+            position += _HEADER_LENGTH.size
+            header = json.loads(mapped[position:position + header_length])
+            position += header_length
+
+            chunk_count = sum(count for _, count in header["documents"])
+            ends = array("Q", mapped[position:position + chunk_count * 8])
+            if sys.byteorder != "little":
+                ends.byteswap()
+            position += chunk_count * 8
+
+            text_start = position
+            documents = {}
+            start = 0
+            chunk_number = 0
+            for doc_id, count in header["documents"]:
+                chunks = []
+                for _ in range(count):
+                    end = ends[chunk_number]
+                    chunks.append(mapped[text_start + start:text_start + end].decode("utf-8"))
+                    start = end
+                    chunk_number += 1
+                documents[doc_id] = chunks
+            position = text_start + header["text_length"]
+
+            index_state = None
+            if tuple(header["python"]) == sys.version_info[:2]:
+                index_state = mapped[position:position + header["index_length"]]
+        return documents, header["metadata"], index_state
+    except Exception as e:
+        logger.warning("⚠️ Could not read snapshot %s: %s", path, e)
+        return None
+
+
+def load_store(path: str, documents_store: Dict[str, List[str]], documents_metadata: List[Dict[str, Any]],
+               search_index: InvertedIndex) -> bool:
+    """Fill the (empty) store, metadata list and index from a snapshot"""
+    started = time.perf_counter()
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        return False
+    documents, metadata, index_state = snapshot
+
+    index_loaded = False
+    if index_state is not None:
+        try:
+            search_index.load_state(index_state)
+            # The index is dumped after the store is captured; only trust it if they agree
+            index_loaded = search_index.document_chunks == {doc_id: len(chunks) for doc_id, chunks in documents.items()}
+        except Exception as e:
+            logger.warning("⚠️ Could not load search index from snapshot: %s", e)
+    if not index_loaded:
+        search_index.clear()
+        for doc_id, chunks in documents.items():
+            search_index.add_document(doc_id, chunks)
+
+    documents_store.update(documents)
+    documents_metadata[:] = metadata
+    elapsed = (time.perf_counter() - started) * 1000
+    chunk_count = sum(len(chunks) for chunks in documents.values())
+    logger.info("📦 Loaded snapshot: %s documents, %s chunks in %.0f ms%s",
+                len(documents), chunk_count, elapsed, "" if index_loaded else " (index rebuilt)")
+    return True
+
+
+class SnapshotWriter:
+    """Debounced background writer; call schedule() after every change to the store"""
+
+    def __init__(self, path: str, capture: Callable[[], Tuple[Dict[str, List[str]], List[Dict[str, Any]]]],
+                 search_index: InvertedIndex, delay: float = SNAPSHOT_DELAY_SECONDS):
+        self.path = path
+        self.capture = capture
+        self.search_index = search_index
+        self.delay = delay
+        self.last_written: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._write_lock = threading.Lock()
+
+    def schedule(self):
+        """Mark the store as changed; a snapshot is written after `delay` seconds"""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """Write any pending changes now (called from the app shutdown event)"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._dirty:
+            await self._write()
+
+    async def _run(self):
+        while self._dirty:
+            await asyncio.sleep(self.delay)
+            await self._write()
+
+    async def _write(self):
+        self._dirty = False
+        # Capture on the event loop so uploads cannot change the store mid-copy
+        documents, metadata = self.capture()
+        try:
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write_sync, documents, metadata)
+            self.last_written = time.time()
+            logger.info("💾 Snapshot written in %.0f ms", (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            logger.warning("⚠️ Snapshot write failed: %s", e)
+
+    def _write_sync(self, documents: Dict[str, List[str]], metadata: List[Dict[str, Any]]):
+        # A cancelled write keeps running in its thread; never let two share the temp file
+        with self._write_lock:
+            write_snapshot(self.path, documents, metadata, self.search_index.dump_state())
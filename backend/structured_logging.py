@@ -0,0 +1,217 @@
+"""
+Non-blocking structured logging for the server variants.
+
+Log calls only merge the message arguments and put the record on a bounded
+in-memory queue; a writer thread drains it every LOG_FLUSH_INTERVAL_SECONDS
+and formats and writes the records, so a slow stdout or log drain never
+stalls the event loop. When the queue is full, records are dropped and
+counted instead of blocking. Every record carries the request id of the HTTP
+request it was logged from (set by the servers' middleware from X-Request-ID
+or generated).
+
+DEBUG is reserved for high-volume lines (per-result previews, per-request
+traces) and only a LOG_DEBUG_SAMPLE_RATE fraction of them is kept.
+
+Settings: LOG_LEVEL (INFO), LOG_FORMAT ("text" or "json"),
+LOG_DEBUG_SAMPLE_RATE (0.01), LOG_QUEUE_SIZE (10000),
+LOG_FLUSH_INTERVAL_SECONDS (0.05).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 0.01))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# How often the writer thread drains the queue
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", 0.05))
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener: Optional["PollingQueueListener"] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def bind_request_id(request_id: Optional[str] = None) -> str:
+    """Set the request id of the current context (a new one if none is given) and return it"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request id of the context they were logged from"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep every record above DEBUG and a `rate` fraction of DEBUG records"""
+
+    def __init__(self, rate: float = LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self._random = random.Random()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or self._random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full and leaves the layout to the listener"""
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int = LOG_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, since they may be mutated once the call returns;
+        # the text/JSON layout and tracebacks are formatted on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class PollingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener that drains the queue every `interval` seconds instead of
+    blocking on it. Nobody waits on the queue, so a log call never has to wake
+    the writer thread (and hand it the GIL) for every record.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, *handlers, interval: float = LOG_FLUSH_INTERVAL_SECONDS):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.interval = interval
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                return self.queue.get_nowait()
+            except queue.Empty:
+                if not block:
+                    raise
+                time.sleep(self.interval)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """
+    StreamHandler that writes to whatever sys.stdout is when the record is
+    written, so redirecting or replacing stdout later does not leave it
+    writing to a closed file.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+
+class TextFormatter(logging.Formatter):
+    """time level [request id] logger: message key=value ..."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+            **extra_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT,
+                      debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE, queue_size: int = LOG_QUEUE_SIZE):
+    """Route the root logger through the background queue; later calls are no-ops"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    output = StdoutHandler()
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    _queue_handler = NonBlockingQueueHandler(queue.SimpleQueue(), queue_size)
+    _queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+    _queue_handler.addFilter(RequestIdFilter())
+
+    # Skip collecting record attributes the formatters never print (see the
+    # "Optimization" section of the logging HOWTO)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+    _listener = PollingQueueListener(_queue_handler.queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out the queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = _queue_handler = None
+
+
+def logging_stats() -> dict:
+    """Counters reported by the /test endpoint"""
+    if _queue_handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "level": logging.getLevelName(logging.getLogger().level),
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+    }
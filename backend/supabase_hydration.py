@@ -0,0 +1,181 @@
+"""
+Startup hydration of the hybrid server's in-memory store from Supabase.
+
+Off unless HYDRATE_ON_STARTUP is set, since it reads every indexed chunk.
+Indexed documents are listed with keyset pagination and, of several uploads
+with the same filename, only the newest is kept; then the chunks of up to
+HYDRATE_CONCURRENCY documents are fetched at once, each document paged by
+chunk_index. The search index is built in a worker thread and handed to the
+server in one step, so requests keep being served (from Supabase) meanwhile.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from metrics import supabase_call
+from search_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+HYDRATE_ON_STARTUP = os.getenv("HYDRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+HYDRATE_PAGE_SIZE = int(os.getenv("HYDRATE_PAGE_SIZE", 1000))
+HYDRATE_CONCURRENCY = int(os.getenv("HYDRATE_CONCURRENCY", 4))
+
+DOCUMENT_COLUMNS = "id, filename, original_filename, file_type, status, upload_date, file_size"
+
+ApplyCallback = Callable[[Dict[str, List[str]], List[Dict[str, Any]], InvertedIndex], None]
+
+
+class SupabaseHydrator:
+    """Loads document_chunks into memory in the background and reports progress"""
+
+    def __init__(self, client, page_size: int = HYDRATE_PAGE_SIZE, concurrency: int = HYDRATE_CONCURRENCY):
+        self.client = client
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.status = "idle"
+        self.documents_total = 0
+        self.documents_loaded = 0
+        self.chunks_loaded = 0
+        self.error: Optional[str] = None
+        self._started: Optional[float] = None
+        self._elapsed: Optional[float] = None
+        self._discarded: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, apply: ApplyCallback) -> Optional[asyncio.Task]:
+        """Start hydrating; apply(documents, metadata, index) runs on the event loop when done"""
+        if not self.client:
+            self.status = "disabled"
+            return None
+        self.status = "running"
+        self._started = time.perf_counter()
+        self._task = asyncio.create_task(self._run(apply))
+        return self._task
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def discard(self, filename: str):
+        """Skip a document deleted while hydration is running"""
+        if self.status == "running":
+            self._discarded.add(filename)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = self._elapsed
+        if elapsed is None and self._started is not None:
+            elapsed = time.perf_counter() - self._started
+        return {
+            "status": self.status,
+            "documents_total": self.documents_total,
+            "documents_loaded": self.documents_loaded,
+            "chunks_loaded": self.chunks_loaded,
+            "elapsed_ms": round(elapsed * 1000) if elapsed is not None else None,
+            "error": self.error,
+        }
+
+    async def _run(self, apply: ApplyCallback):
+        try:
+            documents = self._newest_per_filename(await self._fetch_documents())
+            self.documents_total = len(documents)
+            logger.info("💧 Hydrating %s documents from Supabase", len(documents))
+
+            slots = asyncio.Semaphore(self.concurrency)
+
+            async def load(document):
+                async with slots:
+                    chunks = await self._fetch_chunks(document["id"])
+                self.documents_loaded += 1
+                self.chunks_loaded += len(chunks)
+                if self.documents_loaded % 10 == 0 or self.documents_loaded == self.documents_total:
+                    logger.info("💧 Hydration progress: %s/%s documents, %s chunks",
+                                self.documents_loaded, self.documents_total, self.chunks_loaded)
+                return chunks
+
+            all_chunks = await asyncio.gather(*(load(document) for document in documents))
+
+            store = {}
+            metadata = []
+            for document, chunks in zip(documents, all_chunks):
+                if not chunks:
+                    continue
+                store[document["filename"]] = chunks
+                metadata.append({
+                    "id": document["filename"],
+                    "name": document["original_filename"],
+                    "type": document["file_type"],
+                    "status": document["status"],
+                    "dateAdded": document["upload_date"],
+                    "size": f"{(document['file_size'] or 0) / 1024:.1f} KB"
+                })
+            index = await asyncio.to_thread(self._build_index, store)
+
+            # Documents deleted meanwhile must not come back
+            for filename in self._discarded:
+                store.pop(filename, None)
+                index.remove_document(filename)
+            metadata = [doc for doc in metadata if doc["id"] in store]
+
+            apply(store, metadata, index)
+            self.status = "completed"
+            logger.info("✅ Hydrated %s documents (%s chunks) in %.1fs",
+                        len(store), self.chunks_loaded, time.perf_counter() - self._started)
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error("❌ Supabase hydration failed: %s", e)
+        finally:
+            self._elapsed = time.perf_counter() - self._started
+            self._discarded.clear()
+
+    async def _fetch_documents(self) -> List[Dict[str, Any]]:
+        """Keyset-paginate the indexed documents by id"""
+        documents = []
+        last_id = None
+        while True:
+            query = self.client.table("documents").select(DOCUMENT_COLUMNS).eq("status", "indexed")
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = (await asyncio.to_thread(supabase_call, "hydrate_documents", query.order("id").limit(self.page_size).execute)).data
+            documents.extend(page)
+            if len(page) < self.page_size:
+                return documents
+            last_id = page[-1]["id"]
+
+    @staticmethod
+    def _newest_per_filename(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the latest upload of each filename, ordered by upload_date then id"""
+        newest = {}
+        for document in sorted(documents, key=lambda doc: (doc["upload_date"] or "", str(doc["id"]))):
+            newest[document["filename"]] = document
+        return list(newest.values())
+
+    async def _fetch_chunks(self, document_id) -> List[str]:
+        """Keyset-paginate one document's chunks by chunk_index"""
+        chunks = []
+        last_index = -1
+        while True:
+            query = (
+                self.client.table("document_chunks").select("chunk_index, content")
+                .eq("document_id", document_id).gt("chunk_index", last_index)
+                .order("chunk_index").limit(self.page_size)
+            )
+            page = (await asyncio.to_thread(supabase_call, "hydrate_chunks", query.execute)).data
+            chunks.extend(row["content"] for row in page)
+            if len(page) < self.page_size:
+                return chunks
+            last_index = page[-1]["chunk_index"]
+
+    @staticmethod
+    def _build_index(store: Dict[str, List[str]]) -> InvertedIndex:
+        index = InvertedIndex()
+        for doc_id, chunks in store.items():
+            index.add_document(doc_id, chunks)
+        return index
@@ -0,0 +1,270 @@
+"""
+Pipelined, batched writes of document chunks to Supabase.
+
+The Supabase client is blocking, so every request runs in a worker thread.
+Chunk rows are grouped into batches bounded by row count and payload size,
+up to SUPABASE_WRITE_CONCURRENCY batches are in flight at once, and failed
+requests are retried with exponential backoff.
+
+Only idempotent requests are retried: the document row gets a client-generated
+id, chunk rows are upserted on (document_id, chunk_index) and the storage
+upload is an upsert, so a retry after a lost response overwrites instead of
+duplicating or failing. Without the schema this needs
+(sql/idempotent_writes.sql) the writer falls back to plain inserts, which
+are sent once.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
+
+from ingestion_jobs import IngestionJob, track_stage
+from metrics import ERRORS, supabase_call
+from text_processing import get_text_hash
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for one document_chunks insert request
+SUPABASE_BATCH_ROWS = int(os.getenv("SUPABASE_BATCH_ROWS", 200))
+SUPABASE_BATCH_BYTES = int(os.getenv("SUPABASE_BATCH_BYTES", 512 * 1024))
+# Chunk batches sent concurrently per document
+SUPABASE_WRITE_CONCURRENCY = int(os.getenv("SUPABASE_WRITE_CONCURRENCY", 2))
+# Attempts per request and the initial backoff between them
+SUPABASE_WRITE_ATTEMPTS = int(os.getenv("SUPABASE_WRITE_ATTEMPTS", 3))
+SUPABASE_RETRY_BACKOFF_SECONDS = float(os.getenv("SUPABASE_RETRY_BACKOFF_SECONDS", 0.5))
+
+# Errors Postgres reports when the schema does not support the idempotent writes
+MISSING_CONSTRAINT_MARKERS = ("42P10", "no unique or exclusion constraint")
+INVALID_ID_MARKERS = ("22P02", "invalid input syntax for type")
+
+# Cleared on the first error above; later writes go straight to plain inserts
+chunk_upserts_available = True
+client_document_ids_available = True
+
+
+def _has_marker(error: Exception, markers) -> bool:
+    message = str(error)
+    return any(marker in message for marker in markers)
+
+
+async def run_with_retries(func: Callable[..., Any], *args, attempts: int = SUPABASE_WRITE_ATTEMPTS,
+                           backoff: float = SUPABASE_RETRY_BACKOFF_SECONDS, description: str = "Supabase request",
+                           operation: str = "write", retry_if: Optional[Callable[[Exception], bool]] = None):
+    """
+    Run a blocking Supabase call in a thread, retrying failures with
+    exponential backoff. `func` must be idempotent; `retry_if` can veto
+    retrying a particular error.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await asyncio.to_thread(supabase_call, operation, func, *args)
+        except Exception as e:
+            ERRORS.labels("supabase").inc()
+            if attempt == attempts or (retry_if is not None and not retry_if(e)):
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            logger.warning("⚠️ %s failed (attempt %s/%s): %s; retrying in %.1fs", description, attempt, attempts, e, delay)
+            await asyncio.sleep(delay)
+
+
+class ChunkWriter:
+    """Buffers document_chunks rows and inserts them in bounded, concurrent batches"""
+
+    def __init__(self, client, max_rows: int = SUPABASE_BATCH_ROWS, max_bytes: int = SUPABASE_BATCH_BYTES,
+                 concurrency: int = SUPABASE_WRITE_CONCURRENCY,
+                 on_progress: Optional[Callable[[int], None]] = None):
+        self.client = client
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.on_progress = on_progress
+        self.rows_written = 0
+        self.batches = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._batch_bytes = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+
+    async def add(self, row: Dict[str, Any]):
+        """Queue one row; waits only when the maximum number of batches is in flight"""
+        row_bytes = len(row.get("content", "")) + 200
+        if self._batch and (len(self._batch) >= self.max_rows or self._batch_bytes + row_bytes > self.max_bytes):
+            await self._flush()
+        self._batch.append(row)
+        self._batch_bytes += row_bytes
+
+    async def finish(self):
+        """Send the last batch and wait for every batch; raises if any batch failed"""
+        if self._batch:
+            await self._flush()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            self._finished = time.perf_counter()
+
+    async def abort(self):
+        """Cancel batches that have not been sent yet"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    async def _flush(self):
+        batch = self._batch
+        self._batch = []
+        self._batch_bytes = 0
+        await self._slots.acquire()
+        # Surface a failed batch as soon as possible instead of after the whole document
+        for task in self._tasks:
+            if task.done() and task.exception():
+                self._slots.release()
+                raise task.exception()
+        self._tasks.append(asyncio.create_task(self._insert(batch)))
+
+    def _send(self, batch: List[Dict[str, Any]]):
+        global chunk_upserts_available
+        if chunk_upserts_available:
+            try:
+                return self.client.table("document_chunks").upsert(
+                    batch, on_conflict="document_id,chunk_index"
+                ).execute()
+            except Exception as e:
+                if not _has_marker(e, MISSING_CONSTRAINT_MARKERS):
+                    raise
+                # Migration not applied yet: keep storing chunks, without retries
+                logger.warning("⚠️ document_chunks has no unique (document_id, chunk_index), "
+                               "run sql/idempotent_writes.sql; chunk inserts are no longer retried")
+                chunk_upserts_available = False
+        return self.client.table("document_chunks").insert(batch).execute()
+
+    async def _insert(self, batch: List[Dict[str, Any]]):
+        try:
+            await run_with_retries(
+                self._send, batch, description=f"Chunk batch write ({len(batch)} rows)", operation="chunk_insert",
+                retry_if=lambda e: chunk_upserts_available
+            )
+            self.rows_written += len(batch)
+            self.batches += 1
+            if self.on_progress:
+                self.on_progress(self.rows_written)
+        finally:
+            self._slots.release()
+
+
+async def _iterate(chunks: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+def _insert_document(client, document_data: Dict[str, Any]):
+    global client_document_ids_available
+    if client_document_ids_available:
+        try:
+            return client.table("documents").upsert(document_data, on_conflict="id").execute()
+        except Exception as e:
+            if not _has_marker(e, INVALID_ID_MARKERS):
+                raise
+            logger.warning("⚠️ documents.id is not a uuid, see sql/idempotent_writes.sql; "
+                           "document inserts are no longer retried")
+            client_document_ids_available = False
+    return client.table("documents").insert({k: v for k, v in document_data.items() if k != "id"}).execute()
+
+
+async def _upload_file(client, storage_path: str, local_path: str, job: Optional[IngestionJob]):
+    with track_stage(job, "storage_upload"):
+        # upsert makes a retry after a lost response overwrite the object instead of failing with 409
+        return await run_with_retries(
+            client.storage.from_("documents").upload, storage_path, local_path, {"upsert": "true"},
+            description="Storage upload", operation="storage_upload"
+        )
+
+
+async def write_document(client, local_path: str, document_data: Dict[str, Any],
+                         chunks: Union[Iterable[str], AsyncIterable[str]],
+                         job: Optional[IngestionJob] = None) -> Any:
+    """
+    Store one document in Supabase and return its id.
+
+    The file is uploaded to storage while the documents row and the chunk
+    batches are inserted. The status is set to "indexed" only after every
+    write has succeeded; if any write fails it is set to "error" and the
+    exception is re-raised.
+    """
+    storage_task = asyncio.create_task(_upload_file(client, document_data["storage_path"], local_path, job))
+    document_id = None
+    writer = None
+    try:
+        with track_stage(job, "document_insert"):
+            # The id is generated once, so every retry upserts the same row
+            if client_document_ids_available:
+                document_data = {"id": str(uuid.uuid4()), **document_data}
+            doc_result = await run_with_retries(
+                _insert_document, client, document_data, description="Document insert", operation="document_insert",
+                retry_if=lambda e: client_document_ids_available
+            )
+        document_id = doc_result.data[0]["id"]
+        if job:
+            job.document_id = document_id
+
+        def report(rows_written: int):
+            if job:
+                job.progress["chunks_written"] = rows_written
+
+        writer = ChunkWriter(client, on_progress=report)
+        chunk_count = 0
+        async for chunk in _iterate(chunks):
+            row = {
+                "document_id": document_id,
+                "chunk_index": chunk_count,
+                "content": chunk,
+                "content_length": len(chunk),
+                "chunk_hash": get_text_hash(chunk)
+            }
+            chunk_count += 1
+            with track_stage(job, "chunk_insert"):
+                await writer.add(row)
+        with track_stage(job, "chunk_insert"):
+            await writer.finish()
+        logger.info("✅ Chunks inserted: %s chunks in %s batches (%.0f rows/s)",
+                    chunk_count, writer.batches, writer.rows_per_second)
+        if job:
+            job.progress["chunks_total"] = chunk_count
+            job.progress["rows_per_second"] = round(writer.rows_per_second)
+
+        await storage_task
+
+        with track_stage(job, "status_update"):
+            await run_with_retries(
+                client.table("documents").update({
+                    "status": "indexed",
+                    "processed_date": datetime.now().isoformat()
+                }).eq("id", document_id).execute,
+                description="Status update", operation="status_update"
+            )
+        return document_id
+
+    except Exception:
+        if writer:
+            await writer.abort()
+        await asyncio.gather(storage_task, return_exceptions=True)
+        if document_id is not None:
+            try:
+                await run_with_retries(
+                    client.table("documents").update({"status": "error"}).eq("id", document_id).execute,
+                    description="Status update", operation="status_update"
+                )
+            except Exception as e:
+                logger.warning("⚠️ Could not mark document %s as failed: %s", document_id, e)
+        raise
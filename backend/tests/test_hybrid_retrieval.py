@@ -0,0 +1,72 @@
+"""
+Hybrid retrieval must give context to a question matched by either leg:
+a purely semantic match (no shared terms, so no BM25 hit) still returns
+the vector leg's chunks, while vector hits below the score floor and
+failed legs are left out.
+"""
+import asyncio
+
+import numpy as np
+
+from hybrid_retrieval import HybridRetriever, RetrieverLeg
+from search_index import InvertedIndex, tokenize
+from vector_index import VectorIndex
+
+CHUNKS = [
+    "Automobile maintenance",
+    "Photosynthesis in leaves",
+]
+
+# Words that mean the same thing share a dimension, as with a real model
+CONCEPTS = {"car": 0, "automobile": 0, "vehicle": 0, "plant": 1, "photosynthesis": 1, "weather": 2}
+
+
+def concept_embedder(texts):
+    vectors = np.zeros((len(texts), len(CONCEPTS) + 1), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            vectors[row, CONCEPTS.get(token, len(CONCEPTS))] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def make_retriever(min_score=0.3):
+    search_index = InvertedIndex()
+    search_index.add_document("doc", CHUNKS)
+    vector_index = VectorIndex(embedder=concept_embedder)
+    vector_index.add_document("doc", CHUNKS)
+
+    def texts(results):
+        return [CHUNKS[chunk_index] for _, (_, chunk_index) in results]
+
+    return HybridRetriever([
+        RetrieverLeg("bm25", lambda query, limit: texts(search_index.search(query, limit, min_match=0.5)), 1.0),
+        RetrieverLeg("vector", lambda query, limit: texts(vector_index.search(query, limit, min_score=min_score)), 1.0),
+    ])
+
+
+def test_vector_only_match_returns_context():
+    # "car" is not a term of any chunk, so only the vector leg matches
+    assert asyncio.run(make_retriever().retrieve("car", limit=1)) == [CHUNKS[0]]
+
+
+def test_lexical_match_returns_context():
+    assert asyncio.run(make_retriever().retrieve("maintenance", limit=1)) == [CHUNKS[0]]
+
+
+def test_vector_hits_below_floor_give_no_context():
+    # "weather" shares no terms and no concept with any chunk
+    assert asyncio.run(make_retriever().retrieve("weather", limit=3)) == []
+
+
+def test_failed_leg_is_left_out():
+    def broken(query, limit):
+        raise RuntimeError("index unavailable")
+
+    retriever = HybridRetriever([
+        RetrieverLeg("bm25", broken, 1.0),
+        RetrieverLeg("vector", lambda query, limit: ["chunk"], 1.0),
+    ])
+    assert asyncio.run(retriever.retrieve("question")) == ["chunk"]
+    assert retriever.stats()["bm25"]["errors"] == 1
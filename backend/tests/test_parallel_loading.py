@@ -0,0 +1,76 @@
+"""
+Parallel loading must yield sources in input order whatever order they
+finish in, fail only the source whose loader raised, and survive a parser
+that kills its worker process. Stub loaders stand in for the LangChain ones.
+"""
+import os
+import time
+
+from ingest_manifest import file_sources
+from parallel_loading import Source, load_sources
+
+
+class StubLoader:
+    """Loader class whose behaviour is set by the file's content"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def load(self):
+        with open(self.file_path, encoding="utf-8") as f:
+            content = f.read()
+        if content == "fail":
+            raise ValueError(f"cannot parse {os.path.basename(self.file_path)}")
+        if content == "crash":
+            os._exit(1)  # like a parser segfaulting in its worker
+        delay, _, text = content.partition(":")
+        time.sleep(float(delay))
+        return [text]
+
+
+def write_files(directory, contents):
+    for filename, content in contents.items():
+        (directory / filename).write_text(content, encoding="utf-8")
+    return file_sources(str(directory), {".txt": StubLoader}, fingerprint=False)
+
+
+def outcomes(results):
+    return [(source.key, documents, type(error).__name__ if error else None) for source, documents, error in results]
+
+
+def test_results_keep_input_order(tmp_path):
+    # Earlier files take longer, so they finish last
+    sources = write_files(tmp_path, {"a.txt": "0.3:a", "b.txt": "0.2:b", "c.txt": "0.1:c", "d.txt": "0:d"})
+    results = load_sources(sources, process_workers=0, thread_workers=4)
+    assert outcomes(results) == [
+        ("a.txt", ["a"], None), ("b.txt", ["b"], None), ("c.txt", ["c"], None), ("d.txt", ["d"], None),
+    ]
+
+
+def test_failing_source_fails_alone(tmp_path):
+    sources = write_files(tmp_path, {"a.txt": "0:a", "b.txt": "fail", "c.txt": "0:c"})
+    results = load_sources(sources, process_workers=0, thread_workers=2)
+    assert outcomes(results) == [("a.txt", ["a"], None), ("b.txt", [], "ValueError"), ("c.txt", ["c"], None)]
+
+
+def test_io_bound_fetch_errors_are_isolated():
+    def fetch(url):
+        if "broken" in url:
+            raise ConnectionError(url)
+        return [f"transcript of {url}"]
+
+    urls = ["https://example.com/1", "https://example.com/broken", "https://example.com/3"]
+    sources = [Source(url, url, fetch, (url,), io_bound=True) for url in urls]
+    assert outcomes(load_sources(sources, thread_workers=3)) == [
+        (urls[0], [f"transcript of {urls[0]}"], None),
+        (urls[1], [], "ConnectionError"),
+        (urls[2], [f"transcript of {urls[2]}"], None),
+    ]
+
+
+def test_killed_worker_fails_only_its_source(tmp_path):
+    sources = write_files(tmp_path, {"a.txt": "0.2:a", "b.txt": "crash", "c.txt": "0.2:c", "d.txt": "0:d"})
+    results = load_sources(sources, process_workers=2, thread_workers=1)
+    assert outcomes(results) == [
+        ("a.txt", ["a"], None), ("b.txt", [], "BrokenProcessPool"), ("c.txt", ["c"], None), ("d.txt", ["d"], None),
+    ]
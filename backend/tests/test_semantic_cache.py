@@ -0,0 +1,54 @@
+"""
+The semantic answer cache must reuse answers across rephrasings of a
+question but never serve the answer of a different question: near-miss
+pairs over the same context must not hit.
+"""
+import pytest
+
+from semantic_cache import SemanticCache
+
+CONTEXT = ["Chapter 3 was written by Alice and chapter 4 by Bob. X is allowed on weekdays."]
+
+# Similar wording, different answer
+NEAR_MISS_PAIRS = [
+    ("who wrote chapter 3", "who wrote chapter 4"),
+    ("is X allowed", "is X not allowed"),
+    ("is X allowed", "isn't X allowed"),
+    ("What changed in 2021?", "What changed in 2022?"),
+    ("advantages of cloud computing", "disadvantages of cloud computing"),
+    ("what is supervised learning", "what is unsupervised learning"),
+    ("what is a public cloud", "what is a private cloud"),
+]
+
+# Same question, different wording
+PARAPHRASE_PAIRS = [
+    ("what is cloud scheduling", "explain cloud computing scheduling"),
+    ("What is cloud scheduling?", "Explain cloud scheduling"),
+    ("What are the benefits of containers?", "What are the benefits of using containers?"),
+    ("how do containers work", "how does a container work"),
+    ("Who wrote chapter 3?", "Tell me who wrote chapter 3"),
+    ("Is X not allowed?", "Can you tell me: is X not allowed?"),
+]
+
+
+def cached_answer(cached_question, question):
+    cache = SemanticCache()
+    cache.put(cache.make_key(cached_question, CONTEXT), f"answer to: {cached_question}")
+    return cache.get(cache.make_key(question, CONTEXT))
+
+
+@pytest.mark.parametrize("first, second", NEAR_MISS_PAIRS)
+def test_near_misses_do_not_hit(first, second):
+    assert cached_answer(first, second) is None
+    assert cached_answer(second, first) is None
+
+
+@pytest.mark.parametrize("first, second", PARAPHRASE_PAIRS)
+def test_paraphrases_hit(first, second):
+    assert cached_answer(first, second) == f"answer to: {first}"
+
+
+def test_different_context_does_not_hit():
+    cache = SemanticCache()
+    cache.put(cache.make_key("what is cloud scheduling", CONTEXT), "answer")
+    assert cache.get(cache.make_key("what is cloud scheduling", ["another chunk"])) is None
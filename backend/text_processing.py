@@ -0,0 +1,68 @@
+"""
+Text helpers shared by the API servers.
+"""
+import hashlib
+from typing import List
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
+    """Split text into overlapping chunks"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        chunks.append(chunk)
+        start = end - overlap
+    return chunks
+
+
+class StreamingChunker:
+    """
+    Incremental chunk_text over text that arrives in pieces (e.g. PDF pages).
+    Produces the same chunks as chunk_text(separator.join(pieces).strip())
+    while only buffering about one chunk of text.
+    """
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 100, separator: str = "\n"):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.separator = separator
+        self._buffer = ""
+        self._started = False
+        self._first_piece = True
+
+    def feed(self, piece: str) -> List[str]:
+        """Add the next piece of text and return the chunks that are now complete"""
+        if not self._first_piece:
+            piece = self.separator + piece
+        self._first_piece = False
+        if not self._started:
+            # Leading whitespace of the whole text is stripped
+            piece = piece.lstrip()
+            if not piece:
+                return []
+            self._started = True
+        self._buffer += piece
+
+        # A chunk is final once non-whitespace text reaches its end; trailing
+        # whitespace may still be stripped at the end of the document
+        chunks = []
+        start = 0
+        available = len(self._buffer.rstrip())
+        while available >= start + self.chunk_size:
+            chunks.append(self._buffer[start:start + self.chunk_size])
+            start += self.chunk_size - self.overlap
+        self._buffer = self._buffer[start:]
+        return chunks
+
+    def finish(self) -> List[str]:
+        """Return the remaining chunks once every piece has been fed"""
+        chunks = chunk_text(self._buffer.rstrip(), self.chunk_size, self.overlap)
+        self._buffer = ""
+        return chunks
+
+
+def get_text_hash(text: str) -> str:
+    """Generate a hash for text content"""
+    return hashlib.sha256(text.encode()).hexdigest()
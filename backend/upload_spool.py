@@ -0,0 +1,50 @@
+"""
+Spool uploaded files to temporary files on disk.
+
+Uploads are copied in fixed-size blocks, so a large PDF never has to be held
+in memory; extraction then reads the temporary file through a memory map.
+"""
+import asyncio
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import UploadFile
+
+# Directory for spooled uploads (defaults to the system temp directory)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+# Bytes copied from the request per read
+UPLOAD_READ_BYTES = int(os.getenv("UPLOAD_READ_BYTES", 1024 * 1024))
+
+
+class SpooledUpload:
+    """An uploaded file that lives in a temporary file until cleanup()"""
+
+    def __init__(self, filename: str, path: str, size: int):
+        self.filename = filename
+        self.path = path
+        self.size = size
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_upload(file: UploadFile, spool_dir: Optional[str] = UPLOAD_SPOOL_DIR) -> SpooledUpload:
+    """Copy an upload to a temporary file block by block"""
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=".pdf", dir=spool_dir)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(UPLOAD_READ_BYTES)
+                if not block:
+                    break
+                await asyncio.to_thread(out.write, block)
+                size += len(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(file.filename, path, size)
@@ -0,0 +1,490 @@
+"""
+In-process vector index for the in-memory document store.
+
+Chunks are embedded with a local hashed bag-of-words embedder (unigrams and
+bigrams signed-hashed into VECTOR_DIM buckets; no model download) unless
+VECTOR_EMBEDDING_MODEL names a sentence-transformers model that is
+installed. Vectors are L2-normalized rows of a float32 matrix, or int8 rows
+with a per-row scale when VECTOR_QUANTIZE=int8, optionally backed by a
+memory-mapped file at VECTOR_INDEX_PATH.
+
+Small indexes are searched exactly with blocked matrix products. Once an
+index holds VECTOR_IVF_THRESHOLD vectors an IVF (inverted file) layer is
+trained with spherical k-means and a query only scores the rows of its
+VECTOR_IVF_NPROBE nearest lists. Adds and deletes are incremental; deleted
+rows are reused and the IVF layer is retrained as the index grows.
+Training runs in a background thread on a snapshot of the vectors, so adds,
+deletes and searches never wait for it: until the new layer is swapped in,
+searches keep using the previous one (or exact search).
+
+NumPy is optional: without it NUMPY_AVAILABLE is False and the servers
+fall back to keyword search only.
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", 256))
+# "float32" or "int8" (4x smaller, slightly less precise)
+VECTOR_QUANTIZE = os.getenv("VECTOR_QUANTIZE", "float32")
+# Backing file for the vector matrix; empty keeps it in anonymous memory
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "")
+# Optional sentence-transformers model instead of the hashed embedder
+VECTOR_EMBEDDING_MODEL = os.getenv("VECTOR_EMBEDDING_MODEL", "")
+# Vector count from which searches go through the IVF layer
+VECTOR_IVF_THRESHOLD = int(os.getenv("VECTOR_IVF_THRESHOLD", 50000))
+# IVF lists scored per query (see benchmarks/bench_vector_index.py for the recall trade-off)
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", 32))
+# Cosine below which a chunk is not returned by the servers' vector search,
+# so off-topic questions get no vector context. Unrelated top chunks score
+# up to about 0.2 with hashed embeddings and 0.3 with sentence-transformers
+VECTOR_MIN_SIMILARITY = float(os.getenv("VECTOR_MIN_SIMILARITY", 0.3 if VECTOR_EMBEDDING_MODEL else 0.2))
+# Rows scored per matrix product in exact search
+VECTOR_SEARCH_BLOCK = int(os.getenv("VECTOR_SEARCH_BLOCK", 32768))
+
+Embedder = Callable[[Sequence[str]], "np.ndarray"]
+
+
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams and bigrams with log term frequency"""
+
+    def __init__(self, dim: int = VECTOR_DIM, cache_size: int = 200000):
+        self.dim = dim
+        self.cache_size = cache_size
+        self._features: Dict[str, Tuple[int, float]] = {}
+
+    def _feature(self, feature: str) -> Tuple[int, float]:
+        hashed = self._features.get(feature)
+        if hashed is None:
+            value = zlib.crc32(feature.encode("utf-8"))
+            hashed = (value % self.dim, 1.0 if value & 0x80000000 else -1.0)
+            if len(self._features) < self.cache_size:
+                self._features[feature] = hashed
+        return hashed
+
+    def __call__(self, texts: Sequence[str]) -> "np.ndarray":
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            counts = Counter(tokens)
+            counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+            for feature, count in counts.items():
+                column, sign = self._feature(feature)
+                rows.append(row)
+                columns.append(column)
+                values.append(sign * (1.0 + math.log(count)))
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)),
+                  np.asarray(values, dtype=np.float32))
+        return normalize(matrix)
+
+
+def sentence_transformer_embedder(model_name: str) -> Optional[Embedder]:
+    """Embedder backed by a local sentence-transformers model, if installed"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("✗ sentence-transformers not installed; using hashed embeddings instead of %s", model_name)
+        return None
+    model = SentenceTransformer(model_name)
+    return lambda texts: normalize(np.asarray(model.encode(list(texts)), dtype=np.float32))
+
+
+def normalize(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def default_embedder() -> Embedder:
+    embedder = sentence_transformer_embedder(VECTOR_EMBEDDING_MODEL) if VECTOR_EMBEDDING_MODEL else None
+    return embedder or HashingEmbedder(VECTOR_DIM)
+
+
+class VectorIndex:
+    """Chunk vectors keyed by (doc_id, chunk_index), updated as documents are added and removed"""
+
+    def __init__(self, embedder: Optional[Embedder] = None, quantize: str = VECTOR_QUANTIZE,
+                 path: str = VECTOR_INDEX_PATH, ivf_threshold: int = VECTOR_IVF_THRESHOLD,
+                 nprobe: int = VECTOR_IVF_NPROBE, initial_capacity: int = 1024):
+        self.embedder = embedder or default_embedder()
+        self.quantized = quantize == "int8"
+        self.path = path
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.dim: Optional[int] = None
+        self._initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._capacity = 0
+        self._size = 0  # rows ever used (high-water mark)
+        self._matrix = None
+        self._scales = None
+        self._alive = None
+        self._keys: List[Optional[Tuple[Hashable, int]]] = []
+        self._free: List[int] = []
+        self.document_chunks: Dict[Hashable, List[int]] = {}
+        self._count = 0
+        self._reset_ivf()
+
+    def _reset_ivf(self):
+        self._centroids = None
+        self._mean = None
+        self._assignment = None
+        self._lists: List[Set[int]] = []
+        self._list_arrays: Dict[int, "np.ndarray"] = {}
+        self._trained_count = 0
+        # Background training thread, and rows written since it took its snapshot
+        self._training: Optional[threading.Thread] = None
+        self._changed_rows: Optional[Set[int]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.document_chunks
+
+    # --- Updates ---
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        """Embed texts without touching the index (safe to call from worker threads)"""
+        return np.asarray(self.embedder(texts), dtype=np.float32)
+
+    def add_document(self, doc_id: Hashable, chunks: List[str]):
+        """Embed and index each chunk of a document, replacing any previous version"""
+        self.add_vectors(doc_id, self.embed(chunks))
+
+    def add_vectors(self, doc_id: Hashable, vectors: "np.ndarray"):
+        """Index precomputed chunk vectors (from embed) for a document"""
+        with self._lock:
+            self._remove_document_locked(doc_id)
+            if not len(vectors):
+                return
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            rows = self._allocate(len(vectors))
+            self._write_rows(rows, vectors)
+            for i, row in enumerate(rows):
+                self._keys[row] = (doc_id, i)
+            self._alive[rows] = True
+            self.document_chunks[doc_id] = rows
+            self._count += len(rows)
+            if self._changed_rows is not None:
+                self._changed_rows.update(rows)
+            if self._centroids is not None:
+                self._assign_rows(np.asarray(rows))
+            self._maybe_train()
+
+    def remove_document(self, doc_id: Hashable):
+        """Remove every chunk vector of doc_id"""
+        with self._lock:
+            self._remove_document_locked(doc_id)
+            self._maybe_train()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def replace(self, other: "VectorIndex"):
+        """Take over the contents of another index in one step"""
+        with self._lock, other._lock:
+            self.__dict__.update({k: v for k, v in other.__dict__.items() if k != "_lock"})
+            # A training thread still running on `other` swaps its result into `other` only
+            if self._training is not None:
+                self._training = self._changed_rows = None
+            self._maybe_train()
+
+    def wait_for_training(self):
+        """Block until no background IVF training is in flight (for scripts and benchmarks)"""
+        while True:
+            with self._lock:
+                thread = self._training
+            if thread is None:
+                return
+            thread.join()
+
+    def _remove_document_locked(self, doc_id: Hashable):
+        rows = self.document_chunks.pop(doc_id, None)
+        if not rows:
+            return
+        self._alive[rows] = False
+        for row in rows:
+            self._keys[row] = None
+            if self._assignment is not None:
+                list_id = int(self._assignment[row])
+                self._lists[list_id].discard(row)
+                self._list_arrays.pop(list_id, None)
+                self._assignment[row] = -1
+        self._free.extend(rows)
+        self._count -= len(rows)
+
+    def _allocate(self, count: int) -> List[int]:
+        reused = self._free[-count:] if count <= len(self._free) else list(self._free)
+        del self._free[len(self._free) - len(reused):]
+        needed = count - len(reused)
+        if self._size + needed > self._capacity:
+            self._grow(max(self._size + needed, 2 * self._capacity, self._initial_capacity))
+        fresh = list(range(self._size, self._size + needed))
+        self._size += needed
+        self._keys.extend([None] * needed)
+        return reused + fresh
+
+    def _grow(self, capacity: int):
+        dtype = np.int8 if self.quantized else np.float32
+        if self.path:
+            # Extend the backing file and map it again; existing rows stay in place
+            if self._matrix is not None:
+                self._matrix.flush()
+            mode = "r+" if self._matrix is not None else "w+"
+            with open(self.path, "ab" if mode == "r+" else "wb") as f:
+                f.truncate(capacity * self.dim * np.dtype(dtype).itemsize)
+            matrix = np.memmap(self.path, dtype=dtype, mode="r+", shape=(capacity, self.dim))
+        else:
+            matrix = np.zeros((capacity, self.dim), dtype=dtype)
+            if self._matrix is not None:
+                matrix[:self._capacity] = self._matrix[:self._capacity]
+        self._matrix = matrix
+        self._scales = self._extend(self._scales, capacity, np.float32)
+        self._alive = self._extend(self._alive, capacity, bool)
+        if self._assignment is not None:
+            self._assignment = self._extend(self._assignment, capacity, np.int32, fill=-1)
+        self._capacity = capacity
+
+    def _extend(self, array, capacity: int, dtype, fill=0):
+        extended = np.full(capacity, fill, dtype=dtype)
+        if array is not None:
+            extended[:len(array)] = array
+        return extended
+
+    def _write_rows(self, rows: List[int], vectors: "np.ndarray"):
+        if self.quantized:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._matrix[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._matrix[rows] = vectors
+            self._scales[rows] = 1.0
+
+    def _rows_as_float(self, rows) -> "np.ndarray":
+        return _as_float(self._matrix, self._scales if self.quantized else None, rows)
+
+    # --- IVF layer ---
+
+    def _maybe_train(self):
+        if not self._count or self._count < self.ivf_threshold:
+            if self._centroids is not None or self._training is not None:
+                self._reset_ivf()
+            return
+        if self._training is not None:
+            return
+        # Retrain when the index has doubled (or halved) since the last training
+        if self._centroids is None or not self._trained_count / 2 <= self._count <= 2 * self._trained_count:
+            self._start_training()
+
+    def _start_training(self, seed: int = 0):
+        """Snapshot the vectors k-means needs and train on them in a background thread"""
+        rng = np.random.default_rng(seed)
+        alive_rows = np.flatnonzero(self._alive[:self._size])
+        list_count = max(8, int(2 * math.sqrt(len(alive_rows))))
+        sample = rng.choice(alive_rows, size=min(len(alive_rows), 64 * list_count), replace=False)
+        # Fancy indexing copies the sample; the full matrix is only read for
+        # the final list assignment, and rows rewritten meanwhile are
+        # assigned again when the result is swapped in
+        snapshot = (alive_rows, self._rows_as_float(np.sort(sample)), self._matrix,
+                    self._scales if self.quantized else None)
+        self._changed_rows = set()
+        self._training = threading.Thread(
+            target=self._train, args=(*snapshot, list_count, rng), name="vector-ivf-training", daemon=True
+        )
+        self._training.start()
+
+    def _train(self, alive_rows: "np.ndarray", vectors: "np.ndarray", matrix: "np.ndarray",
+               scales: Optional["np.ndarray"], list_count: int, rng, iterations: int = 8):
+        try:
+            # Scores only rank rows, and q.x - q.mean is the same shift for every
+            # row, so lists are built from centered vectors; otherwise the
+            # component shared by all chunks (common words) dominates clustering
+            mean = vectors.mean(axis=0)
+            vectors = normalize(vectors - mean)
+            list_count = min(list_count, len(vectors))
+            centroids = vectors[rng.choice(len(vectors), size=list_count, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(vectors @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, vectors)
+                counts = np.bincount(labels, minlength=list_count)
+                empty = counts == 0
+                # Re-seed empty lists with random sample vectors
+                sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+                centroids = normalize(sums)
+            labels = np.concatenate([np.zeros(0, dtype=np.intp)] + [
+                np.argmax((_as_float(matrix, scales, alive_rows[start:start + VECTOR_SEARCH_BLOCK]) - mean)
+                          @ centroids.T, axis=1)
+                for start in range(0, len(alive_rows), VECTOR_SEARCH_BLOCK)
+            ])
+        except Exception:
+            logger.exception("✗ Vector index IVF training failed")
+            with self._lock:
+                if self._training is threading.current_thread():
+                    self._training = self._changed_rows = None
+            return
+
+        with self._lock:
+            # Superseded by clear(), replace() or the index shrinking below the threshold
+            if self._training is not threading.current_thread():
+                return
+            changed = self._changed_rows
+            self._training = self._changed_rows = None
+            self._centroids = centroids
+            self._mean = mean
+            self._assignment = np.full(self._capacity, -1, dtype=np.int32)
+            self._lists = [set() for _ in range(list_count)]
+            self._list_arrays = {}
+            unchanged = self._alive[alive_rows] & ~np.isin(alive_rows, np.fromiter(changed, dtype=np.intp))
+            rows, labels = alive_rows[unchanged], labels[unchanged]
+            self._assignment[rows] = labels
+            for row, label in zip(rows.tolist(), labels.tolist()):
+                self._lists[label].add(row)
+            self._assign_rows(np.asarray(sorted(row for row in changed if self._alive[row]), dtype=np.intp))
+            # Size of the snapshot, so growth during training still triggers a retrain
+            self._trained_count = len(alive_rows)
+            self._maybe_train()
+
+    def _assign_rows(self, rows: "np.ndarray"):
+        for start in range(0, len(rows), VECTOR_SEARCH_BLOCK):
+            block = rows[start:start + VECTOR_SEARCH_BLOCK]
+            labels = np.argmax((self._rows_as_float(block) - self._mean) @ self._centroids.T, axis=1)
+            self._assignment[block] = labels
+            for row, label in zip(block.tolist(), labels.tolist()):
+                self._lists[label].add(row)
+                self._list_arrays.pop(label, None)
+
+    def _list_rows(self, list_id: int) -> "np.ndarray":
+        rows = self._list_arrays.get(list_id)
+        if rows is None:
+            rows = np.fromiter(self._lists[list_id], dtype=np.intp, count=len(self._lists[list_id]))
+            rows.sort()
+            self._list_arrays[list_id] = rows
+        return rows
+
+    # --- Search ---
+
+    def search(self, query: str, limit: int = 3, min_score: float = 0.0,
+               exact: bool = False) -> List[Tuple[float, Tuple[Hashable, int]]]:
+        """Return up to `limit` (cosine score, (doc_id, chunk_index)) pairs above min_score"""
+        return self.search_batch([query], limit, min_score, exact)[0]
+
+    def search_batch(self, queries: Sequence[str], limit: int = 3, min_score: float = 0.0,
+                     exact: bool = False) -> List[List[Tuple[float, Tuple[Hashable, int]]]]:
+        """search() for several queries with one embedding call and shared matrix products"""
+        if not queries or not self._count:
+            return [[] for _ in queries]
+        return self.search_vectors(self.embed(queries), limit, min_score, exact)
+
+    def search_vectors(self, query_vectors: "np.ndarray", limit: int = 3, min_score: float = 0.0,
+                       exact: bool = False) -> List[List[Tuple[float, Tuple[Hashable, int]]]]:
+        with self._lock:
+            if not self._count:
+                return [[] for _ in range(len(query_vectors))]
+            if self._centroids is not None and not exact:
+                hits = [self._search_ivf(vector, limit) for vector in query_vectors]
+            else:
+                hits = self._search_exact(query_vectors, limit)
+            return [
+                [(float(score), self._keys[row]) for score, row in query_hits if score > min_score]
+                for query_hits in hits
+            ]
+
+    def _search_exact(self, query_vectors: "np.ndarray", limit: int) -> List[List[Tuple[float, int]]]:
+        best_scores = np.full((len(query_vectors), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(query_vectors), 0), dtype=np.intp)
+        for start in range(0, self._size, VECTOR_SEARCH_BLOCK):
+            end = min(start + VECTOR_SEARCH_BLOCK, self._size)
+            block = self._matrix[start:end]
+            if self.quantized:
+                scores = (query_vectors @ block.T.astype(np.float32)) * self._scales[start:end]
+            else:
+                scores = query_vectors @ block.T
+            scores[:, ~self._alive[start:end]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            best_scores, best_rows = _top_k(
+                np.concatenate([best_scores, scores], axis=1), np.concatenate([best_rows, rows], axis=1), limit
+            )
+        return [_ranked(scores, rows) for scores, rows in zip(best_scores, best_rows)]
+
+    def _search_ivf(self, query_vector: "np.ndarray", limit: int) -> List[Tuple[float, int]]:
+        centroid_scores = self._centroids @ query_vector
+        probe = np.argpartition(-centroid_scores, min(self.nprobe, len(centroid_scores)) - 1)[:self.nprobe]
+        rows = np.concatenate([self._list_rows(int(list_id)) for list_id in probe])
+        if not len(rows):
+            return []
+        block = self._matrix[rows]
+        if self.quantized:
+            scores = (block.astype(np.float32) @ query_vector) * self._scales[rows]
+        else:
+            scores = block @ query_vector
+        top_scores, top_rows = _top_k(scores[None, :], rows[None, :], limit)
+        return _ranked(top_scores[0], top_rows[0])
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "vectors": self._count,
+            "documents": len(self.document_chunks),
+            "dim": self.dim,
+            "quantization": "int8" if self.quantized else "float32",
+            "mode": "ivf" if self._centroids is not None else "exact",
+            "ivf_lists": len(self._lists),
+            "ivf_training": self._training is not None,
+            "memory_mapped": bool(self.path),
+        }
+
+
+def _as_float(matrix: "np.ndarray", scales: Optional["np.ndarray"], rows) -> "np.ndarray":
+    """Rows of a float32 matrix, or of an int8 matrix scaled back by `scales`"""
+    block = matrix[rows]
+    if scales is not None:
+        return block.astype(np.float32) * scales[rows][:, None]
+    return block
+
+
+def _top_k(scores: "np.ndarray", rows: "np.ndarray", k: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    if scores.shape[1] <= k:
+        return scores, rows
+    picked = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, picked, axis=1), np.take_along_axis(rows, picked, axis=1)
+
+
+def _ranked(scores: "np.ndarray", rows: "np.ndarray") -> List[Tuple[float, int]]:
+    order = np.argsort(-scores, kind="stable")
+    return [(scores[i], int(rows[i])) for i in order if np.isfinite(scores[i])]
+
+
+async def index_documents(index: VectorIndex, documents: Dict[Hashable, List[str]],
+                          current: Dict[Hashable, List[str]]):
+    """
+    Embed documents in a worker thread, one at a time, and index those that
+    are still the current version in `current` (the server's document store)
+    """
+    for doc_id, chunks in list(documents.items()):
+        vectors = await asyncio.to_thread(index.embed, chunks)
+        if current.get(doc_id) is chunks:
+            index.add_vectors(doc_id, vectors)
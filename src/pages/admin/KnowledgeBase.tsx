@@ -55,7 +55,9 @@ const KnowledgeBase: React.FC = () => {
         },
       });
 
-      if (response.status === 200) {
+      if (response.status === 202) {
+        toast.success("Upload accepted. Documents are being indexed in the background.");
+      } else if (response.status === 200) {
         toast.success("Knowledge base updated successfully!");
         // Here you would re-fetch the list of knowledge items to update the table
       }